@@ -1,27 +1,42 @@
-import requests
 import json
-from config import GEMINI_API_KEY
+from config import (
+    GEMINI_API_KEY, GEMINI_API_BASE, GEMINI_MODEL, RESPONSE_CACHE_ENABLED, FAST_ANSWERS_ENABLED,
+    FAST_ANSWER_DEGRADED_MIN_CONFIDENCE
+)
+from fast_answers import FastAnswerMatcher
+from gemini_client import GeminiClient, CircuitOpenError
 from rag_handler import RAGHandler
+from response_cache import ResponseCache
+from tracing import get_tracer
+
+ERROR_RESPONSE = "Sorry, there was an error processing your request."
+UNAVAILABLE_RESPONSE = ("Sorry, I can't reach my information service right now. "
+                        "Please try again in a moment or ask at the front office.")
+BUSY_RESPONSE = "Sorry, I'm still working on your earlier questions. Please ask again in a moment."
 
 class AIHandler:
-    def __init__(self):
-        self.api_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
-        self.headers = {
-            'Content-Type': 'application/json'
-        }
+    def __init__(self, client=None):
+        self.api_url = f"{GEMINI_API_BASE}/models/{GEMINI_MODEL}:generateContent"
+        self.stream_url = f"{GEMINI_API_BASE}/models/{GEMINI_MODEL}:streamGenerateContent"
+        self.client = client or GeminiClient()
         self.rag_handler = RAGHandler()
+        self.cache = ResponseCache() if RESPONSE_CACHE_ENABLED else None
+        self.fast_answers = FastAnswerMatcher(self.rag_handler) if FAST_ANSWERS_ENABLED else None
+        self.tracer = get_tracer()
         self.persona = """You are a helpful and friendly receptionist at Kristu Jyoti College. 
         Keep your responses polite, clear, and professional. 
         Avoid using special characters or symbols.
         Start responses with a warm greeting when appropriate."""
-        
-    def get_response(self, input_text):
-        try:
-            # Get relevant college context
+
+    def _build_payload(self, input_text):
+        """Build the Gemini request payload for a visitor query"""
+        # Get relevant college context
+        with self.tracer.span("rag") as span:
             rag_context = self.rag_handler.generate_rag_prompt(input_text)
-            
-            # Create a more conversational prompt
-            prompt = f"""{self.persona}
+            span.set(context_chars=len(rag_context))
+
+        # Create a more conversational prompt
+        prompt = f"""{self.persona}
 
 I have access to the following college information for reference:
 {rag_context}
@@ -33,25 +48,184 @@ Remember to:
 - Use the college information only as reference
 - Keep the tone warm and professional
 - Be concise and clear"""
-            
+
+        return {
+            "contents": [{
+                "parts":[{"text": prompt}]
+            }]
+        }
+
+    @staticmethod
+    def _extract_text(result):
+        """Pull the generated text out of a Gemini response object"""
+        try:
+            parts = result['candidates'][0]['content']['parts']
+        except (KeyError, IndexError, TypeError):
+            return ""
+        return "".join(part.get('text', '') for part in parts)
+
+    @staticmethod
+    def _event_lines(response):
+        """Lines of an event stream as soon as they arrive, however the body is framed.
+
+        iter_lines() only yields early for chunked responses; on a body
+        delimited by connection close it waits for the end of the answer.
+        """
+        raw = response.raw
+        raw.decode_content = True
+        read1 = getattr(raw, "read1", None)  # urllib3 2.x: whatever has arrived, up to the size
+        if read1 is None:
+            for line in iter(raw.readline, b""):
+                yield line.rstrip(b"\r\n")
+            return
+        pending = b""
+        while True:
+            data = read1(8192)
+            if not data:
+                break
+            *lines, pending = (pending + data).split(b"\n")
+            for line in lines:
+                yield line.rstrip(b"\r")
+        if pending:
+            yield pending.rstrip(b"\r")
+
+    def _cached_response(self, input_text):
+        if not self.cache:
+            return None
+        return self.cache.get(input_text, self.rag_handler.data_version)
+
+    def cache_response(self, input_text, response, cache=True):
+        """Store a complete answer; cache=False skips it and a callable gets the answer instead"""
+        if not response:
+            return
+        if callable(cache):
+            cache(response)
+        elif cache and self.cache:
+            self.cache.put(input_text, response, self.rag_handler.data_version)
+
+    def _local_answer(self, input_text):
+        """Answer from the response cache or a high-confidence factual template"""
+        cached = self._cached_response(input_text)
+        if cached is not None:
+            return cached
+        if self.fast_answers:
+            return self.fast_answers.answer(input_text)
+        return None
+
+    def _fallback_response(self, input_text, default):
+        """Degraded mode: answer from college data on a lower confidence bar when the LLM fails"""
+        if self.fast_answers:
+            answer = self.fast_answers.answer(input_text, min_confidence=FAST_ANSWER_DEGRADED_MIN_CONFIDENCE)
+            if answer:
+                return answer
+        return default
+
+    def get_response(self, input_text, cache=True):
+        local = self._local_answer(input_text)
+        if local is not None:
+            self.tracer.count("answers", source="local")
+            return local
+
+        try:
+            payload = self._build_payload(input_text)
             url = f"{self.api_url}?key={GEMINI_API_KEY}"
-            payload = {
-                "contents": [{
-                    "parts":[{"text": prompt}]
-                }]
-            }
-            
-            response = requests.post(url, 
-                                  headers=self.headers,
-                                  json=payload)
-            
+
+            with self.tracer.span("gemini", mode="blocking") as span:
+                response = self.client.post(url, json=payload)
+                span.set(status=response.status_code)
+
             if response.status_code == 200:
                 result = response.json()
-                return result['candidates'][0]['content']['parts'][0]['text']
+                text = result['candidates'][0]['content']['parts'][0]['text']
+                self.cache_response(input_text, text, cache)
+                self.tracer.count("answers", source="gemini")
+                return text
             else:
                 print(f"API Error: {response.status_code} - {response.text}")
-                return "Sorry, there was an error processing your request."
-                
+                self.tracer.count("answers", source="fallback")
+                return self._fallback_response(input_text, ERROR_RESPONSE)
+
+        except CircuitOpenError:
+            self.tracer.count("answers", source="fallback")
+            return self._fallback_response(input_text, UNAVAILABLE_RESPONSE)
         except Exception as e:
             print(f"Error generating response: {str(e)}")
-            return "Sorry, there was an error processing your request."
+            self.tracer.count("answers", source="fallback")
+            return self._fallback_response(input_text, ERROR_RESPONSE)
+
+    def stream_response(self, input_text, cache=True):
+        """Yield response text incrementally as Gemini generates it.
+
+        cache decides what happens to a complete Gemini answer, as in cache_response().
+        """
+        local = self._local_answer(input_text)
+        if local is not None:
+            self.tracer.count("answers", source="local")
+            yield local
+            return
+
+        produced = False
+        parts = []
+        try:
+            payload = self._build_payload(input_text)
+            url = f"{self.stream_url}?alt=sse&key={GEMINI_API_KEY}"
+
+            with self.tracer.span("gemini", mode="stream") as span, \
+                    self.client.post(url, json=payload, stream=True) as response:
+                span.set(status=response.status_code)
+                if response.status_code != 200:
+                    print(f"API Error: {response.status_code} - {response.text}")
+                    self.tracer.count("answers", source="fallback")
+                    yield self._fallback_response(input_text, ERROR_RESPONSE)
+                    return
+
+                # Server-sent events: one JSON response object per "data:" line
+                for line in self._event_lines(response):
+                    if not line:
+                        continue
+                    line = line.decode('utf-8') if isinstance(line, bytes) else line
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if not data or data == "[DONE]":
+                        continue
+                    text = self._extract_text(json.loads(data))
+                    if text:
+                        if not produced:
+                            span.set(first_chunk_ms=round(span.elapsed() * 1000, 1))
+                        produced = True
+                        parts.append(text)
+                        yield text
+
+                # Only complete answers are cached
+                self.cache_response(input_text, "".join(parts), cache)
+                span.set(chunks=len(parts))
+                self.tracer.count("answers", source="gemini")
+
+        except CircuitOpenError:
+            if not produced:
+                produced = True
+                self.tracer.count("answers", source="fallback")
+                yield self._fallback_response(input_text, UNAVAILABLE_RESPONSE)
+        except Exception as e:
+            print(f"Error streaming response: {str(e)}")
+
+        if not produced:
+            self.tracer.count("answers", source="fallback")
+            yield self._fallback_response(input_text, ERROR_RESPONSE)
+
+    def prewarm(self):
+        """Open a connection to the backend ahead of the next question"""
+        self.client.warm_up(GEMINI_API_BASE)
+
+    def get_stats(self):
+        stats = self.client.get_stats()
+        if self.cache:
+            stats["cache"] = self.cache.get_stats()
+        return stats
+
+    def close(self):
+        if self.cache:
+            self.cache.save()
+        self.client.close()
+        self.rag_handler.close()
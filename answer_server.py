@@ -0,0 +1,399 @@
+"""Shared answer server: one AIHandler (RAG index, caches, Gemini connections) for many kiosks.
+
+    python answer_server.py                                  # on the server
+    ANSWER_SERVER_URL=http://server:8765 python main.py      # on each kiosk
+
+Endpoints:
+- POST /answer {"question": "...", "stream": false} returns {"answer": "..."};
+  with "stream": true the answer comes back as chunked text/plain while it is generated,
+  and "cache": false keeps it out of the response cache (speculative questions)
+- POST /confirm {"question": "..."} caches the answer held back from a "cache": false
+  request for that question, once the kiosk knows it was the question actually asked
+- GET /ws is a WebSocket: send {"id": 1, "question": "..."}, receive {"id": 1, "chunk": "..."}
+  messages and then {"id": 1, "done": true}; {"id": 1, "cancel": true} abandons a question
+- GET /stats and GET /health
+
+Kiosks identify themselves with an X-Kiosk-Id header (or ?kiosk= on the WebSocket).
+At most ANSWER_SERVER_WORKERS answers are produced at once. Questions waiting for a
+worker are queued per kiosk and served round-robin, so a busy kiosk can't starve
+the others, and a kiosk with ANSWER_SERVER_MAX_QUEUED questions waiting gets 429
+with a "busy" answer to say instead. A question still waiting after ANSWER_SERVER_MAX_WAIT
+seconds is answered with the same message rather than started late.
+A question asked while the same question (after normalization) is being answered
+shares that answer instead of starting another upstream request.
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from aiohttp import web, WSMsgType
+from ai_handler import AIHandler, BUSY_RESPONSE, ERROR_RESPONSE
+from config import (
+    ANSWER_SERVER_HOST, ANSWER_SERVER_PORT, ANSWER_SERVER_WORKERS, ANSWER_SERVER_MAX_QUEUED, ANSWER_SERVER_MAX_WAIT,
+    GEMINI_STREAMING
+)
+from gemini_client import GeminiClient
+from response_cache import ResponseCache
+from tracing import get_tracer
+
+class QueueFullError(Exception):
+    """The kiosk already has as many questions waiting as it may"""
+
+class Flight:
+    """One upstream answer, shared by every request for the same question.
+
+    Chunks are published on the event loop as a worker produces them; each
+    subscriber replays them from the start and then follows along. The
+    worker stops early once nobody is subscribed any more.
+    """
+
+    def __init__(self, key, question, client_id, cache=True):
+        self.key = key
+        self.question = question
+        self.client_id = client_id
+        self.cache = cache
+        self.chunks = []
+        self.done = False
+        self.subscribers = 0
+        self.cancelled = threading.Event()  # Checked by the worker thread between chunks
+        self.queued_at = time.perf_counter()
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def publish(self, chunk):
+        self.chunks.append(chunk)
+        self._notify()
+
+    def finish(self):
+        self.done = True
+        self._notify()
+
+    async def stream(self):
+        index = 0
+        while True:
+            if index < len(self.chunks):
+                index += 1
+                yield self.chunks[index - 1]
+            elif self.done:
+                return
+            else:
+                await self._changed.wait()
+
+class FairQueue:
+    """Flights waiting for a worker: one FIFO per kiosk, served round-robin across kiosks"""
+
+    def __init__(self, max_per_client=ANSWER_SERVER_MAX_QUEUED):
+        self.max_per_client = max_per_client
+        self._queues = {}
+        self._turns = deque()  # Kiosks with flights waiting, in serving order
+        self._available = asyncio.Semaphore(0)
+
+    def put(self, flight):
+        waiting = self._queues.get(flight.client_id)
+        if waiting is None:
+            waiting = self._queues[flight.client_id] = deque()
+            self._turns.append(flight.client_id)
+        elif len(waiting) >= self.max_per_client:
+            raise QueueFullError(f"Kiosk '{flight.client_id}' already has {len(waiting)} questions waiting")
+        waiting.append(flight)
+        self._available.release()
+
+    async def get(self):
+        await self._available.acquire()
+        client_id = self._turns.popleft()
+        waiting = self._queues[client_id]
+        flight = waiting.popleft()
+        if waiting:
+            # Back of the line until every other waiting kiosk has had a turn
+            self._turns.append(client_id)
+        else:
+            del self._queues[client_id]
+        return flight
+
+    def depth(self):
+        return sum(len(waiting) for waiting in self._queues.values())
+
+class AnswerServer:
+    # Speculative answers kept for /confirm; a kiosk confirms within seconds, if at all
+    HELD_ANSWERS = 64
+
+    def __init__(self, ai_handler=None, workers=ANSWER_SERVER_WORKERS, max_queued=ANSWER_SERVER_MAX_QUEUED,
+                 max_wait=ANSWER_SERVER_MAX_WAIT, streaming=GEMINI_STREAMING):
+        # One pooled upstream connection per worker
+        self.ai_handler = ai_handler or AIHandler(client=GeminiClient(pool_size=workers))
+        self.workers = workers
+        self.max_queued = max_queued
+        self.max_wait = max_wait
+        self.streaming = streaming
+        self.queue = None
+        self._flights = {}  # Normalized question -> Flight being queued or answered
+        self._held = OrderedDict()  # Normalized question -> complete answer kept out of the cache
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="answer-worker")
+        self._tasks = []
+        self.tracer = get_tracer()
+        self.answering = 0
+        self.stats = {
+            "requests": 0,
+            "coalesced": 0,
+            "rejected": 0,
+            "upstream": 0,
+            "abandoned": 0,
+            "expired": 0,
+            "confirmed": 0
+        }
+        self.requests_by_kiosk = {}
+
+    def create_app(self):
+        app = web.Application()
+        app.router.add_post("/answer", self.handle_answer)
+        app.router.add_post("/confirm", self.handle_confirm)
+        app.router.add_get("/ws", self.handle_websocket)
+        app.router.add_get("/stats", self.handle_stats)
+        app.router.add_get("/health", self.handle_health)
+        app.on_startup.append(self._start_workers)
+        app.on_cleanup.append(self._shutdown)
+        return app
+
+    async def _start_workers(self, app):
+        self.queue = FairQueue(self.max_queued)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def _shutdown(self, app):
+        for task in self._tasks:
+            task.cancel()
+        for flight in self._flights.values():
+            flight.cancelled.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.ai_handler.close()
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            flight = await self.queue.get()
+            if flight.cancelled.is_set():
+                continue
+            started = time.perf_counter()
+            self.tracer.record("server_queue_wait", flight.queued_at, started, kiosk=flight.client_id)
+            try:
+                if started - flight.queued_at > self.max_wait:
+                    # Kiosks read their answer with a timeout that only allows for max_wait in the queue
+                    self.stats["expired"] += 1
+                    flight.publish(BUSY_RESPONSE)
+                    continue
+                self.stats["upstream"] += 1
+                self.answering += 1
+                try:
+                    await loop.run_in_executor(self._executor, self._produce, flight, loop)
+                finally:
+                    self.answering -= 1
+            finally:
+                flight.finish()
+                if self._flights.get(flight.key) is flight:
+                    del self._flights[flight.key]
+
+    def _produce(self, flight, loop):
+        """Worker thread: run the kiosk's answer path, publishing chunks on the event loop"""
+        stream = None
+        produced = False
+        # A held-back answer is kept until its kiosk confirms the question with /confirm
+        cache = flight.cache or (lambda answer: loop.call_soon_threadsafe(self._hold, flight.key[0], answer))
+        try:
+            if self.streaming:
+                stream = self.ai_handler.stream_response(flight.question, cache=cache)
+            else:
+                stream = iter([self.ai_handler.get_response(flight.question, cache=cache)])
+            for chunk in stream:
+                if flight.cancelled.is_set():
+                    break
+                produced = True
+                loop.call_soon_threadsafe(flight.publish, chunk)
+        except Exception as e:
+            print(f"Error answering '{flight.question}': {e}")
+            if not produced:
+                loop.call_soon_threadsafe(flight.publish, ERROR_RESPONSE)
+        finally:
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+
+    def _hold(self, normalized, answer):
+        self._held[normalized] = answer
+        self._held.move_to_end(normalized)
+        while len(self._held) > self.HELD_ANSWERS:
+            self._held.popitem(last=False)
+
+    def _subscribe(self, question, client_id, cache=True):
+        """The flight answering question, joining one in progress if there is one"""
+        self.stats["requests"] += 1
+        self.requests_by_kiosk[client_id] = self.requests_by_kiosk.get(client_id, 0) + 1
+        # Speculative questions don't share with ones whose answers should be cached
+        key = (ResponseCache.normalize(question), cache)
+        flight = self._flights.get(key)
+        if flight is not None and not flight.cancelled.is_set():
+            self.stats["coalesced"] += 1
+            self.tracer.count("server_requests", outcome="coalesced")
+        else:
+            flight = Flight(key, question, client_id, cache)
+            try:
+                self.queue.put(flight)
+            except QueueFullError:
+                self.stats["rejected"] += 1
+                self.tracer.count("server_requests", outcome="rejected")
+                raise
+            self._flights[key] = flight
+            self.tracer.count("server_requests", outcome="queued")
+        flight.subscribers += 1
+        return flight
+
+    def _unsubscribe(self, flight):
+        flight.subscribers -= 1
+        if flight.subscribers == 0 and not flight.done:
+            # Every kiosk waiting for it hung up or was interrupted: stop the upstream request
+            flight.cancelled.set()
+            self.stats["abandoned"] += 1
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+
+    @staticmethod
+    def _client_id(request):
+        return request.headers.get("X-Kiosk-Id") or request.query.get("kiosk") or request.remote or "unknown"
+
+    async def handle_answer(self, request):
+        try:
+            body = await request.json()
+        except ValueError:
+            raise web.HTTPBadRequest(text="Request body must be JSON")
+        question = str(body.get("question") or "").strip() if isinstance(body, dict) else ""
+        if not question:
+            raise web.HTTPBadRequest(text="Missing question")
+        try:
+            flight = self._subscribe(question, self._client_id(request), body.get("cache", True) is not False)
+        except QueueFullError as e:
+            # The kiosk says this to the visitor; being busy says nothing about the server's health
+            return web.json_response({"error": "busy", "detail": str(e), "answer": BUSY_RESPONSE},
+                                     status=429, headers={"Retry-After": "1"})
+        try:
+            if not body.get("stream"):
+                answer = "".join([chunk async for chunk in flight.stream()])
+                return web.json_response({"answer": answer})
+            response = web.StreamResponse(headers={"Content-Type": "text/plain; charset=utf-8"})
+            response.enable_chunked_encoding()
+            await response.prepare(request)
+            try:
+                async for chunk in flight.stream():
+                    await response.write(chunk.encode("utf-8"))
+                await response.write_eof()
+            except ConnectionResetError:
+                # The kiosk stopped listening (barge-in) and closed the connection
+                pass
+            return response
+        finally:
+            self._unsubscribe(flight)
+
+    async def handle_confirm(self, request):
+        try:
+            body = await request.json()
+        except ValueError:
+            raise web.HTTPBadRequest(text="Request body must be JSON")
+        question = str(body.get("question") or "").strip() if isinstance(body, dict) else ""
+        if not question:
+            raise web.HTTPBadRequest(text="Missing question")
+        # Only an answer this server produced is cached; the kiosk just names the question
+        answer = self._held.pop(ResponseCache.normalize(question), None)
+        if answer is not None:
+            self.stats["confirmed"] += 1
+            self.ai_handler.cache_response(question, answer)
+        return web.json_response({"cached": answer is not None})
+
+    async def handle_websocket(self, request):
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        client_id = self._client_id(request)
+        tasks = {}
+        try:
+            async for message in ws:
+                if message.type != WSMsgType.TEXT:
+                    continue
+                try:
+                    data = json.loads(message.data)
+                except ValueError:
+                    data = None
+                if not isinstance(data, dict):
+                    await ws.send_json({"error": "Messages must be JSON objects"})
+                    continue
+                request_id = data.get("id")
+                previous = tasks.pop(request_id, None)
+                if previous:
+                    previous.cancel()
+                if data.get("cancel"):
+                    continue
+                question = str(data.get("question") or "").strip()
+                if not question:
+                    await ws.send_json({"id": request_id, "error": "Missing question"})
+                    continue
+                cache = data.get("cache", True) is not False
+                task = asyncio.create_task(self._answer_websocket(ws, request_id, question, client_id, cache))
+                tasks[request_id] = task
+                task.add_done_callback(
+                    lambda done, request_id=request_id: tasks.pop(request_id, None) if tasks.get(request_id) is done else None
+                )
+        finally:
+            for task in tasks.values():
+                task.cancel()
+        return ws
+
+    async def _answer_websocket(self, ws, request_id, question, client_id, cache=True):
+        try:
+            flight = self._subscribe(question, client_id, cache)
+        except QueueFullError as e:
+            await ws.send_json({"id": request_id, "error": "busy", "detail": str(e), "answer": BUSY_RESPONSE})
+            return
+        try:
+            async for chunk in flight.stream():
+                await ws.send_json({"id": request_id, "chunk": chunk})
+            await ws.send_json({"id": request_id, "done": True})
+        except ConnectionResetError:
+            pass
+        finally:
+            self._unsubscribe(flight)
+
+    async def handle_stats(self, request):
+        return web.json_response(self.get_stats())
+
+    async def handle_health(self, request):
+        return web.json_response({"status": "ok"})
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats["coalesced_rate"] = stats["coalesced"] / stats["requests"] if stats["requests"] else 0.0
+        stats["answering"] = self.answering
+        stats["queued"] = self.queue.depth() if self.queue else 0
+        stats["kiosks"] = dict(self.requests_by_kiosk)
+        stats["upstream_client"] = self.ai_handler.get_stats()
+        return stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve answers to many kiosks from one shared backend")
+    parser.add_argument("--host", default=ANSWER_SERVER_HOST)
+    parser.add_argument("--port", type=int, default=ANSWER_SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=ANSWER_SERVER_WORKERS, help="Concurrent upstream answers")
+    parser.add_argument("--max-queued", type=int, default=ANSWER_SERVER_MAX_QUEUED,
+                        help="Questions a single kiosk may have waiting")
+    parser.add_argument("--max-wait", type=float, default=ANSWER_SERVER_MAX_WAIT,
+                        help="Seconds a question may wait for a worker before the kiosk is told the server is busy")
+    args = parser.parse_args(argv)
+
+    server = AnswerServer(workers=args.workers, max_queued=args.max_queued, max_wait=args.max_wait)
+    try:
+        web.run_app(server.create_app(), host=args.host, port=args.port)
+    finally:
+        get_tracer().close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+import json
+import math
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+import speech_recognition as sr
+from audio_gate import EnergyGate
+from tracing import get_tracer
+from config import (
+    ASR_BACKEND, VOSK_MODEL_PATH, ASR_SCRIPTED_TRANSCRIPTS, ASR_TRAILING_SILENCE_MS,
+    ASR_HESITATION_SILENCE_MS, ASR_SHORT_UTTERANCE_MS, ASR_MIN_SPEECH_MS, ASR_PADDING_MS,
+    ASR_MAX_COMMAND_SECONDS, COMMAND_LISTEN_TIMEOUT
+)
+
+class NoSpeechError(Exception):
+    """Nobody started talking before the listen timeout"""
+
+class NotUnderstoodError(Exception):
+    """Speech was captured but the backend found no words in it"""
+
+class Endpointer:
+    """Frame-level voice activity endpointing for one spoken command.
+
+    Speech starts after min_speech_ms of consecutive loud frames and ends
+    after trailing_silence_ms of quiet ones, or hesitation_silence_ms while
+    less than short_utterance_ms has been said. Loudness is judged by an
+    EnergyGate without hangover, seeded with the wake word gate's noise floor
+    so the first frames aren't mistaken for background.
+    """
+
+    WAITING = "waiting"
+    SPEAKING = "speaking"
+    ENDED = "ended"
+
+    def __init__(self, frame_length, sample_rate, trailing_silence_ms=ASR_TRAILING_SILENCE_MS,
+                 hesitation_silence_ms=ASR_HESITATION_SILENCE_MS, short_utterance_ms=ASR_SHORT_UTTERANCE_MS,
+                 min_speech_ms=ASR_MIN_SPEECH_MS, max_seconds=ASR_MAX_COMMAND_SECONDS, noise_floor=None):
+        self.frame_ms = frame_length * 1000 / sample_rate
+        self.gate = EnergyGate(frame_length, hangover_frames=0)
+        if noise_floor:
+            self.gate.noise_floor = noise_floor
+        self.trailing_frames = self.frames_for(trailing_silence_ms)
+        self.hesitation_frames = self.frames_for(hesitation_silence_ms)
+        self.short_frames = self.frames_for(short_utterance_ms)
+        self.min_speech_frames = self.frames_for(min_speech_ms)
+        self.max_frames = self.frames_for(max_seconds * 1000)
+        self.state = self.WAITING
+        self.reason = None           # Why the command ended: "silence" or "max_length"
+        self.speech_frames = 0       # Loud frames since speech started
+        self.utterance_frames = 0    # All frames since speech started
+        self._onset = 0
+        self._silence = 0
+
+    def frames_for(self, milliseconds):
+        return max(1, math.ceil(milliseconds / self.frame_ms))
+
+    def process(self, frame):
+        """Classify one int16 frame; returns the state after it"""
+        active = self.gate.process(frame)
+        if self.state == self.WAITING:
+            self._onset = self._onset + 1 if active else 0
+            if self._onset >= self.min_speech_frames:
+                self.state = self.SPEAKING
+                self.speech_frames = self.utterance_frames = self._onset
+        elif self.state == self.SPEAKING:
+            self.utterance_frames += 1
+            if active:
+                self.speech_frames += 1
+                self._silence = 0
+            else:
+                self._silence += 1
+                limit = self.hesitation_frames if self.speech_frames < self.short_frames else self.trailing_frames
+                if self._silence >= limit:
+                    self.state = self.ENDED
+                    self.reason = "silence"
+            if self.state == self.SPEAKING and self.utterance_frames >= self.max_frames:
+                self.state = self.ENDED
+                self.reason = "max_length"
+        return self.state
+
+    def utterance_ms(self):
+        return self.utterance_frames * self.frame_ms
+
+class ASRBackend(ABC):
+    """Speech-to-text engine behind CommandRecognizer.
+
+    start() opens a session for one command. The session is handed raw int16
+    audio through accept() while the visitor is talking, which returns a
+    partial transcript (or None), and finish() returns the final transcript
+    or raises NotUnderstoodError.
+    """
+
+    name = "base"
+    streaming = False  # True if accept() produces partial results
+
+    @abstractmethod
+    def start(self, sample_rate):
+        """A new session for one command"""
+
+class _BufferedSession:
+    """Collects the whole command for backends that only take complete audio"""
+
+    def __init__(self, recognize, sample_rate):
+        self.recognize = recognize
+        self.sample_rate = sample_rate
+        self.chunks = []
+
+    def accept(self, pcm):
+        self.chunks.append(pcm)
+        return None
+
+    def finish(self):
+        return self.recognize(sr.AudioData(b"".join(self.chunks), self.sample_rate, 2))
+
+class GoogleBackend(ASRBackend):
+    """SpeechRecognition's Google Web Speech API; the audio is uploaded once the command ends"""
+
+    name = "google"
+
+    def __init__(self, recognizer=None):
+        self.recognizer = recognizer or sr.Recognizer()
+
+    def start(self, sample_rate):
+        return _BufferedSession(self._recognize, sample_rate)
+
+    def _recognize(self, audio):
+        try:
+            return self.recognizer.recognize_google(audio)
+        except sr.UnknownValueError:
+            raise NotUnderstoodError("Google found no words in the command")
+
+class _VoskSession:
+    def __init__(self, recognizer):
+        self.recognizer = recognizer
+        self.segments = []
+
+    def accept(self, pcm):
+        if self.recognizer.AcceptWaveform(pcm):
+            # Vosk closed a segment at a pause of its own
+            text = json.loads(self.recognizer.Result()).get("text", "")
+            if text:
+                self.segments.append(text)
+            partial = ""
+        else:
+            partial = json.loads(self.recognizer.PartialResult()).get("partial", "")
+        return " ".join(self.segments + ([partial] if partial else [])) or None
+
+    def finish(self):
+        text = json.loads(self.recognizer.FinalResult()).get("text", "")
+        words = " ".join(self.segments + ([text] if text else []))
+        if not words:
+            raise NotUnderstoodError("Vosk found no words in the command")
+        return words
+
+class VoskBackend(ASRBackend):
+    """Offline streaming recognition with Vosk (optional dependency)"""
+
+    name = "vosk"
+    streaming = True
+
+    def __init__(self, model_path=VOSK_MODEL_PATH):
+        try:
+            import vosk
+        except ImportError:
+            raise ValueError("The vosk backend needs the vosk package (pip install vosk)")
+        if not model_path:
+            raise ValueError("Set VOSK_MODEL_PATH to an unpacked Vosk model folder")
+        vosk.SetLogLevel(-1)
+        self._vosk = vosk
+        self.model = vosk.Model(model_path)
+
+    def start(self, sample_rate):
+        return _VoskSession(self._vosk.KaldiRecognizer(self.model, sample_rate))
+
+class _ScriptedSession:
+    def __init__(self, transcript, sample_rate, words_per_second):
+        self.words = transcript.split()
+        self.sample_rate = sample_rate
+        self.words_per_second = words_per_second
+        self.samples = 0
+
+    def accept(self, pcm):
+        self.samples += len(pcm) // 2
+        count = min(len(self.words), int(self.samples / self.sample_rate * self.words_per_second))
+        return " ".join(self.words[:count]) or None
+
+    def finish(self):
+        if not self.words:
+            raise NotUnderstoodError("No scripted transcript")
+        return " ".join(self.words)
+
+class ScriptedBackend(ASRBackend):
+    """Offline stand-in that hears a scripted transcript for every command, in turn.
+
+    Partial results reveal the transcript at words_per_second of captured
+    audio, so endpointing, partial handling and everything downstream can be
+    exercised without a recognizer or a network.
+    """
+
+    name = "scripted"
+    streaming = True
+
+    def __init__(self, transcripts=None, words_per_second=3.0):
+        self.transcripts = list(ASR_SCRIPTED_TRANSCRIPTS if transcripts is None else transcripts)
+        self.words_per_second = words_per_second
+        self.sessions = 0
+
+    def start(self, sample_rate):
+        transcript = self.transcripts[self.sessions % len(self.transcripts)] if self.transcripts else ""
+        self.sessions += 1
+        return _ScriptedSession(transcript, sample_rate, self.words_per_second)
+
+BACKENDS = {
+    "google": GoogleBackend,
+    "vosk": VoskBackend,
+    "scripted": ScriptedBackend
+}
+
+def create_backend(name=ASR_BACKEND):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown ASR backend '{name}' (choose from {', '.join(BACKENDS)})")
+    return BACKENDS[name]()
+
+class CommandRecognizer:
+    """Capture the command after a wake word and transcribe it with a pluggable backend.
+
+    Frames are endpointed as they arrive and streamed to the backend from the
+    moment speech starts, so the command closes a few hundred milliseconds
+    after the last word and a streaming backend is nearly done by then.
+    """
+
+    def __init__(self, backend, listen_timeout=COMMAND_LISTEN_TIMEOUT, padding_ms=ASR_PADDING_MS, **endpointer_options):
+        self.backend = backend
+        self.listen_timeout = listen_timeout
+        self.padding_ms = padding_ms
+        self.endpointer_options = endpointer_options
+        self.tracer = get_tracer()
+        self.commands = 0
+        self.no_speech = 0
+        self.not_understood = 0
+        self.ended_by = {"silence": 0, "max_length": 0, "end_of_audio": 0}
+        self.total_utterance_ms = 0.0
+        self.total_finish_ms = 0.0
+
+    def recognize(self, source, on_partial=None, on_endpoint=None, noise_floor=None):
+        """Transcript of the command in source (a RingAudioSource); None if it was cancelled.
+
+        Raises NoSpeechError if nobody talked within listen_timeout and
+        NotUnderstoodError if the backend found no words.
+        """
+        capture = source.capture
+        endpointer = Endpointer(capture.frame_length, capture.sample_rate, noise_floor=noise_floor,
+                                **self.endpointer_options)
+        timeout_frames = endpointer.frames_for(self.listen_timeout * 1000)
+        pre_roll_frames = max(0, source.live_seq - source.start_seq)
+        # Pre-roll plus a little lead-in, so onsets and words run into the wake word aren't clipped
+        padding = deque(maxlen=pre_roll_frames + endpointer.frames_for(self.padding_ms))
+        session = None
+        partial = None
+        waited = 0
+        for seq, frame in source.frames():
+            if seq < source.live_seq:
+                # Pre-roll holds the wake word itself: keep it, but don't let it start the command
+                padding.append(frame)
+                continue
+            state = endpointer.process(frame)
+            if session is None:
+                padding.append(frame)
+                if state == Endpointer.WAITING:
+                    waited += 1
+                    if waited >= timeout_frames:
+                        self.no_speech += 1
+                        raise NoSpeechError("No command heard")
+                    continue
+                session = self.backend.start(capture.sample_rate)
+                pcm = b"".join(buffered.tobytes() for buffered in padding)
+                padding.clear()
+            else:
+                pcm = frame.tobytes()
+            text = session.accept(pcm)
+            if text and text != partial:
+                partial = text
+                if on_partial:
+                    on_partial(text)
+            if state == Endpointer.ENDED:
+                break
+
+        if source.cancelled is not None and source.cancelled.is_set():
+            return None
+        if session is None:
+            self.no_speech += 1
+            raise NoSpeechError("Audio ended before a command was spoken")
+        if on_endpoint:
+            on_endpoint()
+        self.commands += 1
+        self.ended_by[endpointer.reason or "end_of_audio"] += 1
+        self.total_utterance_ms += endpointer.utterance_ms()
+        finish_started = time.perf_counter()
+        try:
+            with self.tracer.span("asr_finish", backend=self.backend.name, ended_by=endpointer.reason,
+                                  utterance_ms=round(endpointer.utterance_ms())):
+                return session.finish()
+        except NotUnderstoodError:
+            self.not_understood += 1
+            raise
+        finally:
+            self.total_finish_ms += (time.perf_counter() - finish_started) * 1000
+
+    def get_stats(self):
+        commands = self.commands
+        return {
+            "backend": self.backend.name,
+            "commands": commands,
+            "no_speech": self.no_speech,
+            "not_understood": self.not_understood,
+            "ended_by": dict(self.ended_by),
+            "avg_utterance_ms": self.total_utterance_ms / commands if commands else 0.0,
+            "avg_finish_ms": self.total_finish_ms / commands if commands else 0.0
+        }
@@ -0,0 +1,398 @@
+import threading
+import time
+import wave
+from abc import ABC, abstractmethod
+import numpy as np
+import speech_recognition as sr
+
+_pyaudio_lock = threading.Lock()
+_pyaudio_instance = None
+_pyaudio_users = 0
+
+def acquire_pyaudio():
+    """The process-wide PyAudio instance, shared by microphone capture and speech playback.
+
+    A second PortAudio instance often fails to open the device on ALSA, or
+    glitches capture while it plays. Pair each call with release_pyaudio().
+    """
+    global _pyaudio_instance, _pyaudio_users
+    with _pyaudio_lock:
+        if _pyaudio_instance is None:
+            # Imported here so file sources work where PortAudio isn't installed
+            import pyaudio
+            _pyaudio_instance = pyaudio.PyAudio()
+        _pyaudio_users += 1
+        return _pyaudio_instance
+
+def release_pyaudio():
+    """Give back an acquire_pyaudio() reference; PortAudio is terminated after the last one"""
+    global _pyaudio_instance, _pyaudio_users
+    with _pyaudio_lock:
+        if _pyaudio_users == 0:
+            return
+        _pyaudio_users -= 1
+        if _pyaudio_users == 0:
+            _pyaudio_instance.terminate()
+            _pyaudio_instance = None
+
+class AudioRingBuffer:
+    """Preallocated ring of int16 frames written by the capture thread and read by the detector.
+
+    Frames handed to the reader are views into the ring, not copies. A view
+    stays valid until the writer laps the reader, i.e. for `capacity` frames,
+    which is far longer than it takes to process one frame.
+    """
+
+    def __init__(self, frame_length, capacity):
+        self.frame_length = frame_length
+        self.capacity = capacity
+        self.frames = np.zeros((capacity, frame_length), dtype=np.int16)
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.write_seq = 0   # Total frames written
+        self.read_seq = 0    # Next frame the reader will get
+        self.dropped = 0
+        self.closed = False  # No more frames will be written
+        self._fill = 0       # Samples staged in the current write slot
+        self._cond = threading.Condition()
+
+    def write(self, data):
+        """Append raw little-endian int16 bytes; arbitrary lengths are re-framed"""
+        samples = np.frombuffer(data, dtype=np.int16)
+        offset = 0
+        with self._cond:
+            while offset < len(samples):
+                slot = self.write_seq % self.capacity
+                count = min(self.frame_length - self._fill, len(samples) - offset)
+                self.frames[slot, self._fill:self._fill + count] = samples[offset:offset + count]
+                self._fill += count
+                offset += count
+                if self._fill == self.frame_length:
+                    self._fill = 0
+                    self.timestamps[slot] = time.perf_counter()
+                    self.write_seq += 1
+                    # Reader fell a full ring behind: skip it forward over the lost frames
+                    behind = self.write_seq - self.read_seq
+                    if behind > self.capacity:
+                        self.dropped += behind - self.capacity
+                        self.read_seq = self.write_seq - self.capacity
+                    self._cond.notify_all()
+
+    def read(self, timeout=None):
+        """Return (frame view, capture timestamp) for the next frame, or (None, None) on timeout"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.write_seq > self.read_seq or self.closed, timeout):
+                return None, None
+            if self.write_seq <= self.read_seq:
+                return None, None
+            slot = self.read_seq % self.capacity
+            self.read_seq += 1
+            self._cond.notify_all()
+            return self.frames[slot], float(self.timestamps[slot])
+
+    def read_at(self, seq, timeout=None):
+        """Return (frame view, seq) for absolute frame number seq, waiting until it is captured.
+
+        If seq has already been overwritten the oldest frame still held is
+        returned instead; returns (None, seq) on timeout.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.write_seq > seq or self.closed, timeout):
+                return None, seq
+            if self.write_seq <= seq:
+                return None, seq
+            seq = max(seq, self.write_seq - self.capacity)
+            return self.frames[seq % self.capacity], seq
+
+    def advance(self, seq):
+        """Mark frames before seq as consumed by a read_at() reader"""
+        with self._cond:
+            if seq > self.read_seq:
+                self.read_seq = min(seq, self.write_seq)
+                self._cond.notify_all()
+
+    def skip_to_latest(self):
+        """Move the reader past everything captured so far"""
+        with self._cond:
+            self.read_seq = self.write_seq
+            self._cond.notify_all()
+
+    def wait_for_space(self, reserve=0, timeout=None):
+        """Block a writer that must not drop frames until the reader catches up.
+
+        reserve frames behind the reader are left untouched so views already
+        handed out, look-back and pre-roll audio stay valid.
+        """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self.write_seq - self.read_seq < self.capacity - reserve or self.closed, timeout
+            )
+
+    def close(self):
+        """Signal end of audio; blocked readers return immediately once the ring is drained"""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+class FrameSource(ABC):
+    """Base class for the audio inputs the wake word detector can read from.
+
+    A source fills an AudioRingBuffer with frames of frame_length int16
+    samples once start() is called; readers take frames from the ring.
+    """
+
+    device_index = None
+
+    def __init__(self, sample_rate, frame_length, buffer_seconds=2.0):
+        self.sample_rate = sample_rate
+        self.frame_length = frame_length
+        capacity = max(4, int(buffer_seconds * sample_rate / frame_length))
+        self.ring = AudioRingBuffer(frame_length, capacity)
+        self.overflows = 0
+        self.frames_processed = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    @abstractmethod
+    def start(self):
+        """Begin filling the ring"""
+
+    def stop(self):
+        self.ring.close()
+
+    def exhausted(self):
+        """True once the source has ended and every frame has been read"""
+        return self.ring.closed and self.ring.read_seq >= self.ring.write_seq
+
+    def read_frame(self, timeout=0.5):
+        """Next captured frame as an int16 view, or None if nothing arrived in time"""
+        frame, _ = self.ring.read(timeout)
+        return frame
+
+    def read_frame_timed(self, timeout=0.5):
+        """Like read_frame, but also returns the frame's capture timestamp"""
+        return self.ring.read(timeout)
+
+    def record_latency(self, captured_at):
+        """Track time from capture to the end of processing for one frame"""
+        latency = time.perf_counter() - captured_at
+        self.frames_processed += 1
+        self.total_latency += latency
+        if latency > self.max_latency:
+            self.max_latency = latency
+
+    def get_stats(self):
+        processed = self.frames_processed
+        return {
+            "frames_captured": self.ring.write_seq,
+            "frames_processed": processed,
+            "frames_dropped": self.ring.dropped,
+            "input_overflows": self.overflows,
+            "avg_latency_ms": self.total_latency / processed * 1000 if processed else 0.0,
+            "max_latency_ms": self.max_latency * 1000
+        }
+
+class AudioCapture(FrameSource):
+    """Capture microphone audio on PortAudio's callback thread into an AudioRingBuffer"""
+
+    def __init__(self, sample_rate, frame_length, device_index=None, buffer_seconds=2.0):
+        super().__init__(sample_rate, frame_length, buffer_seconds)
+        self.device_index = device_index
+        self.pa = None
+        self.stream = None
+        self._pyaudio = None
+
+    def start(self):
+        import pyaudio
+        self._pyaudio = pyaudio
+        self.pa = acquire_pyaudio()
+        try:
+            self.stream = self._open(self.device_index)
+        except Exception as e:
+            print(f"Error setting up audio stream: {e}")
+            # Try again without specifying device index
+            print("Retrying with default audio device...")
+            self.stream = self._open(None)
+            self.device_index = None
+        self.stream.start_stream()
+
+    def _open(self, device_index):
+        return self.pa.open(
+            rate=self.sample_rate,
+            channels=1,
+            format=self._pyaudio.paInt16,
+            input=True,
+            input_device_index=device_index,
+            frames_per_buffer=self.frame_length,
+            stream_callback=self._callback,
+            start=False
+        )
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        if status & self._pyaudio.paInputOverflow:
+            self.overflows += 1
+        self.ring.write(in_data)
+        return (None, self._pyaudio.paContinue)
+
+    def stop(self):
+        super().stop()
+        if self.stream:
+            try:
+                self.stream.stop_stream()
+            except Exception:
+                pass
+            self.stream.close()
+            self.stream = None
+        if self.pa:
+            release_pyaudio()
+            self.pa = None
+
+def load_pcm(path, sample_rate):
+    """Read a mono int16 recording; .wav files must match sample_rate, anything else is raw PCM"""
+    if path.lower().endswith(".wav"):
+        with wave.open(path, 'rb') as wav:
+            if wav.getsampwidth() != 2:
+                raise ValueError(f"{path}: expected 16-bit samples, got {wav.getsampwidth() * 8}-bit")
+            if wav.getframerate() != sample_rate:
+                raise ValueError(f"{path}: expected {sample_rate} Hz, got {wav.getframerate()} Hz")
+            channels = wav.getnchannels()
+            samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype='<i2')
+        if channels > 1:
+            # Keep the first channel, as a mono microphone would hear it
+            samples = samples[::channels]
+        return samples.astype(np.int16)
+    return np.fromfile(path, dtype='<i2').astype(np.int16)
+
+class FileAudioSource(FrameSource):
+    """Replay a recording into the ring as if it came from the microphone.
+
+    With speed 1.0 frames arrive in real time (2.0 is twice as fast, and
+    frames are dropped if the reader falls behind, just like live capture).
+    With speed 0 frames are fed as fast as the reader takes them, so
+    benchmarks and regression runs aren't limited to real time.
+    """
+
+    def __init__(self, path, sample_rate, frame_length, speed=0.0, buffer_seconds=2.0):
+        super().__init__(sample_rate, frame_length, buffer_seconds)
+        self.path = path
+        self.speed = speed
+        samples = load_pcm(path, sample_rate)
+        # Pad the final partial frame with silence
+        frames = -(-len(samples) // frame_length)
+        self.samples = np.zeros(frames * frame_length, dtype=np.int16)
+        self.samples[:len(samples)] = samples
+        self.duration = len(samples) / sample_rate
+        self._stopped = False
+        self._thread = None
+
+    @property
+    def total_frames(self):
+        return len(self.samples) // self.frame_length
+
+    def start(self):
+        self._thread = threading.Thread(target=self._feed, daemon=True)
+        self._thread.start()
+
+    def _feed(self):
+        frame_seconds = self.frame_length / self.sample_rate
+        reserve = self.ring.capacity // 2
+        started = time.perf_counter()
+        for index in range(self.total_frames):
+            if self._stopped:
+                break
+            if self.speed > 0:
+                delay = started + (index + 1) * frame_seconds / self.speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            else:
+                self.ring.wait_for_space(reserve)
+            self.ring.write(self.samples[index * self.frame_length:(index + 1) * self.frame_length])
+        self.ring.close()
+
+    def stop(self):
+        self._stopped = True
+        super().stop()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+        self._thread = None
+
+class _RingStream:
+    """File-like reader over the ring from a given frame onwards, as SpeechRecognition expects"""
+
+    def __init__(self, ring, start_seq, timeout, consume=True, cancelled=None):
+        self.ring = ring
+        self.seq = start_seq
+        self.timeout = timeout
+        self.consume = consume
+        self.cancelled = cancelled
+        self._pending = b""
+
+    def read(self, size):
+        """Return size samples of int16 audio, blocking for live audio as needed"""
+        wanted = size * 2
+        data = self._pending
+        while len(data) < wanted:
+            if self.cancelled is not None and self.cancelled.is_set():
+                # Looks like the end of the stream to the recognizer
+                self._pending = b""
+                return b""
+            frame, seq = self.ring.read_at(self.seq, self.timeout)
+            if frame is None:
+                break
+            data += frame.tobytes()
+            self.seq = seq + 1
+            if self.consume:
+                # Frames the recognizer has taken no longer hold back the writer
+                self.ring.advance(self.seq)
+        self._pending = data[wanted:]
+        return data[:wanted]
+
+class RingAudioSource(sr.AudioSource):
+    """SpeechRecognition audio source backed by an already running AudioCapture.
+
+    Starts a little before the wake word ended (pre-roll) and continues with
+    live audio, so there's no second device to open and no clipped first words.
+
+    By default the recognizer takes over the ring from the wake word detector.
+    With consume=False it reads alongside a detector that keeps listening on
+    another thread, leaving the detector's position alone. Setting the
+    cancelled event ends the stream early.
+    """
+
+    def __init__(self, capture, start_seq, timeout=1.0, consume=True, cancelled=None, live_seq=None):
+        self.capture = capture
+        self.start_seq = start_seq
+        self.timeout = timeout
+        self.consume = consume
+        self.cancelled = cancelled
+        # First frame after the wake word; frames before it are pre-roll
+        self.live_seq = start_seq if live_seq is None else live_seq
+        self.SAMPLE_RATE = capture.sample_rate
+        self.SAMPLE_WIDTH = 2
+        self.CHUNK = capture.frame_length
+        self.stream = None
+
+    def __enter__(self):
+        self.stream = _RingStream(self.capture.ring, self.start_seq, self.timeout, self.consume, self.cancelled)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.consume:
+            # Audio consumed by the recognizer shouldn't be fed to the wake word engine again
+            self.capture.ring.skip_to_latest()
+        self.stream = None
+
+    def frames(self):
+        """Yield (seq, frame copy) from start_seq onwards until cancelled or the audio ends"""
+        ring = self.capture.ring
+        seq = self.start_seq
+        while self.cancelled is None or not self.cancelled.is_set():
+            frame, seq = ring.read_at(seq, self.timeout)
+            if frame is None:
+                if ring.closed:
+                    return
+                continue
+            # Copy: the slot is reused once the writer laps the ring
+            yield seq, frame.copy()
+            seq += 1
+            if self.consume:
+                ring.advance(seq)
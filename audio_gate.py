@@ -0,0 +1,80 @@
+import math
+import numpy as np
+from config import (
+    VAD_GATE_RATIO, VAD_GATE_MIN_RMS, VAD_GATE_HANGOVER_FRAMES,
+    VAD_GATE_ZCR_CHECK, VAD_GATE_ZCR_MAX
+)
+
+class EnergyGate:
+    """Cheap voice-activity pre-gate that decides whether a frame is worth keyword inference.
+
+    A frame opens the gate when its RMS energy rises clearly above an adaptive
+    estimate of the background noise. The gate then stays open for a hangover
+    period so the end of a word isn't cut off.
+    """
+
+    def __init__(self, frame_length, ratio=VAD_GATE_RATIO, min_rms=VAD_GATE_MIN_RMS,
+                 hangover_frames=VAD_GATE_HANGOVER_FRAMES, zcr_check=VAD_GATE_ZCR_CHECK,
+                 zcr_max=VAD_GATE_ZCR_MAX, floor_alpha=0.05):
+        self.ratio = ratio
+        self.min_rms = min_rms
+        self.hangover_frames = hangover_frames
+        self.zcr_check = zcr_check
+        self.zcr_max = zcr_max
+        self.floor_alpha = floor_alpha
+        self.noise_floor = None
+        self._scratch = np.zeros(frame_length, dtype=np.float32)
+        self._hangover = 0
+        self.frames_total = 0
+        self.frames_passed = 0
+        self.openings = 0
+
+    def rms(self, frame):
+        # Copy into a preallocated float buffer so the dot product can't overflow int16
+        np.copyto(self._scratch, frame, casting='unsafe')
+        return math.sqrt(float(np.dot(self._scratch, self._scratch)) / len(self._scratch))
+
+    def _zero_crossing_rate(self):
+        signs = np.signbit(self._scratch)
+        return np.count_nonzero(signs[1:] != signs[:-1]) / len(signs)
+
+    def process(self, frame):
+        """Return True if the frame should go to the keyword engine"""
+        self.frames_total += 1
+        energy = self.rms(frame)
+        if self.noise_floor is None:
+            self.noise_floor = energy
+        threshold = max(self.min_rms, self.noise_floor * self.ratio)
+        active = energy > threshold
+        if active and self.zcr_check and self._zero_crossing_rate() > self.zcr_max:
+            # Loud but noise-like (hiss, fans): not voiced speech
+            active = False
+
+        if active:
+            # Track slow changes in the background (a fan switched on) even while loud
+            self.noise_floor += self.floor_alpha * 0.05 * (energy - self.noise_floor)
+            if self._hangover == 0:
+                self.openings += 1
+            self._hangover = self.hangover_frames
+        else:
+            self.noise_floor += self.floor_alpha * (energy - self.noise_floor)
+            if self._hangover == 0:
+                return False
+            self._hangover -= 1
+
+        self.frames_passed += 1
+        return True
+
+    def is_open(self):
+        return self._hangover > 0
+
+    def get_stats(self):
+        total = self.frames_total
+        return {
+            "frames_total": total,
+            "frames_passed": self.frames_passed,
+            "frames_skipped": total - self.frames_passed,
+            "skip_ratio": (total - self.frames_passed) / total if total else 0.0,
+            "openings": self.openings,
+            "noise_floor_rms": round(self.noise_floor or 0.0, 1)
+        }
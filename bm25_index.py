@@ -0,0 +1,73 @@
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for",
+    "from", "how", "i", "in", "is", "it", "me", "my", "of", "on", "or", "please",
+    "tell", "that", "the", "there", "this", "to", "us", "we", "what", "when",
+    "which", "who", "with", "you", "your"
+}
+
+def stem(token):
+    """Very light suffix stripping so plurals match their singular"""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+def tokenize(text):
+    return [stem(token) for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOP_WORDS]
+
+class BM25Index:
+    """Inverted index with Okapi BM25 scoring"""
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.idf = {}
+        self.doc_lengths = []
+        self.avg_doc_length = 0.0
+
+    def build(self, documents):
+        """Index a list of document strings; document ids are list positions"""
+        postings = defaultdict(list)
+        doc_lengths = []
+        for doc_id, text in enumerate(documents):
+            counts = Counter(tokenize(text))
+            doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings[term].append((doc_id, tf))
+
+        num_docs = len(documents)
+        self.postings = dict(postings)
+        self.doc_lengths = doc_lengths
+        self.avg_doc_length = sum(doc_lengths) / num_docs if num_docs else 0.0
+        self.idf = {
+            term: math.log(1 + (num_docs - len(plist) + 0.5) / (len(plist) + 0.5))
+            for term, plist in self.postings.items()
+        }
+
+    def search(self, query, top_k=5):
+        """Return [(doc_id, score), ...] best first.
+
+        Only the posting lists of the query terms are visited, so the cost
+        depends on how common the query terms are rather than on corpus size.
+        """
+        scores = defaultdict(float)
+        k1 = self.k1
+        b = self.b
+        avg = self.avg_doc_length or 1.0
+        for term in set(tokenize(query)):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = self.idf[term]
+            for doc_id, tf in plist:
+                norm = k1 * (1 - b + b * self.doc_lengths[doc_id] / avg)
+                scores[doc_id] += idf * tf * (k1 + 1) / (tf + norm)
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
@@ -45,5 +45,133 @@ AUDIO_DEVICE_INDEX = int(os.getenv("AUDIO_DEVICE_INDEX", "0"))
 SAMPLE_RATE = 16000
 CHANNELS = 1
 
+# Audio capture
+# Seconds of audio kept in the capture ring buffer
+AUDIO_BUFFER_SECONDS = float(os.getenv("AUDIO_BUFFER_SECONDS", "2"))
+# Audio from just before the wake word was detected that is handed to command recognition
+COMMAND_PRE_ROLL_SECONDS = float(os.getenv("COMMAND_PRE_ROLL_SECONDS", "0.5"))
+# Play this WAV/raw PCM recording (mono, 16-bit, SAMPLE_RATE) in real time instead of using the microphone
+AUDIO_INPUT_FILE = os.getenv("AUDIO_INPUT_FILE", "")
+
+# Command recognition
+# Seconds to wait for the visitor to start the command after the wake word
+COMMAND_LISTEN_TIMEOUT = float(os.getenv("COMMAND_LISTEN_TIMEOUT", "5"))
+# Backend: "google" (SpeechRecognition web API), "vosk" (offline, needs VOSK_MODEL_PATH)
+# or "scripted" (replays ASR_SCRIPTED_TRANSCRIPTS, for tests without a network)
+ASR_BACKEND = os.getenv("ASR_BACKEND", "google").lower()
+VOSK_MODEL_PATH = os.getenv("VOSK_MODEL_PATH", "")
+ASR_SCRIPTED_TRANSCRIPTS = [t.strip() for t in os.getenv("ASR_SCRIPTED_TRANSCRIPTS", "").split("|") if t.strip()]
+# Endpointing: the command ends after this much silence following speech
+ASR_TRAILING_SILENCE_MS = int(os.getenv("ASR_TRAILING_SILENCE_MS", "300"))
+# ...or this much while less than ASR_SHORT_UTTERANCE_MS has been said (visitors pause after a few words)
+ASR_HESITATION_SILENCE_MS = int(os.getenv("ASR_HESITATION_SILENCE_MS", "700"))
+ASR_SHORT_UTTERANCE_MS = int(os.getenv("ASR_SHORT_UTTERANCE_MS", "600"))
+ASR_MIN_SPEECH_MS = int(os.getenv("ASR_MIN_SPEECH_MS", "90"))         # Loud audio needed to count as speech
+ASR_PADDING_MS = int(os.getenv("ASR_PADDING_MS", "200"))              # Audio kept from before speech starts
+ASR_MAX_COMMAND_SECONDS = float(os.getenv("ASR_MAX_COMMAND_SECONDS", "10"))
+
+# Speculative answers
+# Start answering once the partial transcript has been stable this long (needs a backend with partials)
+SPECULATION_ENABLED = os.getenv("SPECULATION_ENABLED", "true").lower() == "true"
+SPECULATION_STABLE_MS = int(os.getenv("SPECULATION_STABLE_MS", "250"))
+SPECULATION_MIN_WORDS = int(os.getenv("SPECULATION_MIN_WORDS", "2"))        # Don't guess from one word
+SPECULATION_MAX_PER_TURN = int(os.getenv("SPECULATION_MAX_PER_TURN", "2"))  # Bounds wasted requests
+
+# Voice pipeline
+# Turns waiting between pipeline stages; a newer turn replaces a waiting one when full
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "1"))
+
 # AI Settings
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+# Override to point at a proxy or a local mock server
+GEMINI_API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta")
+# Stream responses and speak each sentence as soon as it is complete
+GEMINI_STREAMING = os.getenv("GEMINI_STREAMING", "true").lower() == "true"
+
+# Gemini HTTP client settings
+GEMINI_CONNECT_TIMEOUT = float(os.getenv("GEMINI_CONNECT_TIMEOUT", "3.05"))
+GEMINI_READ_TIMEOUT = float(os.getenv("GEMINI_READ_TIMEOUT", "15"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "2"))
+GEMINI_BACKOFF_BASE = float(os.getenv("GEMINI_BACKOFF_BASE", "0.5"))   # Seconds, doubled per retry
+GEMINI_BACKOFF_MAX = float(os.getenv("GEMINI_BACKOFF_MAX", "4"))
+GEMINI_REQUEST_DEADLINE = float(os.getenv("GEMINI_REQUEST_DEADLINE", "20"))  # No retries past this
+GEMINI_BREAKER_THRESHOLD = int(os.getenv("GEMINI_BREAKER_THRESHOLD", "3"))  # Consecutive failures
+GEMINI_BREAKER_COOLDOWN = float(os.getenv("GEMINI_BREAKER_COOLDOWN", "30"))  # Seconds to fail fast
+GEMINI_POOL_SIZE = int(os.getenv("GEMINI_POOL_SIZE", "4"))
+
+# Response cache settings
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "response_cache.json")
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "500"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "86400"))  # Seconds
+# Token-overlap (Jaccard) threshold for near-duplicate matches; 0 disables fuzzy matching
+RESPONSE_CACHE_FUZZY_THRESHOLD = float(os.getenv("RESPONSE_CACHE_FUZZY_THRESHOLD", "0"))
+
+# Rendered speech cache: frequent phrases are synthesized once and replayed from WAV files
+TTS_CACHE_ENABLED = os.getenv("TTS_CACHE_ENABLED", "true").lower() == "true"
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", ".tts_cache")
+TTS_CACHE_MAX_MB = float(os.getenv("TTS_CACHE_MAX_MB", "50"))
+# A phrase synthesized live this many times is rendered into the cache
+TTS_CACHE_MIN_REPEATS = int(os.getenv("TTS_CACHE_MIN_REPEATS", "2"))
+# Extra phrases to render at startup, separated by "|"
+TTS_WARM_PHRASES = [p.strip() for p in os.getenv("TTS_WARM_PHRASES", "").split("|") if p.strip()]
+
+# Retrieval settings
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "4"))  # Chunks per prompt
+RAG_MAX_CONTEXT_CHARS = int(os.getenv("RAG_MAX_CONTEXT_CHARS", "2000"))  # Roughly 4 chars per token
+# "bm25" (keywords), "semantic" (hashed n-gram vectors) or "hybrid" (both, rank-fused)
+RAG_RETRIEVAL_MODE = os.getenv("RAG_RETRIEVAL_MODE", "hybrid").lower()
+RAG_INDEX_DIR = os.getenv("RAG_INDEX_DIR", ".rag_index")
+RAG_EMBEDDING_DIM = int(os.getenv("RAG_EMBEDDING_DIM", "1024"))
+RAG_MIN_SIMILARITY = float(os.getenv("RAG_MIN_SIMILARITY", "0.2"))  # Cosine cut-off for semantic hits
+DOCS_MANIFEST_PATH = os.getenv("DOCS_MANIFEST_PATH", os.path.join(RAG_INDEX_DIR, "docs_manifest.json"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "0"))  # 0 = one worker per CPU core
+
+# Poll college_data.json for edits every N seconds and hot-swap it in (0 disables)
+DATA_RELOAD_INTERVAL = float(os.getenv("DATA_RELOAD_INTERVAL", "2"))
+# How retrieved data is serialized into the prompt: "json" (compact) or "text" (fewest tokens)
+RAG_CONTEXT_FORMAT = os.getenv("RAG_CONTEXT_FORMAT", "text").lower()
+
+# Answer simple factual questions (contact, location, departments, accreditation) locally
+FAST_ANSWERS_ENABLED = os.getenv("FAST_ANSWERS_ENABLED", "true").lower() == "true"
+FAST_ANSWER_MIN_CONFIDENCE = float(os.getenv("FAST_ANSWER_MIN_CONFIDENCE", "0.75"))
+# Lower bar used only when Gemini is unreachable; still high enough to turn down questions about something else
+FAST_ANSWER_DEGRADED_MIN_CONFIDENCE = float(os.getenv("FAST_ANSWER_DEGRADED_MIN_CONFIDENCE", "0.6"))
+
+# Energy gate in front of the wake word engine: skip inference on silent frames
+VAD_GATE_ENABLED = os.getenv("VAD_GATE_ENABLED", "true").lower() == "true"
+VAD_GATE_RATIO = float(os.getenv("VAD_GATE_RATIO", "3.0"))        # Times the noise floor RMS
+VAD_GATE_MIN_RMS = float(os.getenv("VAD_GATE_MIN_RMS", "150"))    # Absolute minimum (int16 RMS)
+VAD_GATE_HANGOVER_FRAMES = int(os.getenv("VAD_GATE_HANGOVER_FRAMES", "16"))  # Stay open ~0.5 s
+VAD_GATE_LOOKBACK_FRAMES = int(os.getenv("VAD_GATE_LOOKBACK_FRAMES", "10"))  # Replay ~0.3 s at onset
+VAD_GATE_ZCR_CHECK = os.getenv("VAD_GATE_ZCR_CHECK", "false").lower() == "true"
+VAD_GATE_ZCR_MAX = float(os.getenv("VAD_GATE_ZCR_MAX", "0.5"))   # Zero crossings per sample
+# Last working wake word engine configuration, tried first on the next boot
+WAKE_INIT_CACHE_PATH = os.getenv("WAKE_INIT_CACHE_PATH", ".wake_init.json")
+
+# Servo controller serial port (a servo_emulator.py pty works too) and how long the board takes to reset on open
+SERVO_PORT = os.getenv("SERVO_PORT", "COM3")
+SERVO_RESET_DELAY = float(os.getenv("SERVO_RESET_DELAY", "2"))
+
+# Per-stage latency tracing: spans to a rotating JSONL file, histograms on a local Prometheus endpoint
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+TRACE_PATH = os.getenv("TRACE_PATH", "traces.jsonl")  # Empty keeps metrics only
+TRACE_MAX_MB = float(os.getenv("TRACE_MAX_MB", "10"))
+TRACE_BACKUPS = int(os.getenv("TRACE_BACKUPS", "5"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))  # 0 disables the endpoint
+KIOSK_ID = os.getenv("KIOSK_ID", platform.node() or "kiosk")
+
+# Shared answer server (answer_server.py). With ANSWER_SERVER_URL set, kiosks ask it instead of running RAG and Gemini locally
+ANSWER_SERVER_URL = os.getenv("ANSWER_SERVER_URL", "").strip()
+ANSWER_SERVER_HOST = os.getenv("ANSWER_SERVER_HOST", "0.0.0.0")
+ANSWER_SERVER_PORT = int(os.getenv("ANSWER_SERVER_PORT", "8765"))
+ANSWER_SERVER_WORKERS = int(os.getenv("ANSWER_SERVER_WORKERS", "8"))          # Concurrent upstream answers
+ANSWER_SERVER_MAX_QUEUED = int(os.getenv("ANSWER_SERVER_MAX_QUEUED", "4"))    # Waiting questions per kiosk
+# Seconds a question may wait for a worker before the server answers that it is busy
+ANSWER_SERVER_MAX_WAIT = float(os.getenv("ANSWER_SERVER_MAX_WAIT", "10"))
+# Kiosk side: covers the wait for a worker as well as the server's own Gemini request
+ANSWER_SERVER_READ_TIMEOUT = float(
+    os.getenv("ANSWER_SERVER_READ_TIMEOUT", str(ANSWER_SERVER_MAX_WAIT + GEMINI_REQUEST_DEADLINE))
+)
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Document types read from docs_dir
+DOC_EXTENSIONS = (".txt", ".md", ".json")
+
+# Target size of a document chunk
+DOC_CHUNK_CHARS = 1500
+
+# Manifest layout version; bump when chunking changes so everything is re-indexed
+MANIFEST_VERSION = 1
+
+def split_document(text, max_chars=DOC_CHUNK_CHARS):
+    """Group a document's paragraphs into chunks of at most max_chars"""
+    chunks = []
+    current = ""
+    for paragraph in (p.strip() for p in text.split("\n\n")):
+        if not paragraph:
+            continue
+        if current and len(current) + len(paragraph) > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        chunks.append(current)
+    return chunks
+
+def make_doc_chunk(name, position, body):
+    """Retrieval chunk for one piece of a document"""
+    return {
+        "id": f"{name}#{position}",
+        "section": "documents",
+        "label": name,
+        "value": body,
+        "text": f"{name}\n{body}",
+        "index_text": f"{name} {body}"
+    }
+
+def _json_to_text(data):
+    """Render a JSON document as one paragraph per top-level entry"""
+    if isinstance(data, dict):
+        entries = [f"{key}: {json.dumps(value, ensure_ascii=False)}" for key, value in data.items()]
+    elif isinstance(data, list):
+        entries = [json.dumps(item, ensure_ascii=False) for item in data]
+    else:
+        entries = [json.dumps(data, ensure_ascii=False)]
+    return "\n\n".join(entries)
+
+def process_file(job):
+    """Read, hash and split one file. Runs in a worker process."""
+    path, name = job
+    try:
+        with open(path, 'rb') as f:
+            raw = f.read()
+    except OSError as e:
+        print(f"Error reading {path}: {e}")
+        return name, None, []
+    digest = hashlib.sha1(raw).hexdigest()
+    text = raw.decode('utf-8', errors='replace')
+    if name.lower().endswith(".json"):
+        try:
+            text = _json_to_text(json.loads(text))
+        except ValueError:
+            pass
+    return name, digest, split_document(text)
+
+class DocumentIngestor:
+    """Incrementally chunk the files in docs_dir, re-processing only what changed"""
+
+    def __init__(self, docs_dir, manifest_path, workers=None, parallel_threshold=8):
+        self.docs_dir = docs_dir
+        self.manifest_path = manifest_path
+        self.workers = workers or os.cpu_count() or 1
+        # Spinning up a process pool costs more than chunking a handful of files
+        self.parallel_threshold = parallel_threshold
+
+    def _scan(self):
+        """Map of relative path -> (absolute path, mtime_ns, size)"""
+        files = {}
+        if not os.path.isdir(self.docs_dir):
+            return files
+        for root, _, names in os.walk(self.docs_dir):
+            for name in names:
+                if not name.lower().endswith(DOC_EXTENSIONS):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                rel = os.path.relpath(path, self.docs_dir).replace(os.sep, "/")
+                files[rel] = (path, st.st_mtime_ns, st.st_size)
+        return files
+
+    def load_manifest(self):
+        try:
+            with open(self.manifest_path, 'r') as f:
+                manifest = json.load(f)
+            if manifest.get("version") == MANIFEST_VERSION:
+                return manifest.get("files", {})
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error reading docs manifest, re-indexing all documents: {e}")
+        return {}
+
+    def save_manifest(self, files):
+        try:
+            os.makedirs(os.path.dirname(self.manifest_path) or ".", exist_ok=True)
+            tmp_path = f"{self.manifest_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({"version": MANIFEST_VERSION, "files": files}, f)
+            os.replace(tmp_path, self.manifest_path)
+        except Exception as e:
+            print(f"Error saving docs manifest: {e}")
+
+    def ingest(self):
+        """Return chunks for every document, re-chunking only new or modified files"""
+        start = time.monotonic()
+        previous = self.load_manifest()
+        current = self._scan()
+
+        files = {}
+        jobs = []
+        for rel, (path, mtime_ns, size) in current.items():
+            entry = previous.get(rel)
+            if entry and entry["mtime_ns"] == mtime_ns and entry["size"] == size:
+                files[rel] = entry
+            else:
+                jobs.append((path, rel))
+
+        changed = 0
+        if jobs:
+            if len(jobs) >= self.parallel_threshold and self.workers > 1:
+                with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                    chunksize = max(1, len(jobs) // (self.workers * 4))
+                    results = list(pool.map(process_file, jobs, chunksize=chunksize))
+            else:
+                results = [process_file(job) for job in jobs]
+
+            for rel, digest, chunks in results:
+                if digest is None:
+                    # Unreadable right now; left out of the manifest so it is retried next run
+                    continue
+                _, mtime_ns, size = current[rel]
+                old = previous.get(rel)
+                if not old or old["sha1"] != digest:
+                    changed += 1
+                files[rel] = {"mtime_ns": mtime_ns, "size": size, "sha1": digest, "chunks": chunks}
+
+        removed = len(set(previous) - set(current))
+        if jobs or removed:
+            self.save_manifest(files)
+
+        elapsed = time.monotonic() - start
+        print(f"Documents: {len(files)} files, {changed} re-indexed, {removed} removed ({elapsed:.2f}s)")
+
+        chunks = []
+        for rel in sorted(files):
+            # The manifest stores only chunk bodies to keep it small
+            chunks.extend(make_doc_chunk(rel, i, body) for i, body in enumerate(files[rel]["chunks"]))
+        return chunks
@@ -0,0 +1,134 @@
+import re
+from config import FAST_ANSWER_MIN_CONFIDENCE
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Words that carry no intent of their own ("what is the ...", "can you tell me ...")
+FILLER_WORDS = {
+    "a", "an", "the", "is", "are", "was", "what", "whats", "where", "which", "how",
+    "can", "could", "would", "will", "do", "does", "i", "me", "my", "we", "you",
+    "your", "yours", "please", "tell", "give", "know", "to", "of", "for", "at",
+    "in", "on", "it", "its", "there", "this", "that", "college", "kjc", "hi",
+    "hello", "hey", "um", "uh", "s", "get", "find", "about", "any", "all", "list",
+    "us", "have", "has", "offer", "offered", "available", "and", "or", "some"
+}
+
+# intent -> (trigger pattern, vocabulary that may appear in a question for this intent)
+INTENTS = {
+    "phone": (
+        r"\b(phone|telephone|call|mobile|contact number)\b",
+        {"phone", "telephone", "number", "call", "mobile", "contact", "landline"}
+    ),
+    "email": (
+        r"\b(e-?mail|mail id|mail address)\b",
+        {"email", "e", "mail", "id", "address", "contact"}
+    ),
+    "contact": (
+        r"\b(contact|reach you|get in touch)\b",
+        {"contact", "details", "detail", "info", "information", "reach", "touch", "get", "in"}
+    ),
+    "location": (
+        r"\b(where|located|location|address|directions?)\b",
+        {"located", "location", "address", "directions", "direction", "situated", "campus", "reach"}
+    ),
+    "departments": (
+        r"\b(departments?|courses?|programs?|programmes?)\b",
+        {"department", "departments", "course", "courses", "program", "programs",
+         "programme", "programmes", "study", "name", "names"}
+    ),
+    "accreditation": (
+        r"\b(accredit\w*|naac|affiliat\w*|recogni[sz]ed)\b",
+        {"accredited", "accreditation", "naac", "grade", "affiliated", "affiliation",
+         "recognised", "recognized", "status"}
+    )
+}
+
+class FastAnswerMatcher:
+    """Answer simple factual questions from college data without calling the LLM"""
+
+    def __init__(self, rag_handler, min_confidence=FAST_ANSWER_MIN_CONFIDENCE):
+        self.rag_handler = rag_handler
+        self.min_confidence = min_confidence
+        self.patterns = {intent: re.compile(pattern) for intent, (pattern, _) in INTENTS.items()}
+
+    def classify(self, query):
+        """Return (intent, confidence) for the best matching intent, or (None, 0.0).
+
+        Confidence is the share of the question's content words that belong to
+        the intent's vocabulary, so "what is the phone number" scores 1.0 while
+        "phone number of the physics department" scores low and goes to the LLM.
+        """
+        text = query.lower()
+        content = [word for word in TOKEN_PATTERN.findall(text) if word not in FILLER_WORDS]
+        best_intent, best_confidence = None, 0.0
+        for intent, pattern in self.patterns.items():
+            if not pattern.search(text):
+                continue
+            vocabulary = INTENTS[intent][1]
+            covered = sum(1 for word in content if word in vocabulary)
+            confidence = covered / len(content) if content else 0.8
+            if confidence > best_confidence:
+                best_intent, best_confidence = intent, confidence
+        return best_intent, best_confidence
+
+    def answer(self, query, min_confidence=None):
+        """Templated answer for a high-confidence factual question, or None"""
+        threshold = self.min_confidence if min_confidence is None else min_confidence
+        intent, confidence = self.classify(query)
+        if intent is None or confidence < threshold:
+            return None
+        info = (self.rag_handler.college_data or {}).get("institution", {})
+        return getattr(self, f"_answer_{intent}")(info)
+
+    @staticmethod
+    def _name(info):
+        return info.get("name", "the college")
+
+    def _answer_phone(self, info):
+        phone = info.get("contact", {}).get("phone")
+        if not phone:
+            return None
+        return f"You can reach {self._name(info)} by phone at {phone}."
+
+    def _answer_email(self, info):
+        email = info.get("contact", {}).get("email")
+        if not email:
+            return None
+        return f"You can email {self._name(info)} at {email}."
+
+    def _answer_contact(self, info):
+        contact = info.get("contact", {})
+        phone, email = contact.get("phone"), contact.get("email")
+        if phone and email:
+            return f"You can reach {self._name(info)} by phone at {phone} or by email at {email}."
+        return self._answer_phone(info) or self._answer_email(info)
+
+    def _answer_location(self, info):
+        location = info.get("location") or info.get("contact", {}).get("address")
+        if isinstance(location, dict):
+            location = ", ".join(str(value) for value in location.values() if isinstance(value, (str, int)))
+        if not location:
+            return None
+        return f"{self._name(info)} is located at {location}."
+
+    def _answer_departments(self, info):
+        names = [
+            dept.get("name") if isinstance(dept, dict) else str(dept)
+            for dept in info.get("departments", [])
+        ]
+        names = [name for name in names if name]
+        if not names:
+            return None
+        if len(names) == 1:
+            return f"{self._name(info)} has the {names[0]}."
+        shown = names[:10]
+        listing = ", ".join(shown[:-1]) + f" and {shown[-1]}"
+        if len(names) > len(shown):
+            listing = ", ".join(shown) + f", and {len(names) - len(shown)} more"
+        return f"{self._name(info)} has the following departments: {listing}."
+
+    def _answer_accreditation(self, info):
+        accreditation = info.get("accreditation")
+        if not accreditation:
+            return None
+        return f"{self._name(info)} is accredited as follows: {accreditation}."
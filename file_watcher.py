@@ -0,0 +1,52 @@
+import os
+import threading
+
+class FileWatcher:
+    """Poll files for changes in a background thread and call back when one settles"""
+
+    def __init__(self, paths, callback, interval=2.0):
+        self.paths = list(paths)
+        self.callback = callback
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._last_seen = {path: self._stat(path) for path in self.paths}
+
+    @staticmethod
+    def _stat(path):
+        try:
+            st = os.stat(path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="FileWatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval + 1)
+
+    def _run(self):
+        pending = {}
+        while not self._stop_event.wait(self.interval):
+            for path in self.paths:
+                current = self._stat(path)
+                if current == self._last_seen[path]:
+                    pending.pop(path, None)
+                    continue
+                # Wait until the file looks the same on two polls in a row so
+                # editors that write in several steps don't trigger half-written reloads
+                if pending.get(path) != current:
+                    pending[path] = current
+                    continue
+                pending.pop(path)
+                self._last_seen[path] = current
+                if current is None:
+                    continue
+                try:
+                    self.callback(path)
+                except Exception as e:
+                    print(f"Error handling change to {path}: {e}")
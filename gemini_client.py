@@ -0,0 +1,188 @@
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from config import (
+    GEMINI_CONNECT_TIMEOUT, GEMINI_READ_TIMEOUT, GEMINI_MAX_RETRIES,
+    GEMINI_BACKOFF_BASE, GEMINI_BACKOFF_MAX, GEMINI_REQUEST_DEADLINE,
+    GEMINI_BREAKER_THRESHOLD, GEMINI_BREAKER_COOLDOWN, GEMINI_POOL_SIZE
+)
+
+class CircuitOpenError(Exception):
+    """Raised when the backend is marked as down and requests are short-circuited"""
+
+class GeminiClient:
+    """Persistent, connection-pooled HTTP client for the Gemini backend"""
+    RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+    def __init__(self, connect_timeout=GEMINI_CONNECT_TIMEOUT, read_timeout=GEMINI_READ_TIMEOUT,
+                 max_retries=GEMINI_MAX_RETRIES, backoff_base=GEMINI_BACKOFF_BASE,
+                 backoff_max=GEMINI_BACKOFF_MAX, deadline=GEMINI_REQUEST_DEADLINE,
+                 breaker_threshold=GEMINI_BREAKER_THRESHOLD, breaker_cooldown=GEMINI_BREAKER_COOLDOWN,
+                 pool_size=GEMINI_POOL_SIZE, retry_status_codes=None):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.deadline = deadline
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.retry_status_codes = self.RETRY_STATUS_CODES if retry_status_codes is None else set(retry_status_codes)
+
+        # Keep-alive sessions reuse TCP+TLS connections between questions.
+        # Retries are handled here rather than by urllib3 so they can be counted
+        # and bounded by the overall deadline.
+        self.session = requests.Session()
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+        self.session.headers.update({'Content-Type': 'application/json'})
+
+        self._lock = threading.Lock()
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self.stats = {
+            "requests": 0,
+            "attempts": 0,
+            "retries": 0,
+            "failures": 0,
+            "short_circuited": 0,
+            "circuit_opens": 0
+        }
+
+    def post(self, url, json=None, stream=False):
+        """POST with timeouts, jittered exponential backoff and circuit breaking"""
+        self._before_request()
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            response = None
+            error = None
+            with self._lock:
+                self.stats["attempts"] += 1
+            try:
+                response = self.session.post(url, json=json, timeout=self.timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            except requests.RequestException:
+                # Broken response or TLS failure: not retried, but the backend isn't healthy
+                self._record_failure()
+                raise
+            except BaseException:
+                # Not the backend's fault (bad request body, interrupt); don't hold a half-open trial forever
+                self._release_trial()
+                raise
+
+            if response is not None and response.status_code not in self.retry_status_codes:
+                # Non-retryable statuses (including 4xx) mean the backend is reachable
+                self._record_success()
+                return response
+
+            delay = self._backoff_delay(attempt, response)
+            out_of_time = time.monotonic() - start + delay > self.deadline
+            if attempt >= self.max_retries or out_of_time:
+                self._record_failure()
+                if response is not None:
+                    return response
+                raise error
+
+            if response is not None:
+                response.close()
+            attempt += 1
+            with self._lock:
+                self.stats["retries"] += 1
+            try:
+                time.sleep(delay)
+            except BaseException:
+                self._release_trial()
+                raise
+
+    def warm_up(self, url):
+        """Open a pooled connection in the background so the next request skips the handshake"""
+        def _warm():
+            try:
+                self.session.head(url, timeout=self.timeout).close()
+            except Exception:
+                pass
+        threading.Thread(target=_warm, daemon=True).start()
+
+    def _backoff_delay(self, attempt, response):
+        """Full-jitter exponential backoff, honouring Retry-After when present"""
+        ceiling = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return min(self.backoff_max, float(retry_after))
+        return random.uniform(0, ceiling)
+
+    def _before_request(self):
+        with self._lock:
+            self.stats["requests"] += 1
+            if self._opened_at is None:
+                return
+            # Open: fail fast until the cooldown passes, then let one trial request through
+            if time.monotonic() - self._opened_at < self.breaker_cooldown or self._trial_in_flight:
+                self.stats["short_circuited"] += 1
+                raise CircuitOpenError("Gemini backend unavailable (circuit open)")
+            self._trial_in_flight = True
+
+    def _record_success(self):
+        with self._lock:
+            self._consecutive_failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def _release_trial(self):
+        with self._lock:
+            self._trial_in_flight = False
+
+    def _record_failure(self):
+        with self._lock:
+            self.stats["failures"] += 1
+            self._consecutive_failures += 1
+            if self._trial_in_flight or self._consecutive_failures >= self.breaker_threshold:
+                if self._opened_at is None or self._trial_in_flight:
+                    self.stats["circuit_opens"] += 1
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+                print(f"Gemini circuit open for {self.breaker_cooldown}s after {self._consecutive_failures} failures")
+
+    @property
+    def circuit_state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.breaker_cooldown:
+                return "half-open"
+            return "open"
+
+    def pool_stats(self):
+        """Connections opened vs. requests sent over pooled connections"""
+        opened = 0
+        sent = 0
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            opened += getattr(pool, "num_connections", 0)
+            sent += getattr(pool, "num_requests", 0)
+        return {
+            "connections_opened": opened,
+            "requests_sent": sent,
+            "reuse_ratio": (sent - opened) / sent if sent else 0.0
+        }
+
+    def get_stats(self):
+        """Snapshot of request, retry and connection-reuse counters"""
+        with self._lock:
+            stats = dict(self.stats)
+        stats["retry_rate"] = stats["retries"] / stats["attempts"] if stats["attempts"] else 0.0
+        stats["circuit_state"] = self.circuit_state
+        stats.update(self.pool_stats())
+        return stats
+
+    def close(self):
+        self.session.close()
@@ -1,9 +1,12 @@
 from wake_word_detector import WakeWordDetector
-from ai_handler import AIHandler
+from ai_handler import AIHandler, BUSY_RESPONSE, ERROR_RESPONSE, UNAVAILABLE_RESPONSE
+from remote_ai_handler import RemoteAIHandler
 from speech_handler import SpeechHandler
-from config import WAKE_WORD, IS_ARM64, USE_API_ONLY_MODE
-import time
-import speech_recognition as sr
+from pipeline import VoicePipeline
+from asr import CommandRecognizer, GoogleBackend, create_backend
+from speculation import Speculator
+from tracing import get_tracer
+from config import WAKE_WORD, IS_ARM64, USE_API_ONLY_MODE, GEMINI_STREAMING, TTS_WARM_PHRASES, SERVO_PORT, ASR_BACKEND, SPECULATION_ENABLED, ANSWER_SERVER_URL
 import os
 
 def handle_text_input(ai_handler, speech_handler):
@@ -14,16 +17,33 @@ def handle_text_input(ai_handler, speech_handler):
             return False
         
         if user_input.strip():
-            response = ai_handler.get_response(user_input)
-            print(f"AI Response: {response}")
-            speech_handler.speak(response)
+            # A new question cuts off the previous answer
+            speech_handler.stop()
+            if GEMINI_STREAMING:
+                response = speech_handler.speak_stream(ai_handler.stream_response(user_input))
+                print(f"AI Response: {response}")
+            else:
+                response = ai_handler.get_response(user_input)
+                print(f"AI Response: {response}")
+                speech_handler.speak(response)
         return True
     except KeyboardInterrupt:
         return False
 
+def create_asr_backend():
+    """The configured speech recognition backend, or Google's if it can't be loaded"""
+    try:
+        backend = create_backend(ASR_BACKEND)
+    except Exception as e:
+        print(f"ASR backend '{ASR_BACKEND}' unavailable: {e}")
+        print("Falling back to Google speech recognition.")
+        return GoogleBackend()
+    print(f"Speech recognition backend: {backend.name}")
+    return backend
+
 def main():
-    # Check for college_data.json and provide guidance if it's missing
-    if not os.path.exists('college_data.json'):
+    # Check for college_data.json and provide guidance if it's missing (the answer server has its own)
+    if not ANSWER_SERVER_URL and not os.path.exists('college_data.json'):
         print("\nWARNING: college_data.json not found! Creating a default version...")
         try:
             # This will be empty in this context but will be populated in the actual file creation
@@ -36,8 +56,16 @@ def main():
             return
             
     # Initialize handlers that don't depend on wake word detection
-    ai_handler = AIHandler()
+    if ANSWER_SERVER_URL:
+        # Thin client: retrieval and answering happen on the shared answer server
+        print(f"Answering through {ANSWER_SERVER_URL}")
+        ai_handler = RemoteAIHandler()
+    else:
+        ai_handler = AIHandler()
     speech_handler = SpeechHandler()
+    # Render stock phrases in the background so they play instantly when needed
+    stock_phrases = [ERROR_RESPONSE, UNAVAILABLE_RESPONSE] + ([BUSY_RESPONSE] if ANSWER_SERVER_URL else [])
+    speech_handler.warm_cache(stock_phrases + TTS_WARM_PHRASES)
     
     # Try to initialize the wake word detector
     wake_detector = None
@@ -55,20 +83,17 @@ def main():
         print("Continuing with available capabilities...\n")
     
     try:
-        # List available wake words before starting
-        WakeWordDetector.list_wake_words()
-        
-        # First test Porcupine installation in the current mode (API or local)
-        WakeWordDetector.test_porcupine_installation()
-        
-        # Initialize the wake word detector
+        # Initialize the wake word detector (diagnostics run only if initialization fails)
         wake_detector = WakeWordDetector()
-        recognizer = sr.Recognizer()
+        command_recognizer = CommandRecognizer(create_asr_backend())
         
         # Use the actual wake word that was successfully initialized
         active_wake_word = wake_detector.get_active_wake_word() or WAKE_WORD
         
         print(f"\nSystem ready - Say '{active_wake_word}' to start...")
+        other_keywords = [k for k in wake_detector.get_keywords() if k != active_wake_word]
+        if other_keywords:
+            print(f"Also listening for: {', '.join(other_keywords)}")
         print("Press Ctrl+C to exit")
         
     except ValueError as e:
@@ -89,7 +114,7 @@ def main():
         # Change the port to match your Arduino connection
         # Windows: "COM3", "COM4", etc.
         # Linux: "/dev/ttyACM0", "/dev/ttyUSB0", etc.
-        servo_controller = ServoInterface(port="COM3")
+        servo_controller = ServoInterface(port=SERVO_PORT)
         if servo_controller.connect():
             print("Servo controller connected successfully")
             # Center the servos at startup
@@ -102,51 +127,15 @@ def main():
         print(f"Error initializing servo controller: {e}")
         servo_controller = None
     
+    pipeline = None
     try:
         if voice_mode and wake_detector:
-            # Voice mode with wake word detection
-            while True:
-                wake_word_detected = wake_detector.listen()
-                
-                if wake_word_detected:
-                    print(f"\nWake word '{active_wake_word}' detected! Listening for command...")
-                    
-                    # Move servo to listening position if available
-                    if servo_controller:
-                        servo_controller.motion_pattern("listening")
-                        
-                    # Listen for command using speech recognition
-                    with sr.Microphone() as source:
-                        try:
-                            audio = recognizer.listen(source, timeout=5)
-                            command = recognizer.recognize_google(audio)
-                            print(f"Command: {command}")
-                            
-                            # Filter out wake word from command
-                            filtered_command = command.lower().replace(active_wake_word.lower(), "").strip()
-                            if filtered_command:  # Only process if command remains after filtering
-                                # Move servo to thinking position if available
-                                if servo_controller:
-                                    servo_controller.motion_pattern("thinking")
-                                    
-                                response = ai_handler.get_response(filtered_command)
-                                print(f"AI Response: {response}")
-                                
-                                # React to the emotional content of the response
-                                if servo_controller:
-                                    servo_controller.react_to_emotions(response)
-                                    
-                                speech_handler.speak(response)
-                            else:
-                                print("No command after filtering wake word")
-                        except sr.WaitTimeoutError:
-                            print("No command heard")
-                        except sr.UnknownValueError:
-                            print("Could not understand the command")
-                        except Exception as e:
-                            print(f"Error: {str(e)}")
-                    
-                time.sleep(0.01)  # Reduced sleep time for better responsiveness
+            # Voice mode: wake word, recognition and answering run as overlapping stages
+            # Answering starts on a settled partial transcript when the ASR backend streams partials
+            speculator = Speculator(ai_handler) if SPECULATION_ENABLED and command_recognizer.backend.streaming else None
+            pipeline = VoicePipeline(wake_detector, command_recognizer, ai_handler, speech_handler,
+                                     servo_controller, speculator=speculator)
+            pipeline.run()
         else:
             # Text-based input mode
             print("\nText-based input mode active.")
@@ -157,12 +146,27 @@ def main():
     except KeyboardInterrupt:
         print("\nStopping...")
     finally:
+        if pipeline:
+            pipeline.stop()
+            print(f"Pipeline stats: {pipeline.get_stats()}")
+            print(f"ASR stats: {command_recognizer.get_stats()}")
+            if pipeline.speculator:
+                print(f"Speculation stats: {pipeline.speculator.get_stats()}")
+        print(f"Gemini client stats: {ai_handler.get_stats()}")
+        print(f"Speech stats: {speech_handler.get_stats()}")
+        speech_handler.close()
+        ai_handler.close()
         if wake_detector:
             wake_detector.cleanup()
         if servo_controller:
             # Return to center position and disconnect
             servo_controller.center()
             servo_controller.disconnect()
+            print(f"Servo stats: {servo_controller.get_stats()}")
+        tracer = get_tracer()
+        if tracer.enabled:
+            print(f"Latency by stage: {tracer.get_stats()}")
+            tracer.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,166 @@
+import threading
+import time
+from tracing import get_tracer
+
+class MotionTimeline:
+    """A named motion pattern: keyframes of (seconds from start, servo command)"""
+
+    def __init__(self, name, keyframes, priority=0, max_wait=2.0):
+        self.name = name
+        self.keyframes = sorted(keyframes, key=lambda keyframe: keyframe[0])
+        self.priority = priority
+        # A pattern still waiting after this long no longer fits the conversation
+        self.expires_at = time.monotonic() + max_wait
+        self.created_at = time.perf_counter()
+        self.turn_id = get_tracer().current_turn()
+
+class MotionScheduler:
+    """Plays motion timelines on a background thread so callers never wait for the servos.
+
+    Only one timeline plays at a time. A new timeline of equal or higher
+    priority preempts the one playing; a lower-priority one waits in a single
+    pending slot, where a newer request replaces an older one (coalescing)
+    and requests that waited too long are dropped. Keyframes are handed to
+    send() only when is_idle() says the device has finished the previous
+    command, so stale moves never pile up in the device queue.
+
+    A device that can take a whole timeline at once and replace what it is
+    doing mid-motion is driven through send_timeline() instead; the timeline
+    then counts as playing until the device reports idle.
+    """
+
+    def __init__(self, send, is_idle=lambda: True, idle_poll=0.5, send_timeline=None):
+        self.send = send
+        self.is_idle = is_idle
+        self.send_timeline = send_timeline
+        self.idle_poll = idle_poll  # Fallback re-check if a wake() is ever missed
+        self.active = None
+        self.pending = None
+        self.running = False
+        self.played = 0
+        self.preempted = 0
+        self.coalesced = 0
+        self.expired = 0
+        self._started_at = 0.0
+        self._next_keyframe = 0
+        self._timeline_sent = False
+        self._cond = threading.Condition()
+        self._thread = None
+        self.tracer = get_tracer()
+
+    def start(self):
+        with self._cond:
+            if self.running:
+                return
+            self.running = True
+        self._thread = threading.Thread(target=self._run, name="motion-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=1.0):
+        with self._cond:
+            self.running = False
+            self.active = None
+            self.pending = None
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def play(self, timeline):
+        """Schedule a timeline; returns immediately"""
+        with self._cond:
+            active = self.active
+            if active and active.name == timeline.name:
+                # Already playing the same gesture
+                self.coalesced += 1
+                return
+            if active is None or timeline.priority >= active.priority:
+                if active:
+                    self.preempted += 1
+                    self._trace(active, "preempted")
+                self._activate(timeline)
+            else:
+                if self.pending:
+                    # Only one pattern waits; keep the more important (or newer) one
+                    self.coalesced += 1
+                    if self.pending.priority > timeline.priority:
+                        return
+                self.pending = timeline
+            self._cond.notify_all()
+
+    def cancel(self):
+        """Drop the playing and pending timelines; a command already sent still completes"""
+        with self._cond:
+            self.active = None
+            self.pending = None
+            self._cond.notify_all()
+
+    def wake(self):
+        """Tell the scheduler the device may have become idle"""
+        with self._cond:
+            self._cond.notify_all()
+
+    def _activate(self, timeline):
+        self.active = timeline
+        self._started_at = time.monotonic()
+        self._next_keyframe = 0
+        self._timeline_sent = False
+
+    def _run(self):
+        with self._cond:
+            while self.running:
+                if self.active is None:
+                    pending, self.pending = self.pending, None
+                    if pending is None:
+                        self._cond.wait()
+                    elif time.monotonic() > pending.expires_at:
+                        self.expired += 1
+                        self._trace(pending, "expired")
+                    else:
+                        self._activate(pending)
+                    continue
+
+                if self.send_timeline:
+                    if not self._timeline_sent:
+                        # Sent straight away: the device itself replaces a preempted timeline
+                        self._timeline_sent = True
+                        self.send_timeline(self.active)
+                    elif self.is_idle():
+                        self.played += 1
+                        self._trace(self.active, "played")
+                        self.active = None
+                    else:
+                        self._cond.wait(self.idle_poll)
+                    continue
+
+                offset, command = self.active.keyframes[self._next_keyframe]
+                delay = self._started_at + offset - time.monotonic()
+                if delay > 0:
+                    # Woken early if the timeline is preempted meanwhile
+                    self._cond.wait(delay)
+                    continue
+                if not self.is_idle():
+                    self._cond.wait(self.idle_poll)
+                    continue
+
+                self.send(command)
+                self._next_keyframe += 1
+                if self._next_keyframe >= len(self.active.keyframes):
+                    self.played += 1
+                    self._trace(self.active, "played")
+                    self.active = None
+
+    def _trace(self, timeline, outcome):
+        # From the request to play the pattern until it finished or gave way
+        self.tracer.record("servo_pattern", timeline.created_at, time.perf_counter(), timeline.turn_id,
+                           pattern=timeline.name, outcome=outcome)
+
+    def get_stats(self):
+        with self._cond:
+            return {
+                "played": self.played,
+                "preempted": self.preempted,
+                "coalesced": self.coalesced,
+                "expired": self.expired,
+                "active": self.active.name if self.active else None
+            }
@@ -0,0 +1,332 @@
+import itertools
+import queue
+import threading
+import time
+from asr import NoSpeechError, NotUnderstoodError
+from config import GEMINI_STREAMING, PIPELINE_QUEUE_SIZE
+from speculation import strip_wake_word
+from tracing import get_tracer
+
+class Turn:
+    """One exchange with a visitor: wake word, command, answer"""
+    _ids = itertools.count(1)
+
+    def __init__(self, keyword, source=None):
+        self.id = next(self._ids)
+        self.keyword = keyword
+        self.source = source          # Audio the command is recognized from
+        self.command = None
+        self.partial = None           # Latest partial transcript while the visitor talks
+        self.prefetched = None        # SpeculativeAnswer started before the command was final
+        self.cancelled = threading.Event()
+        self.timings = {"wake": time.perf_counter()}
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def is_cancelled(self):
+        return self.cancelled.is_set()
+
+    def mark(self, stage):
+        self.timings.setdefault(stage, time.perf_counter())
+
+    def elapsed(self, stage, since="wake"):
+        if stage not in self.timings or since not in self.timings:
+            return None
+        return self.timings[stage] - self.timings[since]
+
+# Spans traced from the marks of every finished turn: name, end mark, start mark
+TURN_SPANS = (
+    ("asr", "asr", "wake"),
+    ("recognition_after_endpoint", "asr", "endpoint"),
+    ("first_chunk", "first_chunk", "asr"),
+    ("wake_to_speech", "first_sentence", "wake"),
+    ("turn", "done", "wake")
+)
+
+class VoicePipeline:
+    """The voice loop as overlapping stages, each on its own thread.
+
+    capture -> wake -> ASR -> answer -> speak / move
+
+    Capture already runs on the audio callback thread and speech and servo
+    motion on their own workers; this class adds threads for wake word
+    detection, speech recognition and answering, joined by bounded queues.
+    The wake stage never stops listening, so a new wake word can interrupt a
+    turn at any stage: the old turn is cancelled, its answer is cut off and
+    its stream abandoned at the next chunk. When a stage falls behind, a
+    newer turn replaces the one waiting for it instead of queueing behind it.
+
+    With a speculator, answering starts on a stable partial transcript and
+    the prefetched answer is used if the final command matches.
+    """
+
+    def __init__(self, wake_detector, command_recognizer, ai_handler, speech_handler, servo=None,
+                 queue_size=PIPELINE_QUEUE_SIZE, streaming=GEMINI_STREAMING, speculator=None):
+        self.wake_detector = wake_detector
+        self.command_recognizer = command_recognizer
+        self.ai_handler = ai_handler
+        self.speech_handler = speech_handler
+        self.servo = servo
+        self.streaming = streaming
+        self.speculator = speculator
+        self.tracer = get_tracer()
+        self.asr_queue = queue.Queue(maxsize=queue_size)
+        self.answer_queue = queue.Queue(maxsize=queue_size)
+        self.running = False
+        self.input_ended = threading.Event()
+        self.current_turn = None
+        self._lock = threading.Lock()
+        self._threads = []
+        self.turns = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.dropped = 0
+        self.no_command = 0
+        self._latency_totals = {}
+        self._latency_counts = {}
+        self._latency_max = {}
+
+    def start(self):
+        self.running = True
+        for name, target in (("wake", self._wake_stage), ("asr", self._asr_stage), ("answer", self._answer_stage)):
+            thread = threading.Thread(target=target, name=f"pipeline-{name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def run(self):
+        """Run until the audio input ends (recordings only) or KeyboardInterrupt"""
+        self.start()
+        while not self.input_ended.wait(0.5):
+            pass
+        print("\nEnd of audio input reached")
+        # Let the last turn finish before shutting down
+        self.wait_idle()
+
+    def wait_idle(self, timeout=30.0):
+        """Block until no turn is queued, being processed or being spoken"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.asr_queue.unfinished_tasks == 0 and self.answer_queue.unfinished_tasks == 0:
+                return self.speech_handler.wait(max(0.0, deadline - time.monotonic()))
+            time.sleep(0.05)
+        return False
+
+    def stop(self, timeout=2.0):
+        self.running = False
+        with self._lock:
+            if self.current_turn:
+                self.current_turn.cancel()
+        # Sentinels replace whatever is still waiting
+        self._offer(self.asr_queue, None)
+        self._offer(self.answer_queue, None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _offer(self, stage_queue, item):
+        """Put without blocking the producer; a full queue gives up its stale turn"""
+        while True:
+            try:
+                stage_queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    stale = stage_queue.get_nowait()
+                except queue.Empty:
+                    continue
+                stage_queue.task_done()
+                if stale is not None:
+                    stale.cancel()
+                    self.dropped += 1
+                    self.tracer.count("turns", outcome="dropped")
+
+    def _wake_stage(self):
+        while self.running:
+            if self.wake_detector.audio_exhausted():
+                self.input_ended.set()
+                break
+            keyword = self.wake_detector.listen()
+            if keyword:
+                self._start_turn(keyword)
+
+    def _start_turn(self, keyword):
+        turn = Turn(keyword)
+        # Servo patterns requested from this thread belong to the newest turn
+        self.tracer.set_turn(turn.id)
+        # The recognizer reads alongside the detector, which keeps listening for barge-in
+        turn.source = self.wake_detector.command_source(consume=False, cancelled=turn.cancelled)
+        with self._lock:
+            previous, self.current_turn = self.current_turn, turn
+            self.turns += 1
+        if previous and not previous.is_cancelled() and "done" not in previous.timings:
+            previous.cancel()
+            self.cancelled += 1
+            self.tracer.count("turns", outcome="cancelled")
+        if previous and self.speculator:
+            self.speculator.discard(previous)
+        # Barge-in: the visitor interrupted the answer that is still playing
+        if self.speech_handler.stop():
+            print("\nInterrupted the current answer")
+        print(f"\nWake word '{keyword}' detected! Listening for command...")
+        # Re-open the backend connection while the visitor is still talking
+        self.ai_handler.prewarm()
+        if self.servo:
+            self.servo.motion_pattern("listening")
+        self._offer(self.asr_queue, turn)
+
+    def _asr_stage(self):
+        while True:
+            turn = self.asr_queue.get()
+            try:
+                if turn is None:
+                    break
+                if not turn.is_cancelled():
+                    self.tracer.set_turn(turn.id)
+                    self._recognize(turn)
+            except Exception as e:
+                print(f"Error: {str(e)}")
+            finally:
+                self.tracer.set_turn(None)
+                if turn is not None and self.speculator:
+                    # Turns that got no command don't keep a speculative request running
+                    self.speculator.discard(turn)
+                self.asr_queue.task_done()
+
+    def _recognize(self, turn):
+        def on_partial(text):
+            turn.mark("first_partial")
+            turn.partial = text
+            if self.speculator:
+                self.speculator.on_partial(turn, text)
+
+        try:
+            command = self.command_recognizer.recognize(
+                turn.source,
+                on_partial=on_partial,
+                on_endpoint=lambda: turn.mark("endpoint"),
+                noise_floor=self.wake_detector.get_noise_floor()
+            )
+        except NoSpeechError:
+            if not turn.is_cancelled():
+                print("No command heard")
+                self._finish(turn, answered=False)
+            return
+        except NotUnderstoodError:
+            if not turn.is_cancelled():
+                print("Could not understand the command")
+                self._finish(turn, answered=False)
+            return
+        turn.mark("asr")
+        if command is None or turn.is_cancelled():
+            return
+        print(f"Command: {command}")
+
+        # Filter out wake word from command
+        filtered_command = strip_wake_word(command, turn.keyword)
+        if not filtered_command:
+            print("No command after filtering wake word")
+            self._finish(turn, answered=False)
+            return
+        turn.command = filtered_command
+        if self.speculator:
+            turn.prefetched = self.speculator.commit(turn, filtered_command)
+        # Move servo to thinking position while the answer is produced
+        if self.servo:
+            self.servo.motion_pattern("thinking")
+        self._offer(self.answer_queue, turn)
+
+    def _answer_stage(self):
+        while True:
+            turn = self.answer_queue.get()
+            try:
+                if turn is None:
+                    break
+                if not turn.is_cancelled():
+                    self.tracer.set_turn(turn.id)
+                    self._answer(turn)
+            except Exception as e:
+                print(f"Error: {str(e)}")
+            finally:
+                self.tracer.set_turn(None)
+                self.answer_queue.task_done()
+
+    def _answer(self, turn):
+        def on_first_sentence(sentence):
+            turn.mark("first_sentence")
+            if self.servo:
+                # React to the emotional content before it is spoken
+                self.servo.react_to_emotions(sentence)
+
+        if turn.prefetched:
+            # Answer already under way since the partial transcript settled
+            chunks = turn.prefetched.chunks()
+        elif self.streaming:
+            chunks = self.ai_handler.stream_response(turn.command)
+        else:
+            chunks = None
+
+        if chunks is not None:
+            # Start speaking as soon as the first sentence arrives
+            response = self.speech_handler.speak_stream(
+                self._until_cancelled(turn, chunks),
+                on_first_sentence=on_first_sentence
+            )
+        else:
+            response = self.ai_handler.get_response(turn.command)
+            turn.mark("first_chunk")
+            if turn.is_cancelled():
+                return
+            on_first_sentence(response)
+            self.speech_handler.speak(response)
+        if turn.is_cancelled():
+            return
+        print(f"AI Response: {response}")
+        self._finish(turn)
+
+    @staticmethod
+    def _until_cancelled(turn, chunks):
+        """Pass chunks through until the turn is cancelled, then close the stream"""
+        try:
+            for chunk in chunks:
+                if turn.is_cancelled():
+                    break
+                turn.mark("first_chunk")
+                yield chunk
+        finally:
+            chunks.close()
+
+    def _finish(self, turn, answered=True):
+        turn.mark("done")
+        outcome = "completed" if answered else "no_command"
+        self.tracer.count("turns", outcome=outcome)
+        for name, stage, since in TURN_SPANS:
+            if stage in turn.timings and since in turn.timings:
+                self.tracer.record(name, turn.timings[since], turn.timings[stage], turn.id,
+                                   outcome=outcome, prefetched=turn.prefetched is not None)
+        with self._lock:
+            if answered:
+                self.completed += 1
+            else:
+                self.no_command += 1
+            for name, stage, since in TURN_SPANS[:-1]:
+                value = turn.elapsed(stage, since)
+                if value is None:
+                    continue
+                self._latency_totals[name] = self._latency_totals.get(name, 0.0) + value
+                self._latency_counts[name] = self._latency_counts.get(name, 0) + 1
+                self._latency_max[name] = max(self._latency_max.get(name, 0.0), value)
+
+    def get_stats(self):
+        with self._lock:
+            stats = {
+                "turns": self.turns,
+                "completed": self.completed,
+                "no_command": self.no_command,
+                "cancelled": self.cancelled,
+                "dropped": self.dropped
+            }
+            for name, total in self._latency_totals.items():
+                stats[f"avg_{name}_ms"] = total / self._latency_counts[name] * 1000
+                stats[f"max_{name}_ms"] = self._latency_max[name] * 1000
+            return stats
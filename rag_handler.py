@@ -1,64 +1,306 @@
+import hashlib
 import json
 import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from bm25_index import BM25Index
+from doc_ingest import DocumentIngestor
+from file_watcher import FileWatcher
+from vector_index import DenseVectorIndex, HashedNgramEmbedder
+from config import (
+    RAG_TOP_K, RAG_MAX_CONTEXT_CHARS, RAG_RETRIEVAL_MODE, RAG_INDEX_DIR, RAG_EMBEDDING_DIM,
+    RAG_MIN_SIMILARITY, DOCS_MANIFEST_PATH, INGEST_WORKERS, DATA_RELOAD_INTERVAL,
+    RAG_CONTEXT_FORMAT
+)
+
+# Chunks larger than this are split into their sub-entries
+MAX_CHUNK_CHARS = 1500
+
+# Assembled prompt contexts memoized per data snapshot
+CONTEXT_CACHE_SIZE = 256
+
+# Constant from reciprocal rank fusion; damps the influence of top ranks
+RRF_K = 60
+
+# Extra search terms per section so general questions still reach the right chunks
+SECTION_KEYWORDS = {
+    "overview": "college name about accreditation",
+    "departments": "department course program study degree",
+    "facilities": "facility infrastructure campus",
+    "contact": "contact email phone address call",
+    "location": "location address where directions reach",
+    "student_services": "club activity service student",
+    "achievements": "achievement rank grade award"
+}
+
+PLACEHOLDER_DATA = {
+    "institution": {
+        "name": "Kristu Jyoti College",
+        "accreditation": "Academic Institution",
+        "contact": {
+            "email": "info@example.edu",
+            "phone": "123-456-7890"
+        },
+        "departments": [],
+        "facilities": [],
+        "student_services": [],
+        "achievements": []
+    }
+}
+
+class RAGSnapshot:
+    """One consistent version of the college data and everything derived from it.
+
+    The data and indexes are never modified after a snapshot is built; a reload
+    builds a new one and swaps it in with a single assignment, so a query that
+    grabbed a snapshot keeps seeing consistent data even while a reload is
+    running. Assembled context strings are memoized per snapshot and so are
+    dropped together with the data they were built from.
+    """
+
+    def __init__(self, college_data, data_version, chunks, index, vector_index):
+        self.college_data = college_data
+        self.data_version = data_version
+        self.chunks = chunks
+        self.index = index
+        self.vector_index = vector_index
+        # Fallback context, rendered once
+        self.overview_context = "\n\n".join(
+            chunk["text"] for chunk in chunks if chunk["section"] == "overview"
+        )
+        self._contexts = OrderedDict()
+        self._contexts_lock = threading.Lock()
+
+    def cached_context(self, key):
+        with self._contexts_lock:
+            context = self._contexts.get(key)
+            if context is not None:
+                self._contexts.move_to_end(key)
+            return context
+
+    def store_context(self, key, context):
+        with self._contexts_lock:
+            self._contexts[key] = context
+            while len(self._contexts) > CONTEXT_CACHE_SIZE:
+                self._contexts.popitem(last=False)
 
 class RAGHandler:
-    def __init__(self, docs_dir="docs"):
+    def __init__(self, docs_dir="docs", data_path="college_data.json", watch=DATA_RELOAD_INTERVAL > 0):
         self.docs_dir = docs_dir
-        self.college_data = None
+        self.data_path = data_path
+        self.doc_ingestor = DocumentIngestor(docs_dir, DOCS_MANIFEST_PATH, workers=INGEST_WORKERS)
+        self.retrieval_mode = RAG_RETRIEVAL_MODE
+        self.snapshot = None
+        self._reload_lock = threading.Lock()
+        self.watcher = None
         self.load_college_data()
+        if watch:
+            self.watcher = FileWatcher([data_path], self._on_data_changed, interval=DATA_RELOAD_INTERVAL)
+            self.watcher.start()
+    
+    # Read-only views of the current snapshot
+    @property
+    def college_data(self):
+        return self.snapshot.college_data
+    
+    @property
+    def data_version(self):
+        return self.snapshot.data_version
+    
+    @property
+    def chunks(self):
+        return self.snapshot.chunks
+    
+    def _read_college_data(self):
+        """Parse the data file; returns (data, content hash) or raises"""
+        with open(self.data_path, 'rb') as f:
+            raw = f.read()
+        # Content hash identifies this version of the data for downstream caches
+        return json.loads(raw), hashlib.sha1(raw).hexdigest()
     
     def load_college_data(self):
         """Load college data from JSON"""
         try:
-            with open('college_data.json', 'r') as f:
-                self.college_data = json.load(f)
+            college_data, data_version = self._read_college_data()
             print("College data loaded successfully")
         except Exception as e:
             print(f"Error loading college data: {e}")
             # Create a minimal placeholder if data is missing
-            self.college_data = {
-                "institution": {
-                    "name": "Kristu Jyoti College",
-                    "accreditation": "Academic Institution",
-                    "contact": {
-                        "email": "info@example.edu",
-                        "phone": "123-456-7890"
-                    },
-                    "departments": [],
-                    "facilities": [],
-                    "student_services": [],
-                    "achievements": []
-                }
-            }
+            college_data, data_version = PLACEHOLDER_DATA, "placeholder"
             print("Created minimal placeholder data")
+        self.snapshot = self.build_snapshot(college_data, data_version)
+    
+    def reload(self):
+        """Re-read the data file and atomically swap in the new data and indexes.
+
+        If the file can't be parsed (e.g. it is mid-save) the current data stays live.
+        """
+        with self._reload_lock:
+            try:
+                college_data, data_version = self._read_college_data()
+            except Exception as e:
+                print(f"College data reload skipped, keeping current data: {e}")
+                return False
+            if data_version == self.snapshot.data_version:
+                return False
+            start = time.monotonic()
+            snapshot = self.build_snapshot(college_data, data_version)
+            self.snapshot = snapshot
+            print(f"College data reloaded in {time.monotonic() - start:.2f}s")
+            return True
+    
+    def _on_data_changed(self, path):
+        self.reload()
     
-    def generate_rag_prompt(self, query):
+    def load_doc_chunks(self):
+        """Chunk the documents in docs_dir, re-processing only files changed since the last run"""
+        return self.doc_ingestor.ingest()
+    
+    def build_snapshot(self, college_data, data_version):
+        """Flatten the college data into chunks and index them for retrieval"""
+        chunks = flatten_college_data(college_data) + self.load_doc_chunks()
+        index = BM25Index()
+        index.build([chunk["index_text"] for chunk in chunks])
+        vector_index = None
+        if self.retrieval_mode in ("semantic", "hybrid"):
+            vector_index = DenseVectorIndex(RAG_INDEX_DIR, HashedNgramEmbedder(dim=RAG_EMBEDDING_DIM))
+            vector_index.ensure([chunk["index_text"] for chunk in chunks])
+        print(f"Indexed {len(chunks)} chunks")
+        return RAGSnapshot(college_data, data_version, chunks, index, vector_index)
+    
+    def retrieve(self, query, top_k=RAG_TOP_K, snapshot=None):
+        """Return the best matching chunks for a query, best first"""
+        snapshot = snapshot or self.snapshot
+        index = snapshot.index
+        vector_index = snapshot.vector_index
+        if self.retrieval_mode == "semantic" and vector_index:
+            ranked = vector_index.search(query, top_k, RAG_MIN_SIMILARITY)
+        elif self.retrieval_mode == "hybrid" and vector_index:
+            # Reciprocal rank fusion of keyword and semantic rankings
+            fused = {}
+            for results in (index.search(query, top_k * 2), vector_index.search(query, top_k * 2, RAG_MIN_SIMILARITY)):
+                for rank, (doc_id, _) in enumerate(results):
+                    fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (RRF_K + rank)
+            ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        else:
+            ranked = index.search(query, top_k)
+        return [snapshot.chunks[doc_id] for doc_id, _ in ranked]
+    
+    def generate_rag_prompt(self, query, top_k=RAG_TOP_K, max_chars=RAG_MAX_CONTEXT_CHARS):
         """Generate relevant college information context"""
-        if not self.college_data:
+        # Work against one snapshot for the whole query, even if a reload swaps it meanwhile
+        snapshot = self.snapshot
+        if not snapshot.college_data or not snapshot.chunks:
             return "No college information available."
-            
-        query = query.lower()
-        info = self.college_data["institution"]
         
-        # Extract relevant information based on query keywords
-        if any(word in query for word in ["course", "program", "department"]):
-            return json.dumps(info["departments"], indent=2)
-        elif any(word in query for word in ["facility", "infrastructure"]):
-            return json.dumps(info["facilities"], indent=2)
-        elif any(word in query for word in ["contact", "email", "phone", "address"]):
-            return json.dumps({
-                "contact": info["contact"],
-                "location": info.get("location", {})
-            }, indent=2)
-        elif any(word in query for word in ["club", "activity", "service"]):
-            return json.dumps(info["student_services"], indent=2)
-        elif any(word in query for word in ["achievement", "rank", "grade"]):
-            return json.dumps(info["achievements"], indent=2)
-        else:
-            # Use basic information
-            return json.dumps({
-                "name": info["name"],
-                "accreditation": info["accreditation"]
-            }, indent=2)
+        key = (" ".join(query.lower().split()), top_k, max_chars)
+        context = snapshot.cached_context(key)
+        if context is not None:
+            return context
+        
+        # Pack the highest scoring chunks (rendered at load time) until the context budget is spent
+        blocks = []
+        used = 0
+        for chunk in self.retrieve(query, top_k, snapshot):
+            if used + len(chunk["text"]) > max_chars and blocks:
+                continue
+            blocks.append(chunk["text"])
+            used += len(chunk["text"])
         
-        return ""
+        # Use basic information if nothing matched
+        context = "\n\n".join(blocks) if blocks else snapshot.overview_context
+        snapshot.store_context(key, context)
+        return context
+    
+    def close(self):
+        if self.watcher:
+            self.watcher.stop()
+
+def _chunk_label(path, value):
+    """Human readable label for a chunk, e.g. 'departments: Computer Science'"""
+    label = re.sub(r"\[\d+\]", "", path).replace(".", " ").replace("_", " ")
+    if isinstance(value, dict):
+        for key in ("name", "title"):
+            if isinstance(value.get(key), str):
+                return f"{label}: {value[key]}"
+    return label
+
+def _index_text(value):
+    """All keys and scalar values of a JSON value as plain words"""
+    if isinstance(value, dict):
+        return " ".join(f"{key.replace('_', ' ')} {_index_text(item)}" for key, item in value.items())
+    if isinstance(value, list):
+        return " ".join(_index_text(item) for item in value)
+    return str(value)
+
+def _render_text(value, indent=""):
+    """Plain "key: value" lines; far fewer tokens than indented JSON"""
+    if isinstance(value, dict):
+        lines = []
+        for key, item in value.items():
+            name = key.replace("_", " ")
+            if isinstance(item, (dict, list)) and not _is_flat_list(item):
+                lines.append(f"{indent}{name}:")
+                lines.append(_render_text(item, indent + "  "))
+            else:
+                lines.append(f"{indent}{name}: {_render_text(item)}")
+        return "\n".join(lines)
+    if isinstance(value, list):
+        if _is_flat_list(value):
+            return ", ".join(str(item) for item in value)
+        return "\n".join(f"{indent}- {_render_text(item, indent + '  ').lstrip()}" for item in value)
+    return str(value)
+
+def _is_flat_list(value):
+    return isinstance(value, list) and not any(isinstance(item, (dict, list)) for item in value)
+
+def render_value(value, fmt=RAG_CONTEXT_FORMAT):
+    """Serialize a chunk for the prompt: compact JSON or plain text"""
+    if fmt == "text":
+        return _render_text(value)
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+def _make_chunk(section, path, value, fmt=RAG_CONTEXT_FORMAT):
+    label = _chunk_label(path, value)
+    return {
+        "id": path,
+        "section": section,
+        "label": label,
+        "value": value,
+        "text": f"{label}\n{render_value(value, fmt)}",
+        "index_text": f"{label} {SECTION_KEYWORDS.get(section, '')} {_index_text(value)}"
+    }
+
+def _flatten(section, path, value, chunks):
+    if isinstance(value, list):
+        for i, item in enumerate(value):
+            if isinstance(item, (dict, list)) and len(json.dumps(item)) > MAX_CHUNK_CHARS:
+                _flatten(section, f"{path}[{i}]", item, chunks)
+            else:
+                chunks.append(_make_chunk(section, f"{path}[{i}]", item))
+    elif isinstance(value, dict) and len(json.dumps(value)) > MAX_CHUNK_CHARS:
+        for key, item in value.items():
+            _flatten(section, f"{path}.{key}", item, chunks)
+    else:
+        chunks.append(_make_chunk(section, path, value))
+
+def flatten_college_data(college_data):
+    """Split college data into small addressable chunks.
+
+    Each list element (a department, a facility, ...) becomes its own chunk;
+    dicts are kept whole unless they are larger than MAX_CHUNK_CHARS.
+    Top-level scalar fields are collected into one "overview" chunk.
+    """
+    if not college_data:
+        return []
+    info = college_data.get("institution", college_data)
+    chunks = []
+    overview = {key: value for key, value in info.items() if not isinstance(value, (dict, list))}
+    if overview:
+        chunks.append(_make_chunk("overview", "overview", overview))
+    for section, value in info.items():
+        if isinstance(value, (dict, list)):
+            _flatten(section, section, value, chunks)
+    return chunks
@@ -0,0 +1,118 @@
+import threading
+from ai_handler import BUSY_RESPONSE, ERROR_RESPONSE, UNAVAILABLE_RESPONSE
+from config import ANSWER_SERVER_URL, ANSWER_SERVER_READ_TIMEOUT, KIOSK_ID
+from gemini_client import GeminiClient, CircuitOpenError
+
+class RemoteAIHandler:
+    """AIHandler stand-in that asks a shared answer server (answer_server.py).
+
+    Retrieval, caching and the Gemini request all happen on the server, so a
+    kiosk in this mode loads no college data. The pooled client's retries and
+    circuit breaker apply to the server the way they do to Gemini, except for
+    429: the server uses it to say this kiosk has too many questions waiting,
+    which is answered with the server's busy message rather than retried or
+    counted against the server's health. The read timeout allows for the time
+    a question may spend waiting for one of the server's workers.
+
+    A speculative question (cache given as a callable) is answered but kept
+    out of the server's cache; cache_response() for the confirmed command asks
+    the server to cache the answer it held back.
+    """
+
+    RETRY_STATUS_CODES = GeminiClient.RETRY_STATUS_CODES - {429}
+
+    def __init__(self, base_url=ANSWER_SERVER_URL, kiosk_id=KIOSK_ID, client=None):
+        self.base_url = base_url.rstrip("/")
+        self.answer_url = f"{self.base_url}/answer"
+        self.confirm_url = f"{self.base_url}/confirm"
+        self.client = client or GeminiClient(read_timeout=ANSWER_SERVER_READ_TIMEOUT,
+                                             retry_status_codes=self.RETRY_STATUS_CODES)
+        self.client.session.headers.update({"X-Kiosk-Id": kiosk_id})
+
+    @staticmethod
+    def _request(input_text, cache, stream=False):
+        # The server caches answers itself; a held-back (callable) one waits for cache_response()
+        return {"question": input_text, "stream": stream, "cache": cache is True}
+
+    def cache_response(self, input_text, response, cache=True):
+        """Have the server cache its held-back answer to a confirmed speculative question"""
+        if not response:
+            return
+        if callable(cache):
+            cache(response)
+        elif cache:
+            # Off the caller's thread: the visitor's answer shouldn't wait on this
+            threading.Thread(target=self._confirm, args=(input_text,), daemon=True).start()
+
+    def _confirm(self, input_text):
+        try:
+            self.client.post(self.confirm_url, json={"question": input_text}).close()
+        except Exception as e:
+            print(f"Error confirming a speculative answer: {str(e)}")
+
+    def get_response(self, input_text, cache=True):
+        try:
+            response = self.client.post(self.answer_url, json=self._request(input_text, cache))
+            if response.status_code == 200:
+                answer = response.json()["answer"]
+                if callable(cache):
+                    cache(answer)
+                return answer
+            if response.status_code == 429:
+                return self._busy_answer(response)
+            print(f"Answer server error: {response.status_code} - {response.text}")
+            return ERROR_RESPONSE
+        except CircuitOpenError:
+            return UNAVAILABLE_RESPONSE
+        except Exception as e:
+            print(f"Error asking the answer server: {str(e)}")
+            return UNAVAILABLE_RESPONSE
+
+    def stream_response(self, input_text, cache=True):
+        """Yield the answer as the server generates it"""
+        produced = False
+        parts = []
+        try:
+            with self.client.post(self.answer_url, json=self._request(input_text, cache, stream=True),
+                                  stream=True) as response:
+                if response.status_code == 429:
+                    produced = True
+                    yield self._busy_answer(response)
+                    return
+                if response.status_code != 200:
+                    print(f"Answer server error: {response.status_code} - {response.text}")
+                    produced = True
+                    yield ERROR_RESPONSE
+                    return
+                response.encoding = "utf-8"
+                for text in response.iter_content(chunk_size=None, decode_unicode=True):
+                    if text:
+                        produced = True
+                        parts.append(text)
+                        yield text
+                if callable(cache) and parts:
+                    cache("".join(parts))
+        except CircuitOpenError:
+            pass
+        except Exception as e:
+            print(f"Error streaming from the answer server: {str(e)}")
+
+        if not produced:
+            yield UNAVAILABLE_RESPONSE
+
+    @staticmethod
+    def _busy_answer(response):
+        try:
+            return response.json().get("answer") or BUSY_RESPONSE
+        except ValueError:
+            return BUSY_RESPONSE
+
+    def prewarm(self):
+        """Open a connection to the server ahead of the next question"""
+        self.client.warm_up(f"{self.base_url}/health")
+
+    def get_stats(self):
+        return self.client.get_stats()
+
+    def close(self):
+        self.client.close()
@@ -0,0 +1,197 @@
+"""Replay labelled recordings through the wake word detector, without a microphone.
+
+Recordings (mono 16-bit WAV, or raw .pcm/.raw at 16 kHz) are labelled by the
+folder they sit in: files under a folder named after a keyword should trigger
+that keyword, files under "negative" or directly in the top folder should not
+trigger anything.
+
+    recordings/
+        bumblebee/visitor1.wav
+        negative/hallway_noise.wav
+
+    python replay_wake_words.py recordings/
+    python replay_wake_words.py recordings/ --engine stub --json
+
+The exit status is 1 if any positive was missed or anything was falsely accepted.
+"""
+import argparse
+import contextlib
+import json
+import math
+import os
+import sys
+import time
+import numpy as np
+from audio_capture import FileAudioSource
+from config import SAMPLE_RATE, WAKE_WORD
+from wake_word_detector import WakeWordDetector
+
+AUDIO_EXTENSIONS = (".wav", ".pcm", ".raw")
+NEGATIVE_LABELS = {"negative", "none", "background"}
+
+class StubEngine:
+    """Stand-in for a Porcupine handle that fires keyword 0 on each burst of loud audio.
+
+    Lets the replay run exercise the audio source, gate and bookkeeping where
+    pvporcupine isn't usable; its detections say nothing about accuracy.
+    """
+
+    sample_rate = SAMPLE_RATE
+    frame_length = 512
+
+    def __init__(self, threshold_rms=2000.0, refractory_frames=32):
+        self.threshold_rms = threshold_rms
+        self.refractory_frames = refractory_frames
+        self._cooldown = 0
+
+    def process(self, pcm):
+        samples = np.asarray(pcm, dtype=np.float32)
+        energy = math.sqrt(float(np.dot(samples, samples)) / len(samples))
+        if self._cooldown:
+            self._cooldown -= 1
+            return -1
+        if energy > self.threshold_rms:
+            self._cooldown = self.refractory_frames
+            return 0
+        return -1
+
+    def delete(self):
+        pass
+
+def find_recordings(root):
+    """Return sorted (path, expected keyword or None) pairs under root"""
+    recordings = []
+    for folder, _, files in os.walk(root):
+        for name in files:
+            if not name.lower().endswith(AUDIO_EXTENSIONS):
+                continue
+            path = os.path.join(folder, name)
+            parts = os.path.relpath(path, root).split(os.sep)
+            label = parts[0] if len(parts) > 1 else None
+            if label and label.lower() in NEGATIVE_LABELS:
+                label = None
+            recordings.append((path, label))
+    return sorted(recordings)
+
+def replay_file(detector, source):
+    """Run one recording through the detector; returns (detections, per-frame seconds, wall seconds)"""
+    frame_seconds = source.frame_length / source.sample_rate
+    detections = []
+    frame_times = []
+    started = time.perf_counter()
+    while not detector.audio_exhausted():
+        processed = source.frames_processed
+        call_started = time.perf_counter()
+        keyword = detector.listen()
+        elapsed = time.perf_counter() - call_started
+        if source.frames_processed > processed:
+            frame_times.append(elapsed)
+        if keyword:
+            detections.append({"keyword": keyword, "at": round(source.ring.read_seq * frame_seconds, 2)})
+    return detections, frame_times, time.perf_counter() - started
+
+def replay(root, engine="porcupine", speed=0.0, verbose=False):
+    recordings = find_recordings(root)
+    if not recordings:
+        raise ValueError(f"No recordings ({', '.join(AUDIO_EXTENSIONS)}) found under {root}")
+
+    detector = None
+    results = []
+    frame_times = []
+    audio_seconds = 0.0
+    wall_seconds = 0.0
+    try:
+        for path, label in recordings:
+            source = FileAudioSource(path, SAMPLE_RATE, StubEngine.frame_length, speed=speed)
+            if detector is None:
+                if engine == "stub":
+                    detector = WakeWordDetector(engine=StubEngine(), keywords=[WAKE_WORD], audio_source=source)
+                else:
+                    detector = WakeWordDetector(init_cache_path=None, audio_source=source)
+            else:
+                detector.use_audio_source(source)
+
+            detections, times, wall = replay_file(detector, source)
+            if engine == "stub":
+                # The stub can't tell keywords apart; any detection counts as the expected one
+                hits = len(detections) if label else 0
+            else:
+                hits = sum(1 for d in detections if d["keyword"] == label)
+            result = {
+                "file": os.path.relpath(path, root),
+                "expected": label,
+                "detections": detections,
+                "detected": hits > 0,
+                "false_accepts": len(detections) - hits,
+                "audio_seconds": round(source.duration, 2)
+            }
+            results.append(result)
+            frame_times.extend(times)
+            audio_seconds += source.duration
+            wall_seconds += wall
+            if verbose:
+                status = ("hit" if result["detected"] else "MISS") if label else "negative"
+                print(f"{result['file']}: {status}, {result['false_accepts']} false accept(s), detections {detections}")
+    finally:
+        if detector:
+            detector.cleanup()
+
+    positives = [r for r in results if r["expected"]]
+    false_accepts = sum(r["false_accepts"] for r in results)
+    times_ms = np.array(frame_times) * 1000 if frame_times else np.zeros(1)
+    return {
+        "files": len(results),
+        "positives": len(positives),
+        "detected": sum(1 for r in positives if r["detected"]),
+        "missed": [r["file"] for r in positives if not r["detected"]],
+        "false_accepts": false_accepts,
+        "false_accepts_per_hour": false_accepts / (audio_seconds / 3600) if audio_seconds else 0.0,
+        "frames": len(frame_times),
+        "frame_ms_mean": float(times_ms.mean()),
+        "frame_ms_p95": float(np.percentile(times_ms, 95)),
+        "frame_ms_max": float(times_ms.max()),
+        "audio_seconds": round(audio_seconds, 2),
+        "wall_seconds": round(wall_seconds, 3),
+        # Real-time factor: processing time per second of audio (below 1.0 keeps up with live input)
+        "real_time_factor": wall_seconds / audio_seconds if audio_seconds else 0.0,
+        "results": results
+    }
+
+def print_report(report):
+    print(f"\nFiles: {report['files']} ({report['positives']} positive), {report['audio_seconds']} s of audio")
+    print(f"Detected: {report['detected']}/{report['positives']}")
+    for name in report["missed"]:
+        print(f"  missed: {name}")
+    print(f"False accepts: {report['false_accepts']} ({report['false_accepts_per_hour']:.1f} per hour)")
+    print(f"Per-frame processing: mean {report['frame_ms_mean']:.3f} ms, "
+          f"p95 {report['frame_ms_p95']:.3f} ms, max {report['frame_ms_max']:.3f} ms over {report['frames']} frames")
+    rtf = report["real_time_factor"]
+    speedup = f" ({1 / rtf:.0f}x real time)" if rtf else ""
+    print(f"Throughput: {report['wall_seconds']} s wall, real-time factor {rtf:.4f}{speedup}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay labelled recordings through the wake word detector")
+    parser.add_argument("recordings", help="Folder of recordings, labelled by subfolder")
+    parser.add_argument("--engine", choices=["porcupine", "stub"], default="porcupine",
+                        help="Keyword engine; 'stub' needs no Porcupine access key")
+    parser.add_argument("--speed", type=float, default=0.0,
+                        help="Playback speed (1.0 = real time, 0 = as fast as possible)")
+    parser.add_argument("--json", action="store_true", help="Print the full report as JSON")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Print a line per recording")
+    args = parser.parse_args(argv)
+
+    try:
+        # Keep stdout clean for the JSON report; detector chatter goes to stderr
+        with contextlib.redirect_stdout(sys.stderr if args.json else sys.stdout):
+            report = replay(args.recordings, engine=args.engine, speed=args.speed, verbose=args.verbose)
+    except ValueError as e:
+        print(f"Replay failed: {e}")
+        return 2
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 1 if report["missed"] or report["false_accepts"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from config import (
+    RESPONSE_CACHE_PATH, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL,
+    RESPONSE_CACHE_FUZZY_THRESHOLD
+)
+
+# Words that don't change what a visitor is asking for
+FILLER_WORDS = {
+    "a", "an", "the", "please", "um", "uh", "hey", "hi", "hello", "can", "could",
+    "you", "me", "tell", "i", "want", "to", "know", "would", "like", "is", "are",
+    "what", "whats", "of", "for", "about", "your", "do", "does"
+}
+
+class ResponseCache:
+    """LRU + TTL cache of answers keyed by normalized visitor queries"""
+
+    def __init__(self, path=RESPONSE_CACHE_PATH, max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+                 ttl=RESPONSE_CACHE_TTL, fuzzy_threshold=RESPONSE_CACHE_FUZZY_THRESHOLD,
+                 save_interval=5.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.fuzzy_threshold = fuzzy_threshold
+        self.save_interval = save_interval
+        self.data_version = None
+        # key -> {"response", "created", "tokens"}
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_save = 0.0
+        self.load()
+
+    @staticmethod
+    def normalize(query):
+        """Lowercase, strip punctuation and collapse whitespace"""
+        query = re.sub(r"[^\w\s]", " ", query.lower())
+        return " ".join(query.split())
+
+    @staticmethod
+    def _tokens(key):
+        return frozenset(word for word in key.split() if word not in FILLER_WORDS)
+
+    def get(self, query, data_version=None):
+        """Return a cached response for the query, or None"""
+        key = self.normalize(query)
+        now = time.time()
+        with self._lock:
+            self._check_version(data_version)
+            entry = self.entries.get(key)
+            if entry is not None and now - entry["created"] > self.ttl:
+                del self.entries[key]
+                self._dirty = True
+                entry = None
+            if entry is None and self.fuzzy_threshold > 0:
+                key = self._fuzzy_match(key, now)
+                entry = self.entries.get(key) if key else None
+                if entry is not None:
+                    self.fuzzy_hits += 1
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry["response"]
+
+    def put(self, query, response, data_version=None):
+        key = self.normalize(query)
+        if not key:
+            return
+        with self._lock:
+            self._check_version(data_version)
+            self.entries[key] = {
+                "response": response,
+                "created": time.time(),
+                "tokens": self._tokens(key)
+            }
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self._dirty = True
+            due = time.time() - self._last_save >= self.save_interval
+        if due:
+            self.save()
+
+    def _fuzzy_match(self, key, now):
+        """Find the cached key with the highest token overlap (Jaccard) above the threshold"""
+        tokens = self._tokens(key)
+        if not tokens:
+            return None
+        best_key = None
+        best_score = self.fuzzy_threshold
+        for candidate, entry in self.entries.items():
+            if now - entry["created"] > self.ttl:
+                continue
+            other = entry["tokens"]
+            union = len(tokens | other)
+            score = len(tokens & other) / union if union else 0.0
+            if score >= best_score:
+                best_key, best_score = candidate, score
+        return best_key
+
+    def _check_version(self, data_version):
+        """Drop all entries when the underlying college data has changed"""
+        if data_version is None or data_version == self.data_version:
+            return
+        if self.entries:
+            print("College data changed - clearing response cache")
+        self.entries.clear()
+        self.data_version = data_version
+        self._dirty = True
+
+    def invalidate(self):
+        with self._lock:
+            self.entries.clear()
+            self._dirty = True
+        self.save()
+
+    def load(self):
+        """Load persisted entries, skipping expired ones"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            now = time.time()
+            self.data_version = data.get("data_version")
+            for key, entry in data.get("entries", []):
+                if now - entry["created"] <= self.ttl:
+                    entry["tokens"] = self._tokens(key)
+                    self.entries[key] = entry
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            print(f"Loaded {len(self.entries)} cached responses")
+        except Exception as e:
+            print(f"Error loading response cache: {e}")
+            self.entries.clear()
+
+    def save(self):
+        """Persist entries to disk atomically"""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {
+                "data_version": self.data_version,
+                "entries": [
+                    [key, {"response": entry["response"], "created": entry["created"]}]
+                    for key, entry in self.entries.items()
+                ]
+            }
+            self._dirty = False
+            self._last_save = time.time()
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"Error saving response cache: {e}")
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "fuzzy_hits": self.fuzzy_hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0
+            }
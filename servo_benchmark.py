@@ -0,0 +1,199 @@
+"""Measure the servo link end to end through the real serial.Serial path.
+
+By default the firmware is played by servo_emulator.py on a pseudo-terminal,
+so the numbers cover the host side (dispatcher, reader thread, scheduler,
+protocol) plus the firmware's own slew timing. Pass --port to measure real
+hardware instead.
+
+    python servo_benchmark.py                    # binary and text protocol
+    python servo_benchmark.py --legacy --json    # older 9600 baud firmware
+    python servo_benchmark.py --port /dev/ttyACM0 --protocol auto
+
+Reported per protocol:
+- command-to-ack latency: a no-op move, from writing it to reading OK
+- queue throughput: no-op moves queued back to back, drained per second
+- pattern completion: each motion pattern, from play to the firmware going idle
+
+Older firmware never acknowledges, so against it every measurement runs to
+the position and "complete" lines it prints when a motion has finished.
+"""
+import argparse
+import contextlib
+import json
+import sys
+import time
+from servo_emulator import ServoEmulator
+from servo_interface import MOTION_PATTERNS, ServoInterface
+
+# Motion reports older firmware prints for each command besides a single move
+LEGACY_REPORTS = {"center": 3, "nod": 4, "scan": 4}
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def summarize(samples):
+    return {
+        "p50_ms": percentile(samples, 0.50) * 1000,
+        "p95_ms": percentile(samples, 0.95) * 1000,
+        "max_ms": max(samples) * 1000 if samples else 0.0
+    }
+
+def motion_reports(commands):
+    return sum(LEGACY_REPORTS.get(command, 1) for command in commands)
+
+def settle(servo, reports_before, commands, timeout, poll=0.0005):
+    """Wait until the commands have finished; False on timeout.
+
+    Firmware that acknowledges is done once the link is idle. Older firmware
+    is sent commands without waiting, so it is done once it has printed
+    every motion report the commands produce.
+    """
+    deadline = time.monotonic() + timeout
+    if not servo.wait_until_idle(timeout=timeout, poll=poll):
+        return False
+    if servo.acks_supported is not False:
+        return True
+    target = reports_before + motion_reports(commands)
+    while servo.reports_received < target:
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(poll)
+    return True
+
+def measure_ack_latency(servo, iterations):
+    """Write-to-OK (or write-to-report) and queue-to-idle times of moves that need no motion"""
+    reports = servo.acks_supported is False
+    ack_samples = []
+    round_trip_samples = []
+    for _ in range(iterations):
+        acks_before, ack_time_before = servo.acks_received, servo.total_ack_time
+        reports_before = servo.reports_received
+        started = time.perf_counter()
+        servo.rotate_horizontal(90)
+        if not settle(servo, reports_before, ["rotate:H,90"], servo.ack_timeout):
+            raise RuntimeError("Servo never finished a no-op move")
+        round_trip_samples.append(time.perf_counter() - started)
+        if reports:
+            ack_samples.append(servo.last_report_at - started)
+        elif servo.acks_received > acks_before:
+            ack_samples.append(servo.total_ack_time - ack_time_before)
+    return {
+        "ack_source": "report" if reports else "OK",
+        "ack": summarize(ack_samples),
+        "round_trip": summarize(round_trip_samples)
+    }
+
+def measure_throughput(servo, count):
+    reports_before = servo.reports_received
+    started = time.perf_counter()
+    for _ in range(count):
+        servo.rotate_horizontal(90)
+    if not settle(servo, reports_before, ["rotate:H,90"] * count, servo.ack_timeout * count):
+        raise RuntimeError("Command queue did not drain")
+    elapsed = time.perf_counter() - started
+    return {"commands": count, "seconds": elapsed, "commands_per_second": count / elapsed}
+
+def measure_patterns(servo, runs):
+    results = {}
+    for name, (_, keyframes) in MOTION_PATTERNS.items():
+        commands = [command for _, command in keyframes]
+        samples = []
+        for _ in range(runs):
+            reports_before = servo.reports_received
+            servo.center()
+            settle(servo, reports_before, ["center"], 10.0)
+            reports_before = servo.reports_received
+            started = time.perf_counter()
+            servo.motion_pattern(name)
+            if not settle(servo, reports_before, commands, 10.0, poll=0.001):
+                raise RuntimeError(f"Pattern '{name}' did not finish")
+            samples.append(time.perf_counter() - started)
+        results[name] = {
+            "scheduled_ms": keyframes[-1][0] * 1000,
+            "median_ms": percentile(samples, 0.5) * 1000,
+            "max_ms": max(samples) * 1000
+        }
+    return results
+
+def benchmark(port, protocol="auto", iterations=50, pattern_runs=3, reset_delay=2.0):
+    servo = ServoInterface(port=port, protocol=protocol, reset_delay=reset_delay)
+    if not servo.connect():
+        raise RuntimeError(f"Could not connect to {port}")
+    try:
+        reports_before = servo.reports_received
+        servo.center()
+        # The first command also tells whether the firmware acknowledges
+        settle(servo, reports_before, ["center"], servo.ack_timeout + 10.0)
+        report = {
+            "protocol": servo.protocol,
+            "baud_rate": servo.serial_conn.baudrate,
+            "latency": measure_ack_latency(servo, iterations),
+            "throughput": measure_throughput(servo, iterations),
+            "patterns": measure_patterns(servo, pattern_runs)
+        }
+        report["stats"] = servo.get_stats()
+        return report
+    finally:
+        servo.disconnect()
+
+def print_report(report):
+    print(f"\n{report['protocol']} protocol at {report['baud_rate']} baud")
+    latency = report["latency"]
+    ack_label = "Command-to-ack" if latency["ack_source"] == "OK" else "Command-to-report"
+    for label, key in ((ack_label, "ack"), ("Queue-to-idle", "round_trip")):
+        values = latency[key]
+        print(f"  {label:<17} p50 {values['p50_ms']:7.2f} ms   p95 {values['p95_ms']:7.2f} ms   "
+              f"max {values['max_ms']:7.2f} ms")
+    throughput = report["throughput"]
+    print(f"  Throughput        {throughput['commands_per_second']:7.1f} commands/s "
+          f"({throughput['commands']} in {throughput['seconds']:.2f} s)")
+    print("  Pattern completion (scheduled start of last keyframe / median / max):")
+    for name, values in report["patterns"].items():
+        print(f"    {name:<10} {values['scheduled_ms']:6.0f} ms   {values['median_ms']:7.1f} ms   "
+              f"{values['max_ms']:7.1f} ms")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the servo serial link")
+    parser.add_argument("--port", help="Real servo controller port (default: start an emulator)")
+    parser.add_argument("--protocol", choices=["auto", "text", "both"], default="both",
+                        help="Protocol preference; 'both' runs auto then text")
+    parser.add_argument("--legacy", action="store_true", help="Emulate the older 9600 baud text-only firmware")
+    parser.add_argument("--iterations", type=int, default=50, help="No-op commands per latency/throughput run")
+    parser.add_argument("--pattern-runs", type=int, default=3, help="Plays of each motion pattern")
+    parser.add_argument("--reset-delay", type=float, default=None,
+                        help="Seconds to wait for the board to reset on open (default 0.2 emulated, 2 real)")
+    parser.add_argument("--json", action="store_true", help="Print the reports as JSON")
+    args = parser.parse_args(argv)
+
+    protocols = ["auto", "text"] if args.protocol == "both" else [args.protocol]
+    reports = []
+    with contextlib.ExitStack() as stack:
+        # Keep stdout clean for the JSON report; link chatter goes to stderr
+        stack.enter_context(contextlib.redirect_stdout(sys.stderr if args.json else sys.stdout))
+        if args.port:
+            port = args.port
+            reset_delay = 2.0 if args.reset_delay is None else args.reset_delay
+        else:
+            emulated_delay = 0.2 if args.reset_delay is None else args.reset_delay
+            emulator = stack.enter_context(ServoEmulator(reset_delay=emulated_delay, legacy=args.legacy))
+            port = emulator.port
+            # Like a real board, the emulator needs a moment more than its own boot time
+            reset_delay = emulated_delay + 0.1
+        try:
+            for protocol in protocols:
+                reports.append(benchmark(port, protocol, args.iterations, args.pattern_runs, reset_delay))
+        except RuntimeError as e:
+            print(f"Benchmark failed: {e}")
+            return 1
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        for report in reports:
+            print_report(report)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,6 +4,17 @@
 #define SERVO_PIN_HORIZONTAL 9
 #define SERVO_PIN_VERTICAL 10
 
+// Serial settings (the host falls back to 9600 baud text commands for older firmware)
+#define BAUD_RATE 115200
+
+// Binary frame format: SYNC, type, length, payload, checksum (see servo_protocol.py)
+#define FRAME_SYNC 0xA5
+#define FRAME_KEYFRAMES 0x01
+#define FRAME_STOP 0x02
+#define FLAG_REPLACE 0x01
+#define AXIS_KEEP 0xFF
+#define MAX_FRAME_PAYLOAD 64
+
 // Create servo objects
 Servo horizontalServo;
 Servo verticalServo;
@@ -17,24 +28,54 @@ const int MAX_ANGLE_VERTICAL = 135;
 // Current position tracking
 int currentHorizontalAngle = 90; // Center position
 int currentVerticalAngle = 90;   // Center position
-int smoothingFactor = 5;         // Lower = smoother but slower
+int smoothingFactor = 5;         // Milliseconds per degree when no duration is given
+
+// Keyframe queue: both axes move together towards each keyframe's target
+struct Keyframe {
+  int horizontal;          // -1 = keep
+  int vertical;            // -1 = keep
+  unsigned int duration;   // Milliseconds, 0 = derive from smoothingFactor
+};
+
+const int QUEUE_SIZE = 16;
+Keyframe motionQueue[QUEUE_SIZE];
+int queueHead = 0;
+int queueCount = 0;
+
+// Segment currently being interpolated
+bool moving = false;
+unsigned long segmentStart = 0;
+unsigned long segmentDuration = 0;
+int startHorizontal = 90, startVertical = 90;
+int targetHorizontal = 90, targetVertical = 90;
+
+// Acknowledgements sent once the queue has drained
+bool textAckPending = false;
+bool batchAckPending = false;
+int pendingBatchId = 0;
 
 // Command processing
 String inputString = "";
-bool stringComplete = false;
+enum FrameState { WAIT_SYNC, WAIT_TYPE, WAIT_LENGTH, WAIT_PAYLOAD, WAIT_CHECKSUM };
+FrameState frameState = WAIT_SYNC;
+byte frameType = 0;
+byte frameLength = 0;
+byte framePayload[MAX_FRAME_PAYLOAD];
+byte frameReceived = 0;
 
 void setup() {
   // Initialize serial communication
-  Serial.begin(9600);
-  
+  Serial.begin(BAUD_RATE);
+  inputString.reserve(32);
+
   // Initialize servo motors
   horizontalServo.attach(SERVO_PIN_HORIZONTAL);
   verticalServo.attach(SERVO_PIN_VERTICAL);
-  
+
   // Move to center position
   horizontalServo.write(currentHorizontalAngle);
   verticalServo.write(currentVerticalAngle);
-  
+
   // Print welcome message
   Serial.println("AI Assistant Servo Controller");
   Serial.println("Available commands:");
@@ -43,40 +84,139 @@ void setup() {
   Serial.println("- scan (performs scanning motion)");
   Serial.println("- center (moves to center position)");
   Serial.println("- nod (performs nodding motion)");
+  Serial.println("- proto? (reports binary protocol support)");
+  Serial.println("Each command is answered with OK (or ERR) once it has finished");
 }
 
 void loop() {
-  // Process serial commands
+  // Never blocks: read whatever has arrived, then advance the motion
+  readSerial();
+  updateMotion();
+}
+
+void readSerial() {
   while (Serial.available()) {
-    char inChar = (char)Serial.read();
-    inputString += inChar;
-    
-    // Process when newline is received
-    if (inChar == '\n') {
-      stringComplete = true;
+    byte inByte = Serial.read();
+
+    if (frameState != WAIT_SYNC) {
+      readFrameByte(inByte);
+    } else if (inByte == FRAME_SYNC) {
+      frameState = WAIT_TYPE;
+    } else if (inByte == '\n') {
+      // Process when newline is received
+      processCommand(inputString);
+      inputString = "";
+    } else if (inputString.length() < 64) {
+      inputString += (char)inByte;
     }
   }
-  
-  // Process complete commands
-  if (stringComplete) {
-    processCommand(inputString);
-    inputString = "";
-    stringComplete = false;
+}
+
+void readFrameByte(byte inByte) {
+  switch (frameState) {
+    case WAIT_TYPE:
+      frameType = inByte;
+      frameState = WAIT_LENGTH;
+      break;
+    case WAIT_LENGTH:
+      frameLength = inByte;
+      frameReceived = 0;
+      if (frameLength > MAX_FRAME_PAYLOAD) {
+        Serial.println("NAK frame too long");
+        frameState = WAIT_SYNC;
+      } else {
+        frameState = frameLength == 0 ? WAIT_CHECKSUM : WAIT_PAYLOAD;
+      }
+      break;
+    case WAIT_PAYLOAD:
+      framePayload[frameReceived++] = inByte;
+      if (frameReceived == frameLength) {
+        frameState = WAIT_CHECKSUM;
+      }
+      break;
+    case WAIT_CHECKSUM: {
+      byte sum = frameType + frameLength;
+      for (int i = 0; i < frameLength; i++) {
+        sum += framePayload[i];
+      }
+      frameState = WAIT_SYNC;
+      if (sum != inByte) {
+        Serial.println("NAK checksum");
+      } else {
+        processFrame();
+      }
+      break;
+    }
+    default:
+      frameState = WAIT_SYNC;
   }
 }
 
+void processFrame() {
+  if (frameType == FRAME_STOP) {
+    // Hold the current position and forget queued keyframes
+    clearQueue();
+    moving = false;
+    finishMotion();
+    return;
+  }
+
+  if (frameType != FRAME_KEYFRAMES || frameLength < 3) {
+    Serial.println("NAK unknown frame");
+    return;
+  }
+
+  byte flags = framePayload[0];
+  byte batchId = framePayload[1];
+  byte count = framePayload[2];
+  if (frameLength != 3 + 4 * count) {
+    Serial.println("NAK keyframe count");
+    return;
+  }
+
+  if (flags & FLAG_REPLACE) {
+    // New targets take over mid-motion, starting from wherever the servos are now
+    clearQueue();
+    moving = false;
+  }
+
+  for (int i = 0; i < count; i++) {
+    byte *entry = framePayload + 3 + 4 * i;
+    int horizontal = entry[0] == AXIS_KEEP ? -1 : entry[0];
+    int vertical = entry[1] == AXIS_KEEP ? -1 : entry[1];
+    unsigned int duration = entry[2] | (entry[3] << 8);
+    if (!enqueueKeyframe(horizontal, vertical, duration)) {
+      Serial.println("NAK queue full");
+      break;
+    }
+  }
+
+  batchAckPending = true;
+  pendingBatchId = batchId;
+}
+
 void processCommand(String command) {
   command.trim();
-  
+
+  // Empty lines (e.g. stray line endings) need no acknowledgement
+  if (command.length() == 0) {
+    return;
+  }
+
+  if (command == "proto?") {
+    Serial.println("PROTO BIN1");
+    return;
+  }
+
   if (command.startsWith("rotate:H,")) {
     // Horizontal rotation command
     int angle = command.substring(9).toInt();
-    rotateHorizontal(angle);
-  } 
+    enqueueKeyframe(angle, -1, 0);
+  }
   else if (command.startsWith("rotate:V,")) {
     // Vertical rotation command
     int angle = command.substring(9).toInt();
-    rotateVertical(angle);
+    enqueueKeyframe(-1, angle, 0);
   }
   else if (command == "scan") {
     // Perform scanning motion
@@ -91,82 +231,143 @@ void processCommand(String command) {
     performNod();
   }
   else {
-    Serial.println("Unknown command: " + command);
+    Serial.println("ERR Unknown command: " + command);
+    return;
+  }
+
+  // "OK" follows once the motion has finished (see finishMotion)
+  textAckPending = true;
+}
+
+bool enqueueKeyframe(int horizontal, int vertical, unsigned int duration) {
+  if (queueCount == QUEUE_SIZE) {
+    return false;
   }
+  Keyframe &keyframe = motionQueue[(queueHead + queueCount) % QUEUE_SIZE];
+  keyframe.horizontal = horizontal < 0 ? -1 : constrain(horizontal, MIN_ANGLE_HORIZONTAL, MAX_ANGLE_HORIZONTAL);
+  keyframe.vertical = vertical < 0 ? -1 : constrain(vertical, MIN_ANGLE_VERTICAL, MAX_ANGLE_VERTICAL);
+  keyframe.duration = duration;
+  queueCount++;
+  return true;
 }
 
-void rotateHorizontal(int targetAngle) {
-  // Constrain target angle to valid range
-  targetAngle = constrain(targetAngle, MIN_ANGLE_HORIZONTAL, MAX_ANGLE_HORIZONTAL);
-  
-  // Smoothly move to target angle
-  while (abs(currentHorizontalAngle - targetAngle) > 1) {
-    if (currentHorizontalAngle < targetAngle) {
-      currentHorizontalAngle += 1;
-    } else {
-      currentHorizontalAngle -= 1;
+void clearQueue() {
+  queueHead = 0;
+  queueCount = 0;
+}
+
+// Vertical angle the servo will have once everything queued has run
+int plannedVerticalAngle() {
+  int vertical = moving ? targetVertical : currentVerticalAngle;
+  for (int i = 0; i < queueCount; i++) {
+    Keyframe &keyframe = motionQueue[(queueHead + i) % QUEUE_SIZE];
+    if (keyframe.vertical >= 0) {
+      vertical = keyframe.vertical;
     }
-    
-    horizontalServo.write(currentHorizontalAngle);
-    delay(smoothingFactor);
-  }
-  
-  Serial.println("Horizontal position: " + String(currentHorizontalAngle));
-}
-
-void rotateVertical(int targetAngle) {
-  // Constrain target angle to valid range
-  targetAngle = constrain(targetAngle, MIN_ANGLE_VERTICAL, MAX_ANGLE_VERTICAL);
-  
-  // Smoothly move to target angle
-  while (abs(currentVerticalAngle - targetAngle) > 1) {
-    if (currentVerticalAngle < targetAngle) {
-      currentVerticalAngle += 1;
-    } else {
-      currentVerticalAngle -= 1;
+  }
+  return vertical;
+}
+
+void startNextKeyframe(unsigned long now) {
+  Keyframe &keyframe = motionQueue[queueHead];
+  queueHead = (queueHead + 1) % QUEUE_SIZE;
+  queueCount--;
+
+  startHorizontal = currentHorizontalAngle;
+  startVertical = currentVerticalAngle;
+  targetHorizontal = keyframe.horizontal < 0 ? currentHorizontalAngle : keyframe.horizontal;
+  targetVertical = keyframe.vertical < 0 ? currentVerticalAngle : keyframe.vertical;
+
+  segmentDuration = keyframe.duration;
+  if (segmentDuration == 0) {
+    // Same speed as the old one-degree-per-step smoothing
+    int distance = max(abs(targetHorizontal - startHorizontal), abs(targetVertical - startVertical));
+    segmentDuration = (unsigned long)distance * smoothingFactor;
+  }
+  segmentStart = now;
+  moving = true;
+}
+
+void updateMotion() {
+  unsigned long now = millis();
+  if (!moving) {
+    if (queueCount == 0) {
+      // Idle: answer commands that didn't queue any motion
+      finishMotion();
+      return;
     }
-    
+    startNextKeyframe(now);
+  }
+
+  unsigned long elapsed = now - segmentStart;
+  if (elapsed >= segmentDuration) {
+    setPosition(targetHorizontal, targetVertical);
+    moving = false;
+    if (queueCount == 0) {
+      finishMotion();
+    }
+    return;
+  }
+
+  // Linear interpolation; both servos move at the same time
+  int horizontal = startHorizontal + (long)(targetHorizontal - startHorizontal) * elapsed / segmentDuration;
+  int vertical = startVertical + (long)(targetVertical - startVertical) * elapsed / segmentDuration;
+  setPosition(horizontal, vertical);
+}
+
+void setPosition(int horizontal, int vertical) {
+  // Only talk to a servo when its angle actually changes
+  if (horizontal != currentHorizontalAngle) {
+    currentHorizontalAngle = horizontal;
+    horizontalServo.write(currentHorizontalAngle);
+  }
+  if (vertical != currentVerticalAngle) {
+    currentVerticalAngle = vertical;
     verticalServo.write(currentVerticalAngle);
-    delay(smoothingFactor);
   }
-  
-  Serial.println("Vertical position: " + String(currentVerticalAngle));
+}
+
+void finishMotion() {
+  if (batchAckPending) {
+    Serial.println("DONE " + String(pendingBatchId));
+    batchAckPending = false;
+  }
+  if (textAckPending) {
+    Serial.println("Position: " + String(currentHorizontalAngle) + "," + String(currentVerticalAngle));
+    // Tell the host the motion has finished so it can send the next command
+    Serial.println("OK");
+    textAckPending = false;
+  }
 }
 
 void performScan() {
   Serial.println("Scanning surroundings...");
-  
-  // Move from left to right
-  rotateHorizontal(MIN_ANGLE_HORIZONTAL + 10);
-  delay(500);
-  rotateHorizontal(MAX_ANGLE_HORIZONTAL - 10);
-  delay(500);
-  
+
+  // Move from left to right, pausing at each end
+  enqueueKeyframe(MIN_ANGLE_HORIZONTAL + 10, -1, 0);
+  enqueueKeyframe(-1, -1, 500);
+  enqueueKeyframe(MAX_ANGLE_HORIZONTAL - 10, -1, 0);
+  enqueueKeyframe(-1, -1, 500);
+
   // Return to center
-  rotateHorizontal(90);
-  
-  Serial.println("Scan complete");
+  enqueueKeyframe(90, -1, 0);
 }
 
 void moveToCenter() {
   Serial.println("Moving to center position...");
-  rotateHorizontal(90);
-  rotateVertical(90);
-  Serial.println("Centered");
+  enqueueKeyframe(90, 90, 0);
 }
 
 void performNod() {
   Serial.println("Nodding...");
-  
-  // Save current vertical position
-  int originalVertical = currentVerticalAngle;
-  
+
+  // Nod around wherever the head will be once earlier moves finish
+  int originalVertical = plannedVerticalAngle();
+
   // Perform nodding motion
-  rotateVertical(originalVertical + 15);
-  delay(300);
-  rotateVertical(originalVertical - 15);
-  delay(300);
-  rotateVertical(originalVertical);
-  
-  Serial.println("Nod complete");
+  enqueueKeyframe(-1, originalVertical + 15, 0);
+  enqueueKeyframe(-1, -1, 300);
+  enqueueKeyframe(-1, originalVertical - 15, 0);
+  enqueueKeyframe(-1, -1, 300);
+  enqueueKeyframe(-1, originalVertical, 0);
 }
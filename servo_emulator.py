@@ -0,0 +1,421 @@
+"""Software stand-in for servo_controller.ino on a Linux pseudo-terminal.
+
+The emulator behaves like the sketch: it stays silent through the reset
+delay, prints the same banner, simulates slew timing and angle limits with
+the same keyframe queue and acknowledgements, and answers binary frames and
+text commands with the same lines. Point ServoInterface at emulator.port.
+
+    python servo_emulator.py            # prints the port, runs until Ctrl+C
+    python servo_emulator.py --legacy   # 9600 baud text-only firmware
+
+With legacy=True it mimics the previous sketch instead: 9600 baud, text
+commands only, no new command is read until the current motion ends, and
+nothing is acknowledged: the position and "complete" lines are the only
+sign that a motion finished.
+Bytes are delayed by their transmission time at the firmware's baud rate
+in both directions, so text and binary commands cost what they would on
+the wire. Opening the port resets the board, as the Arduino's DTR line does: the
+emulator treats any change of the port settings as a reset. If the port is
+opened at a different baud rate than the firmware uses, replies arrive
+garbled and input is ignored, as on real hardware.
+"""
+import argparse
+import os
+import select
+import termios
+import threading
+import time
+import tty
+from servo_protocol import FRAME_KEYFRAMES, FRAME_STOP, SYNC, decode_frame, decode_keyframes
+
+MIN_ANGLE_HORIZONTAL = 0
+MAX_ANGLE_HORIZONTAL = 180
+MIN_ANGLE_VERTICAL = 45
+MAX_ANGLE_VERTICAL = 135
+QUEUE_SIZE = 16
+MAX_FRAME_PAYLOAD = 64
+
+BANNER = [
+    "AI Assistant Servo Controller",
+    "Available commands:",
+    "- rotate:H,angle (0-180 degrees)",
+    "- rotate:V,angle (45-135 degrees)",
+    "- scan (performs scanning motion)",
+    "- center (moves to center position)",
+    "- nod (performs nodding motion)",
+    "- proto? (reports binary protocol support)",
+    "Each command is answered with OK (or ERR) once it has finished"
+]
+
+# The previous sketch had no protocol query and never acknowledged commands
+LEGACY_BANNER = [line for line in BANNER if not line.startswith(("- proto?", "Each command"))]
+
+BAUD_CONSTANTS = {
+    9600: termios.B9600,
+    115200: termios.B115200
+}
+
+def _constrain(value, low, high):
+    return max(low, min(high, value))
+
+class ServoEmulator:
+    """Emulated servo controller board behind a pty"""
+
+    def __init__(self, reset_delay=2.0, smoothing_ms=5, legacy=False, baud_rate=None):
+        self.reset_delay = reset_delay
+        self.smoothing_ms = smoothing_ms
+        self.legacy = legacy
+        self.baud_rate = baud_rate or (9600 if legacy else 115200)
+        self.horizontal = 90
+        self.vertical = 90
+        self.servo_writes = 0
+        self.frames_received = 0
+        self.commands_received = 0
+        self._queue = []           # (horizontal, vertical, duration ms, message when reached)
+        self._segment = None       # (start time, duration, start h, start v, target h, target v, message)
+        self._text_ack_pending = False
+        self._batch_ack_pending = None
+        self._input = bytearray()
+        self._rx_wire = []         # (due time, bytes) still "on the wire" to the board
+        self._tx_wire = []         # (due time, bytes) still on the wire to the host
+        self._rx_free_at = 0.0
+        self._tx_free_at = 0.0
+        self._text = ""
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+        self.resets = 0
+        self._booted_at = 0.0
+        self._banner_sent = False
+        self._master_fd, self._slave_fd = os.openpty()
+        # Raw mode so binary frames pass through the line discipline untouched
+        tty.setraw(self._slave_fd)
+        self._port_settings = self._read_port_settings()
+        self.port = os.ttyname(self._slave_fd)
+
+    def start(self):
+        self._running = True
+        self.reset()
+        self._thread = threading.Thread(target=self._run, name="servo-emulator", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        for fd in (self._master_fd, self._slave_fd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def reset(self):
+        """Like toggling DTR: forget all state and reboot after the reset delay"""
+        with self._lock:
+            self.horizontal = self.vertical = 90
+            self._queue = []
+            self._segment = None
+            self._text_ack_pending = False
+            self._batch_ack_pending = None
+            self._input.clear()
+            self._rx_wire = []
+            self._tx_wire = []
+            self._text = ""
+            self._booted_at = time.monotonic() + self.reset_delay
+            self._banner_sent = False
+            self.resets += 1
+
+    @property
+    def position(self):
+        with self._lock:
+            return self.horizontal, self.vertical
+
+    def _run(self):
+        while self._running:
+            try:
+                readable, _, _ = select.select([self._master_fd], [], [], 0.001)
+                data = os.read(self._master_fd, 1024) if readable else b""
+            except OSError:
+                break
+            settings = self._read_port_settings()
+            if settings != self._port_settings:
+                # The host (re)opened or reconfigured the port
+                self._port_settings = settings
+                self.reset()
+            now = time.monotonic()
+            if now < self._booted_at:
+                # Bootloader: input is lost while the board resets
+                continue
+            with self._lock:
+                if not self._banner_sent:
+                    for line in (LEGACY_BANNER if self.legacy else BANNER):
+                        self._println(line)
+                    self._banner_sent = True
+                if data and self._baud_matches():
+                    self._rx_free_at = max(now, self._rx_free_at) + self._wire_time(len(data))
+                    self._rx_wire.append((self._rx_free_at, data))
+                while self._rx_wire and self._rx_wire[0][0] <= now:
+                    self._input += self._rx_wire.pop(0)[1]
+                self._read_input()
+                self._update_motion(now)
+                self._flush_output(now)
+
+    def _wire_time(self, byte_count):
+        # 8N1: ten bits per byte
+        return byte_count * 10 / self.baud_rate
+
+    def _flush_output(self, now):
+        while self._tx_wire and self._tx_wire[0][0] <= now:
+            try:
+                os.write(self._master_fd, self._tx_wire.pop(0)[1])
+            except OSError:
+                pass
+
+    def _read_port_settings(self):
+        try:
+            return termios.tcgetattr(self._slave_fd)
+        except termios.error:
+            return None
+
+    def _baud_matches(self):
+        expected = BAUD_CONSTANTS.get(self.baud_rate)
+        if self._port_settings is None or expected is None:
+            return True
+        return self._port_settings[5] == expected
+
+    def _println(self, line):
+        if self._baud_matches():
+            payload = (line + "\r\n").encode()
+        else:
+            # What a UART at the wrong speed makes of the bytes
+            payload = bytes((byte ^ 0xAA) | 0x80 for byte in line.encode()) + b"\n"
+        now = time.monotonic()
+        self._tx_free_at = max(now, self._tx_free_at) + self._wire_time(len(payload))
+        self._tx_wire.append((self._tx_free_at, payload))
+
+    def _busy(self):
+        return self._segment is not None or bool(self._queue)
+
+    def _read_input(self):
+        while self._input:
+            if self.legacy and self._busy():
+                # The old sketch only read serial input between blocking motions
+                return
+            if not self.legacy and self._input[0] == SYNC:
+                if not self._read_frame():
+                    return
+                continue
+            byte = self._input.pop(0)
+            if byte == ord('\n'):
+                self._process_command(self._text)
+                self._text = ""
+            elif len(self._text) < 64:
+                self._text += chr(byte)
+
+    def _read_frame(self):
+        """Consume one frame from the input; False if it hasn't fully arrived"""
+        if len(self._input) < 3:
+            return False
+        length = self._input[2]
+        if length > MAX_FRAME_PAYLOAD:
+            # The sketch drops back to text parsing right after the length byte
+            del self._input[:3]
+            self._println("NAK frame too long")
+            return True
+        if len(self._input) < length + 4:
+            return False
+        frame = bytes(self._input[:length + 4])
+        del self._input[:length + 4]
+        try:
+            frame_type, payload = decode_frame(frame)
+        except ValueError:
+            self._println("NAK checksum")
+            return True
+        self._process_frame(frame_type, payload)
+        return True
+
+    def _process_frame(self, frame_type, payload):
+        self.frames_received += 1
+        if frame_type == FRAME_STOP:
+            self._queue = []
+            self._segment = None
+            self._finish_motion()
+            return
+        if frame_type != FRAME_KEYFRAMES or len(payload) < 3:
+            self._println("NAK unknown frame")
+            return
+        try:
+            replace, batch_id, keyframes = decode_keyframes(payload)
+        except ValueError:
+            self._println("NAK keyframe count")
+            return
+        if replace:
+            # Take over mid-motion from wherever the servos are now
+            self._queue = []
+            self._segment = None
+        for horizontal, vertical, duration in keyframes:
+            if not self._enqueue(-1 if horizontal is None else horizontal,
+                                 -1 if vertical is None else vertical, duration):
+                self._println("NAK queue full")
+                break
+        self._batch_ack_pending = batch_id
+
+    def _process_command(self, command):
+        command = command.strip()
+        if not command:
+            return
+        self.commands_received += 1
+        if command == "proto?" and not self.legacy:
+            self._println("PROTO BIN1")
+            return
+        # The older sketch moved one axis at a time and reported every move
+        moved_h = "Horizontal position: {h}" if self.legacy else None
+        moved_v = "Vertical position: {v}" if self.legacy else None
+        if command.startswith("rotate:H,"):
+            self._enqueue(self._to_int(command[9:]), -1, 0, moved_h)
+        elif command.startswith("rotate:V,"):
+            self._enqueue(-1, self._to_int(command[9:]), 0, moved_v)
+        elif command == "scan":
+            self._println("Scanning surroundings...")
+            self._enqueue(MIN_ANGLE_HORIZONTAL + 10, -1, 0, moved_h)
+            self._enqueue(-1, -1, 500)
+            self._enqueue(MAX_ANGLE_HORIZONTAL - 10, -1, 0, moved_h)
+            self._enqueue(-1, -1, 500)
+            self._enqueue(90, -1, 0, moved_h)
+            if self.legacy:
+                self._enqueue(-1, -1, 0, "Scan complete")
+        elif command == "center":
+            self._println("Moving to center position...")
+            if self.legacy:
+                self._enqueue(90, -1, 0, moved_h)
+                self._enqueue(-1, 90, 0, moved_v)
+                self._enqueue(-1, -1, 0, "Centered")
+            else:
+                self._enqueue(90, 90, 0)
+        elif command == "nod":
+            self._println("Nodding...")
+            original = self._planned_vertical()
+            self._enqueue(-1, original + 15, 0, moved_v)
+            self._enqueue(-1, -1, 300)
+            self._enqueue(-1, original - 15, 0, moved_v)
+            self._enqueue(-1, -1, 300)
+            self._enqueue(-1, original, 0, moved_v)
+            if self.legacy:
+                self._enqueue(-1, -1, 0, "Nod complete")
+        else:
+            self._println(("" if self.legacy else "ERR ") + "Unknown command: " + command)
+            return
+        self._text_ack_pending = not self.legacy
+
+    @staticmethod
+    def _to_int(text):
+        # Arduino's String.toInt(): leading digits, 0 if there are none
+        digits = ""
+        for char in text.strip():
+            if char.isdigit() or (char == "-" and not digits):
+                digits += char
+            else:
+                break
+        try:
+            return int(digits)
+        except ValueError:
+            return 0
+
+    def _enqueue(self, horizontal, vertical, duration, message=None):
+        if len(self._queue) == QUEUE_SIZE:
+            return False
+        if horizontal >= 0:
+            horizontal = _constrain(horizontal, MIN_ANGLE_HORIZONTAL, MAX_ANGLE_HORIZONTAL)
+        if vertical >= 0:
+            vertical = _constrain(vertical, MIN_ANGLE_VERTICAL, MAX_ANGLE_VERTICAL)
+        self._queue.append((horizontal, vertical, duration, message))
+        return True
+
+    def _planned_vertical(self):
+        vertical = self._segment[5] if self._segment else self.vertical
+        for _, queued_vertical, _, _ in self._queue:
+            if queued_vertical >= 0:
+                vertical = queued_vertical
+        return vertical
+
+    def _update_motion(self, now):
+        if self._segment is None:
+            if not self._queue:
+                self._finish_motion()
+                return
+            horizontal, vertical, duration, message = self._queue.pop(0)
+            target_h = self.horizontal if horizontal < 0 else horizontal
+            target_v = self.vertical if vertical < 0 else vertical
+            if self.legacy:
+                target_h = self._legacy_target(self.horizontal, target_h)
+                target_v = self._legacy_target(self.vertical, target_v)
+            if duration == 0:
+                duration = max(abs(target_h - self.horizontal), abs(target_v - self.vertical)) * self.smoothing_ms
+            self._segment = (now, duration / 1000.0, self.horizontal, self.vertical, target_h, target_v, message)
+
+        started, duration, start_h, start_v, target_h, target_v, message = self._segment
+        elapsed = now - started
+        if elapsed >= duration:
+            self._set_position(target_h, target_v)
+            self._segment = None
+            if message:
+                self._println(message.format(h=self.horizontal, v=self.vertical))
+            if not self._queue:
+                self._finish_motion()
+            return
+        # Same integer interpolation as the sketch
+        fraction_ms = int(elapsed * 1000)
+        duration_ms = int(duration * 1000)
+        self._set_position(
+            start_h + int((target_h - start_h) * fraction_ms / duration_ms),
+            start_v + int((target_v - start_v) * fraction_ms / duration_ms)
+        )
+
+    @staticmethod
+    def _legacy_target(current, target):
+        # The old stepping loop stopped once within one degree of the target
+        if abs(target - current) <= 1:
+            return current
+        return target - 1 if target > current else target + 1
+
+    def _set_position(self, horizontal, vertical):
+        if horizontal != self.horizontal:
+            self.horizontal = horizontal
+            self.servo_writes += 1
+        if vertical != self.vertical:
+            self.vertical = vertical
+            self.servo_writes += 1
+
+    def _finish_motion(self):
+        if self._batch_ack_pending is not None:
+            self._println(f"DONE {self._batch_ack_pending}")
+            self._batch_ack_pending = None
+        if self._text_ack_pending:
+            self._println(f"Position: {self.horizontal},{self.vertical}")
+            self._println("OK")
+            self._text_ack_pending = False
+
+def main():
+    parser = argparse.ArgumentParser(description="Emulate the servo controller on a pseudo-terminal")
+    parser.add_argument("--reset-delay", type=float, default=2.0, help="Seconds of silence after start (board reset)")
+    parser.add_argument("--legacy", action="store_true", help="Emulate the older 9600 baud text-only firmware")
+    args = parser.parse_args()
+
+    with ServoEmulator(reset_delay=args.reset_delay, legacy=args.legacy) as emulator:
+        print(f"Servo emulator listening on {emulator.port} (set SERVO_PORT to use it)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == "__main__":
+    main()
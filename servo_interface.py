@@ -3,35 +3,105 @@ import time
 import threading
 import queue
 import re
+from config import SERVO_RESET_DELAY
+from motion_scheduler import MotionScheduler, MotionTimeline
+from servo_protocol import (
+    MAX_BATCH, PROTOCOL_BINARY, PROTOCOL_QUERY, encode_keyframes, encode_stop,
+    timeline_to_keyframes
+)
+
+# Motion patterns as keyframe timelines: (priority, [(seconds from start, command), ...]).
+# Listening outranks the rest so a new visitor's turn cuts off a stale gesture.
+MOTION_PATTERNS = {
+    "greeting": (1, [(0.0, "center"), (0.5, "nod")]),
+    "thinking": (1, [(0.0, "rotate:H,60"), (0.5, "rotate:H,120"), (1.0, "rotate:H,90")]),
+    "listening": (2, [(0.0, "rotate:V,80"), (0.2, "rotate:V,100"), (0.4, "rotate:V,90")]),
+    "confused": (1, [(0.0, "rotate:H,70"), (0.3, "rotate:H,110"), (0.6, "rotate:H,90"), (0.6, "nod")])
+}
+
+# Lines older firmware prints when a move or a whole motion has finished
+MOTION_REPORT = re.compile(r"(position: -?\d+|complete|Centered)$")
 
 class ServoInterface:
-    def __init__(self, port="/dev/ttyACM0", baud_rate=9600):
-        """Initialize servo interface with Arduino"""
+    # Poll interval of the reader thread; bounds how long disconnect() waits for it
+    READ_TIMEOUT = 0.1
+    # How long to wait for the firmware to answer the protocol query
+    NEGOTIATE_TIMEOUT = 1.0
+    # Playing time allowed for a keyframe the firmware times itself: a full sweep at 5 ms per degree
+    DEFAULT_MOVE_MS = 900
+    # How much longer than its keyframes a batch may take before its DONE is given up on
+    BATCH_MARGIN = 1.0
+
+    def __init__(self, port="/dev/ttyACM0", baud_rate=115200, fallback_baud_rate=9600,
+                 ack_timeout=5.0, protocol="auto", reset_delay=SERVO_RESET_DELAY):
+        """Initialize servo interface with Arduino.
+
+        protocol is "auto" (binary keyframe batches if the firmware supports
+        them, text commands otherwise) or "text". Older firmware that only
+        runs at fallback_baud_rate is detected and driven with text commands.
+        Opening the port resets the board; reset_delay is how long it takes
+        to boot before it reads commands.
+        """
         self.port = port
         self.baud_rate = baud_rate
+        self.fallback_baud_rate = fallback_baud_rate
+        self.ack_timeout = ack_timeout  # Longest motion (a full scan) takes ~3 s
+        self.protocol_preference = protocol
+        self.reset_delay = reset_delay
+        self.protocol = None            # Negotiated: "binary" or "text"
         self.serial_conn = None
         self.connected = False
+        self.running = False
         self.command_queue = queue.Queue()
-        self.motion_patterns = {
-            "greeting": self._pattern_greeting,
-            "thinking": self._pattern_thinking,
-            "listening": self._pattern_listening,
-            "confused": self._pattern_confused
-        }
+        self.command_thread = None
+        self.reader_thread = None
+        self._ack = threading.Event()
+        self._ack_line = None
+        # None until the protocol query or a command tells; False for firmware that never acknowledges
+        self.acks_supported = None
+        self.commands_sent = 0
+        self.ack_timeouts = 0
+        self.max_dispatch_delay = 0.0
+        self.total_ack_time = 0.0
+        self.acks_received = 0
+        # Motion reports, the only completion signal from firmware without acknowledgements
+        self.reports_received = 0
+        self.last_report_at = 0.0
+        self._write_lock = threading.Lock()
+        self._batch_id = 0
+        self._busy_batch = None  # Binary batch the firmware is still playing
+        self._busy_until = 0.0   # When to stop waiting for that batch's DONE
+        self._vertical = 90      # Last commanded vertical angle, for nods in batches
+        self.batches_sent = 0
+        self.naks = 0
+        self.batch_timeouts = 0
+        self.motion_patterns = MOTION_PATTERNS
+        # Patterns play in the background, one keyframe per idle servo
+        self.scheduler = MotionScheduler(self._queue_command, self._is_idle)
         
     def connect(self):
         """Attempt to connect to the Arduino"""
         try:
-            self.serial_conn = serial.Serial(self.port, self.baud_rate, timeout=1)
-            time.sleep(2)  # Wait for Arduino to reset
+            self.serial_conn, self.protocol = self._open_and_negotiate()
             self.connected = True
-            print(f"Connected to Arduino on {self.port}")
+            # Opening the port reset the board, so nothing is playing any more
+            self._busy_batch = None
+            print(f"Connected to Arduino on {self.port} ({self.protocol} protocol at {self.serial_conn.baudrate} baud)")
+            if self.protocol == "binary":
+                # Whole patterns go out as one keyframe batch that replaces any motion in progress
+                self.scheduler.send_timeline = self._send_timeline
             
-            # Start command processing thread
+            # Responses are parsed on their own thread so sending never waits on readline()
             self.running = True
-            self.command_thread = threading.Thread(target=self._process_command_queue)
+            self.reader_thread = threading.Thread(target=self._read_responses, name="servo-reader")
+            self.reader_thread.daemon = True
+            self.reader_thread.start()
+            
+            # Start command processing thread
+            self.command_thread = threading.Thread(target=self._process_command_queue, name="servo-dispatch")
             self.command_thread.daemon = True
             self.command_thread.start()
+            self.scheduler.start()
             
             return True
         except Exception as e:
@@ -39,11 +109,56 @@ class ServoInterface:
             self.connected = False
             return False
     
+    def _open_and_negotiate(self):
+        """Open the port at the preferred baud rate, falling back for older firmware"""
+        baud_rates = [self.baud_rate]
+        if self.fallback_baud_rate and self.fallback_baud_rate != self.baud_rate:
+            baud_rates.append(self.fallback_baud_rate)
+        for index, baud_rate in enumerate(baud_rates):
+            conn = serial.Serial(self.port, baud_rate, timeout=self.READ_TIMEOUT)
+            time.sleep(self.reset_delay)  # Wait for Arduino to reset
+            protocol = self._negotiate(conn)
+            if protocol:
+                return conn, protocol
+            if index == len(baud_rates) - 1:
+                print("No reply to the protocol query; assuming text commands")
+                return conn, "text"
+            conn.close()
+    
+    def _negotiate(self, conn):
+        """Ask the firmware which protocol it speaks; None if nothing intelligible came back"""
+        conn.reset_input_buffer()
+        conn.write(PROTOCOL_QUERY)
+        deadline = time.monotonic() + self.NEGOTIATE_TIMEOUT
+        while time.monotonic() < deadline:
+            line = conn.readline()
+            try:
+                response = line.decode("ascii").strip()
+            except UnicodeDecodeError:
+                # Noise from a baud rate mismatch
+                continue
+            if response.startswith("PROTO"):
+                # Firmware that answers the query acknowledges every command
+                self.acks_supported = True
+                if PROTOCOL_BINARY in response.split() and self.protocol_preference != "text":
+                    return "binary"
+                return "text"
+            if "Unknown command" in response:
+                # Older firmware: text commands only, and no acknowledgements to wait for
+                self.acks_supported = False
+                return "text"
+        return None
+    
     def disconnect(self):
         """Disconnect from Arduino"""
         if self.connected:
+            self.scheduler.stop()
+            # Let queued commands go out first; the sentinel wakes the dispatcher
+            self.command_queue.put(None)
+            self.command_thread.join(timeout=self.ack_timeout + 1)
             self.running = False
-            time.sleep(0.5)
+            self._ack.set()
+            self.reader_thread.join(timeout=self.READ_TIMEOUT * 5)
             self.serial_conn.close()
             self.connected = False
             print("Disconnected from Arduino")
@@ -57,7 +172,7 @@ class ServoInterface:
         try:
             angle = int(angle)
             if 0 <= angle <= 180:
-                self.command_queue.put(f"rotate:H,{angle}")
+                self._queue_command(f"rotate:H,{angle}")
             else:
                 print("Horizontal angle must be between 0 and 180 degrees")
         except ValueError:
@@ -72,7 +187,7 @@ class ServoInterface:
         try:
             angle = int(angle)
             if 45 <= angle <= 135:
-                self.command_queue.put(f"rotate:V,{angle}")
+                self._queue_command(f"rotate:V,{angle}")
             else:
                 print("Vertical angle must be between 45 and 135 degrees")
         except ValueError:
@@ -81,62 +196,32 @@ class ServoInterface:
     def scan(self):
         """Perform scanning motion"""
         if self.connected:
-            self.command_queue.put("scan")
+            self._queue_command("scan")
     
     def center(self):
         """Move to center position"""
         if self.connected:
-            self.command_queue.put("center")
+            self._queue_command("center")
     
     def nod(self):
         """Perform nodding motion"""
         if self.connected:
-            self.command_queue.put("nod")
+            self._queue_command("nod")
     
     def motion_pattern(self, pattern_name):
-        """Execute a predefined motion pattern"""
+        """Start a predefined motion pattern in the background; returns immediately"""
         if not self.connected:
             print("Not connected to Arduino")
             return
             
         if pattern_name in self.motion_patterns:
-            self.motion_patterns[pattern_name]()
+            priority, keyframes = self.motion_patterns[pattern_name]
+            self.scheduler.play(MotionTimeline(pattern_name, keyframes, priority))
         else:
             print(f"Unknown motion pattern: {pattern_name}")
     
-    def _pattern_greeting(self):
-        """Execute greeting motion pattern"""
-        self.command_queue.put("center")
-        time.sleep(0.5)
-        self.command_queue.put("nod")
-    
-    def _pattern_thinking(self):
-        """Execute thinking motion pattern"""
-        self.rotate_horizontal(60)
-        time.sleep(0.5)
-        self.rotate_horizontal(120)
-        time.sleep(0.5)
-        self.rotate_horizontal(90)
-    
-    def _pattern_listening(self):
-        """Execute listening motion pattern"""
-        self.rotate_vertical(80)
-        time.sleep(0.2)
-        self.rotate_vertical(100)
-        time.sleep(0.2)
-        self.rotate_vertical(90)
-    
-    def _pattern_confused(self):
-        """Execute confused motion pattern"""
-        self.rotate_horizontal(70)
-        time.sleep(0.3)
-        self.rotate_horizontal(110)
-        time.sleep(0.3)
-        self.rotate_horizontal(90)
-        self.nod()
-    
     def react_to_emotions(self, text):
-        """React to emotions in text with appropriate motions"""
+        """React to emotions in text with appropriate motions; returns immediately"""
         text = text.lower()
         
         if re.search(r"(hello|hi|greet|welcome)", text):
@@ -146,31 +231,155 @@ class ServoInterface:
         elif re.search(r"(not sure|don't know|confused|unclear)", text):
             self.motion_pattern("confused")
     
+    def stop_motion(self):
+        """Drop pending patterns and, with binary firmware, freeze the servos where they are"""
+        self.scheduler.cancel()
+        if self.connected and self.protocol == "binary":
+            self._write(encode_stop())
+
+    def wait_until_idle(self, timeout=10.0, poll=0.005):
+        """Block until every queued command and pattern has finished; False on timeout"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.scheduler.active is None and self.scheduler.pending is None and self._is_idle():
+                return True
+            time.sleep(poll)
+        return False
+
+    def _queue_command(self, command):
+        self.command_queue.put((command, time.perf_counter()))
+    
+    def _is_idle(self):
+        busy_batch = self._busy_batch
+        if busy_batch is not None and time.monotonic() >= self._busy_until:
+            # The batch's DONE was lost; don't hold up every later motion for it
+            self._busy_batch = None
+            self.batch_timeouts += 1
+            print(f"No DONE from Arduino for motion batch {busy_batch}; assuming it finished")
+        # Counts the command being executed as well as queued ones
+        return self.command_queue.unfinished_tasks == 0 and self._busy_batch is None
+    
+    def _write(self, data):
+        # The dispatcher and the motion scheduler both write to the port
+        with self._write_lock:
+            self.serial_conn.write(data)
+    
+    def _send_timeline(self, timeline):
+        """Send a whole pattern as keyframe batches (binary protocol only)"""
+        try:
+            keyframes, vertical = timeline_to_keyframes(timeline.keyframes, self._vertical)
+            play_ms = sum(duration or self.DEFAULT_MOVE_MS for _, _, duration in keyframes)
+            self._batch_id = (self._batch_id + 1) % 256
+            self._busy_until = time.monotonic() + play_ms / 1000 + self.BATCH_MARGIN
+            self._busy_batch = self._batch_id
+            for start in range(0, len(keyframes), MAX_BATCH):
+                # The first batch replaces whatever is playing; the rest are appended
+                self._write(encode_keyframes(keyframes[start:start + MAX_BATCH], self._batch_id, replace=start == 0))
+            self._vertical = vertical
+            self.batches_sent += 1
+        except Exception as e:
+            print(f"Error sending motion pattern '{timeline.name}': {e}")
+            self._busy_batch = None
+    
     def _process_command_queue(self):
-        """Process command queue in background thread"""
-        while self.running:
+        """Send queued commands one at a time, each as soon as the previous one is acknowledged"""
+        while True:
+            item = self.command_queue.get()
             try:
-                if not self.command_queue.empty():
-                    command = self.command_queue.get()
-                    self._send_command(command)
-                    self.command_queue.task_done()
-                time.sleep(0.1)
+                if item is None:
+                    break
+                command, queued_at = item
+                delay = time.perf_counter() - queued_at
+                if delay > self.max_dispatch_delay:
+                    self.max_dispatch_delay = delay
+                self._send_command(command)
             except Exception as e:
                 print(f"Error processing command: {e}")
+            finally:
+                self.command_queue.task_done()
+                self.scheduler.wake()
     
     def _send_command(self, command):
-        """Send command to Arduino"""
+        """Send command to Arduino and wait for the firmware to report it finished"""
         try:
-            self.serial_conn.write(f"{command}\n".encode())
-            time.sleep(0.1)
-            
-            # Read response from Arduino
-            response = self.serial_conn.readline().decode().strip()
-            if response:
-                print(f"Arduino: {response}")
+            self._ack_line = None
+            self._ack.clear()
+            sent_at = time.perf_counter()
+            self._write(f"{command}\n".encode())
+            self.commands_sent += 1
+            if command.startswith("rotate:V,"):
+                self._vertical = int(command[9:])
+            elif command == "center":
+                self._vertical = 90
         except Exception as e:
             print(f"Error sending command: {e}")
             self.connected = False
+            return
+        
+        if self.acks_supported is False:
+            return
+        # Motions run to completion on the Arduino before the next command is read
+        if self._ack.wait(self.ack_timeout) and self._ack_line is not None:
+            self.acks_received += 1
+            self.total_ack_time += time.perf_counter() - sent_at
+            if self._ack_line.startswith("ERR"):
+                print(f"Arduino rejected '{command}': {self._ack_line}")
+        elif self.running:
+            self.ack_timeouts += 1
+            if self.acks_supported is None:
+                print("No acknowledgement from Arduino; assuming older firmware and not waiting for replies")
+                self.acks_supported = False
+            else:
+                print(f"Timed out waiting for Arduino to finish '{command}'")
+    
+    def _read_responses(self):
+        """Parse lines from the Arduino in the background"""
+        while self.running:
+            try:
+                line = self.serial_conn.readline()
+            except Exception as e:
+                if self.running:
+                    print(f"Error reading from Arduino: {e}")
+                    self.connected = False
+                # No DONE is coming over this connection
+                self._busy_batch = None
+                break
+            if not line:
+                continue
+            response = line.decode(errors="replace").strip()
+            if response == "OK" or response.startswith("ERR"):
+                self.acks_supported = True
+                self._ack_line = response
+                self._ack.set()
+            elif response.startswith("DONE") or response.startswith("NAK"):
+                if response.startswith("NAK"):
+                    self.naks += 1
+                    print(f"Arduino rejected a motion batch: {response}")
+                    self._busy_batch = None
+                elif response[5:].strip() == str(self._busy_batch):
+                    self._busy_batch = None
+                self.scheduler.wake()
+            elif response.startswith("PROTO"):
+                pass
+            elif response:
+                if MOTION_REPORT.search(response):
+                    self.reports_received += 1
+                    self.last_report_at = time.perf_counter()
+                print(f"Arduino: {response}")
+    
+    def get_stats(self):
+        return {
+            "protocol": self.protocol,
+            "commands_sent": self.commands_sent,
+            "batches_sent": self.batches_sent,
+            "naks": self.naks,
+            "batch_timeouts": self.batch_timeouts,
+            "queued": self.command_queue.qsize(),
+            "max_dispatch_delay_ms": self.max_dispatch_delay * 1000,
+            "avg_ack_ms": self.total_ack_time / self.acks_received * 1000 if self.acks_received else 0.0,
+            "ack_timeouts": self.ack_timeouts,
+            "motion": self.scheduler.get_stats()
+        }
 
 # Example usage
 if __name__ == "__main__":
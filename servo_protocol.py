@@ -0,0 +1,109 @@
+"""Binary framing for servo_controller.ino.
+
+A frame is SYNC, type, payload length, payload, checksum, where the checksum
+is the sum of the type, length and payload bytes modulo 256. The firmware
+reads text commands and frames on the same port (SYNC is never sent in text)
+and always answers with text lines.
+"""
+import struct
+
+SYNC = 0xA5
+FRAME_KEYFRAMES = 0x01
+FRAME_STOP = 0x02
+
+FLAG_REPLACE = 0x01  # Drop queued keyframes and start from the current position now
+
+KEEP = 0xFF          # Axis value meaning "leave this servo where it is"
+MAX_BATCH = 12       # Keeps a whole frame inside the Arduino's 64-byte receive buffer
+
+PROTOCOL_QUERY = b"proto?\n"
+PROTOCOL_BINARY = "BIN1"
+
+def checksum(frame_type, payload):
+    return (frame_type + len(payload) + sum(payload)) & 0xFF
+
+def encode_frame(frame_type, payload=b""):
+    if len(payload) > 255:
+        raise ValueError("Frame payload too long")
+    return bytes([SYNC, frame_type, len(payload)]) + payload + bytes([checksum(frame_type, payload)])
+
+def encode_keyframes(keyframes, batch_id, replace=False):
+    """Frame for up to MAX_BATCH (horizontal, vertical, duration ms) keyframes.
+
+    Use None for an axis that shouldn't move; a duration of 0 lets the
+    firmware pick its default speed for the distance travelled.
+    """
+    if not keyframes or len(keyframes) > MAX_BATCH:
+        raise ValueError(f"A batch holds 1 to {MAX_BATCH} keyframes")
+    payload = bytearray([FLAG_REPLACE if replace else 0, batch_id & 0xFF, len(keyframes)])
+    for horizontal, vertical, duration_ms in keyframes:
+        payload += struct.pack(
+            "<BBH",
+            KEEP if horizontal is None else int(horizontal),
+            KEEP if vertical is None else int(vertical),
+            max(0, min(int(duration_ms), 0xFFFF))
+        )
+    return encode_frame(FRAME_KEYFRAMES, bytes(payload))
+
+def encode_stop():
+    return encode_frame(FRAME_STOP)
+
+def decode_frame(data):
+    """Return (type, payload) for one complete frame, or raise ValueError"""
+    if len(data) < 4 or data[0] != SYNC:
+        raise ValueError("Not a frame")
+    frame_type, length = data[1], data[2]
+    if len(data) != length + 4:
+        raise ValueError("Frame length mismatch")
+    payload = bytes(data[3:3 + length])
+    if data[-1] != checksum(frame_type, payload):
+        raise ValueError("Bad checksum")
+    return frame_type, payload
+
+def decode_keyframes(payload):
+    """Inverse of encode_keyframes' payload: (replace, batch_id, [(h, v, duration ms)])"""
+    flags, batch_id, count = payload[0], payload[1], payload[2]
+    if len(payload) != 3 + 4 * count:
+        raise ValueError("Keyframe count mismatch")
+    keyframes = []
+    for index in range(count):
+        horizontal, vertical, duration_ms = struct.unpack_from("<BBH", payload, 3 + 4 * index)
+        keyframes.append((
+            None if horizontal == KEEP else horizontal,
+            None if vertical == KEEP else vertical,
+            duration_ms
+        ))
+    return bool(flags & FLAG_REPLACE), batch_id, keyframes
+
+def timeline_to_keyframes(timeline_keyframes, vertical=90, tail_ms=0):
+    """Convert (offset seconds, text command) keyframes into binary keyframes.
+
+    Each move is stretched over the gap until the next keyframe so both the
+    timing and the smoothness of the pattern are preserved; nods are expanded
+    around the last known vertical angle. Returns (keyframes, final vertical angle).
+    """
+    keyframes = []
+    steps = list(timeline_keyframes)
+    for index, (offset, command) in enumerate(steps):
+        next_offset = steps[index + 1][0] if index + 1 < len(steps) else None
+        duration_ms = int((next_offset - offset) * 1000) if next_offset is not None else tail_ms
+        if command.startswith("rotate:H,"):
+            keyframes.append((int(command[9:]), None, duration_ms))
+        elif command.startswith("rotate:V,"):
+            vertical = int(command[9:])
+            keyframes.append((None, vertical, duration_ms))
+        elif command == "center":
+            vertical = 90
+            keyframes.append((90, 90, duration_ms))
+        elif command == "nod":
+            keyframes.extend([
+                (None, min(vertical + 15, 135), 150),
+                (None, max(vertical - 15, 45), 300),
+                (None, vertical, 150)
+            ])
+            if duration_ms > 600:
+                # Hold until the next keyframe is due
+                keyframes.append((None, None, duration_ms - 600))
+        else:
+            raise ValueError(f"No binary form for command: {command}")
+    return keyframes, vertical
@@ -0,0 +1,234 @@
+import re
+import threading
+import time
+from config import (
+    GEMINI_STREAMING, SPECULATION_STABLE_MS, SPECULATION_MIN_WORDS, SPECULATION_MAX_PER_TURN
+)
+from tracing import get_tracer
+
+def strip_wake_word(text, keyword):
+    """The command part of a transcript: lower-cased, without the wake word"""
+    return text.lower().replace(keyword.lower(), "").strip()
+
+def normalize(text):
+    """Punctuation and spacing differences between partial and final transcripts don't matter"""
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+class SpeculativeAnswer:
+    """An answer produced on a background thread before the command is final.
+
+    Chunks are buffered as they arrive; chunks() replays them and then
+    follows the live stream. Cancelling closes the underlying stream (and
+    with it the Gemini request) at its next chunk.
+
+    produce(hold) starts the request; the complete answer is handed to hold()
+    instead of the response cache, since the transcript it answers may still
+    change. when_cacheable() releases it once the command is confirmed.
+    """
+
+    def __init__(self, text, produce, cancelled=None, turn_id=None):
+        self.text = text
+        self.turn_id = turn_id
+        self.normalized = normalize(text)
+        self.started_at = time.perf_counter()
+        self._produce = produce
+        self._turn_cancelled = cancelled
+        self._chunks = []
+        self._done = False
+        self._cacheable = None     # Complete answer held back from the response cache
+        self._on_cacheable = None
+        self._cancelled = threading.Event()
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="speculation", daemon=True)
+        self._thread.start()
+
+    def _is_cancelled(self):
+        return self._cancelled.is_set() or (self._turn_cancelled is not None and self._turn_cancelled.is_set())
+
+    def _run(self):
+        # Spans from the speculative request belong to the turn it was started for
+        get_tracer().set_turn(self.turn_id)
+        stream = None
+        try:
+            stream = self._produce(self._hold_for_cache)
+            for chunk in stream:
+                if self._is_cancelled():
+                    break
+                with self._cond:
+                    self._chunks.append(chunk)
+                    self._cond.notify_all()
+        except Exception as e:
+            print(f"Error in speculative request: {e}")
+        finally:
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+            with self._cond:
+                self._done = True
+                self._cond.notify_all()
+
+    def _hold_for_cache(self, response):
+        with self._cond:
+            callback = self._on_cacheable
+            if callback is None:
+                self._cacheable = response
+                return
+        callback(response)
+
+    def when_cacheable(self, callback):
+        """Call callback(answer) with the complete answer, now or once it has finished"""
+        with self._cond:
+            response = self._cacheable
+            if response is None:
+                self._on_cacheable = callback
+                return
+        callback(response)
+
+    def cancel(self):
+        self._cancelled.set()
+        with self._cond:
+            self._cond.notify_all()
+
+    def is_cancelled(self):
+        return self._is_cancelled()
+
+    def chunks(self):
+        """Yield the answer: buffered chunks at once, the rest as they arrive"""
+        index = 0
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: index < len(self._chunks) or self._done or self._cancelled.is_set())
+                    if index < len(self._chunks):
+                        chunk = self._chunks[index]
+                    elif self._done or self._cancelled.is_set():
+                        return
+                index += 1
+                yield chunk
+        finally:
+            if not self._done:
+                # The consumer stopped early (e.g. barge-in): stop the request too
+                self.cancel()
+
+class _TurnState:
+    def __init__(self):
+        self.partial = None
+        self.timer = None
+        self.answer = None
+        self.started = 0
+
+class Speculator:
+    """Start answering before the visitor has finished talking.
+
+    When a turn's partial transcript has not changed for stable_ms, the
+    answer (local answers, RAG retrieval and the Gemini request) is started
+    for it in the background. When the final transcript arrives, commit()
+    hands over the prefetched answer if it was for the same command after
+    normalization; otherwise the speculative request is cancelled and the
+    caller asks again. Needs a backend with partial results (vosk, scripted).
+    """
+
+    def __init__(self, ai_handler, streaming=GEMINI_STREAMING, stable_ms=SPECULATION_STABLE_MS,
+                 min_words=SPECULATION_MIN_WORDS, max_per_turn=SPECULATION_MAX_PER_TURN):
+        self.ai_handler = ai_handler
+        self.streaming = streaming
+        self.stable_seconds = stable_ms / 1000
+        self.min_words = min_words
+        self.max_per_turn = max_per_turn
+        self._turns = {}
+        self._lock = threading.Lock()
+        self.started = 0
+        self.commands = 0
+        self.hits = 0
+        self.misses = 0
+        self.wasted = 0
+        self.total_head_start = 0.0
+
+    def _produce(self, command, hold):
+        # Nothing reaches the response cache until commit() confirms the command
+        if self.streaming:
+            return self.ai_handler.stream_response(command, cache=hold)
+        return iter([self.ai_handler.get_response(command, cache=hold)])
+
+    def on_partial(self, turn, text):
+        """Feed a turn's latest partial transcript"""
+        command = strip_wake_word(text, turn.keyword)
+        with self._lock:
+            state = self._turns.setdefault(turn.id, _TurnState())
+            state.partial = command
+            if state.timer:
+                state.timer.cancel()
+                state.timer = None
+            if len(command.split()) < self.min_words:
+                return
+            if state.answer and state.answer.normalized == normalize(command):
+                return
+            # Speculate only once the partial has settled
+            state.timer = threading.Timer(self.stable_seconds, self._on_stable, (turn, command))
+            state.timer.daemon = True
+            state.timer.start()
+
+    def _on_stable(self, turn, command):
+        with self._lock:
+            state = self._turns.get(turn.id)
+            if state is None or state.partial != command or turn.is_cancelled():
+                return
+            state.timer = None
+            if state.answer:
+                if state.answer.normalized == normalize(command):
+                    return
+                # The visitor kept talking: the earlier guess is stale
+                state.answer.cancel()
+                self.wasted += 1
+                state.answer = None
+            if state.started >= self.max_per_turn:
+                return
+            state.started += 1
+            self.started += 1
+            state.answer = SpeculativeAnswer(command, lambda hold: self._produce(command, hold), turn.cancelled, turn.id)
+
+    def commit(self, turn, command):
+        """Prefetched answer for the turn's final command, or None if the caller must ask"""
+        with self._lock:
+            self.commands += 1
+            state = self._turns.pop(turn.id, None)
+            if state is None:
+                return None
+            if state.timer:
+                state.timer.cancel()
+            answer = state.answer
+            if answer is None:
+                return None
+            if answer.normalized == normalize(command) and not answer.is_cancelled():
+                self.hits += 1
+                self.total_head_start += time.perf_counter() - answer.started_at
+                answer.when_cacheable(lambda response: self.ai_handler.cache_response(command, response))
+                return answer
+            answer.cancel()
+            self.misses += 1
+            self.wasted += 1
+            return None
+
+    def discard(self, turn):
+        """Cancel whatever was speculated for a turn that won't be answered"""
+        with self._lock:
+            state = self._turns.pop(turn.id, None)
+            if state is None:
+                return
+            if state.timer:
+                state.timer.cancel()
+            if state.answer:
+                state.answer.cancel()
+                self.wasted += 1
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "started": self.started,
+                "hits": self.hits,
+                "misses": self.misses,
+                "wasted": self.wasted,
+                "hit_rate": self.hits / self.commands if self.commands else 0.0,
+                "wasted_rate": self.wasted / self.started if self.started else 0.0,
+                "avg_head_start_ms": self.total_head_start / self.hits * 1000 if self.hits else 0.0
+            }
@@ -1,29 +1,381 @@
+import os
 import pyttsx3
+import queue
+import re
+import threading
+import time
+import wave
+from collections import deque
+from audio_capture import acquire_pyaudio, release_pyaudio
+from config import TTS_CACHE_ENABLED, TTS_CACHE_MIN_REPEATS
+from tracing import get_tracer
+from tts_cache import TTSCache
+
+class SentenceChunker:
+    """Split incrementally arriving text into complete sentences"""
+    # Sentence end: terminal punctuation (plus closing quotes/brackets) then whitespace
+    BOUNDARY = re.compile(r'[.!?]+["\')\]]*\s+|\n+')
+    ABBREVIATIONS = {"dr", "mr", "mrs", "ms", "prof", "st", "no", "vs", "etc", "e.g", "i.e", "dept"}
 
-class SpeechHandler:
     def __init__(self):
-        self.engine = pyttsx3.init()
-        
+        self.buffer = ""
+
+    def feed(self, text):
+        """Add text and return any sentences that are now complete"""
+        self.buffer += text
+        sentences = []
+        start = 0
+        for match in self.BOUNDARY.finditer(self.buffer):
+            candidate = self.buffer[start:match.end()].strip()
+            words = candidate.split()
+            last_word = words[-1].rstrip('.!?"\')]').lower() if words else ""
+            # Don't break on abbreviations like "Dr." or on enumerations like "1."
+            if match.group().strip().startswith('.') and (last_word in self.ABBREVIATIONS or last_word.isdigit()):
+                continue
+            if candidate:
+                sentences.append(candidate)
+            start = match.end()
+        self.buffer = self.buffer[start:]
+        return sentences
+
+    def flush(self):
+        """Return whatever is left in the buffer as a final sentence"""
+        remainder = self.buffer.strip()
+        self.buffer = ""
+        return [remainder] if remainder else []
+
+class SpeechHandler:
+    """Text-to-speech on a dedicated worker thread.
+
+    speak() queues an utterance and returns at once, so the caller can keep
+    listening for the wake word while the answer plays; stop() cuts the
+    current utterance short and drops anything still queued (barge-in).
+    The pyttsx3 engine is created and driven only from the worker thread.
+    """
+
+    POLL_INTERVAL = 0.01  # Seconds between driver iterations while speaking
+    PLAYBACK_CHUNK = 1024  # Frames written per chunk when playing cached audio
+
+    def __init__(self, init_timeout=10.0):
+        self.engine = None
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._ready = threading.Event()
+        self._pending = 0            # Utterances queued or playing
+        self._generation = 0         # Bumped by stop(); older utterances are skipped
+        self._stop_requested = False
+        self._speaking = False
+        self._utterance_name = None  # Name of the utterance being played
+        self._utterance_count = 0
+        self._init_error = None
+        self.tracer = get_tracer()
+        self._utterance_trace = None  # (turn ID, start time, played from cache) of the current utterance
+        # Rendered-audio cache: frequent phrases are played from WAV files instead of synthesized
+        self.cache = TTSCache() if TTS_CACHE_ENABLED else None
+        self._render_backlog = deque()
+        self._render_name = None
+        self._render_done = False
+        self._render_supported = True
+        self._uncached_counts = {}
+        self._pa = None  # Shared with microphone capture, acquired on first playback
+        self.phrases_rendered = 0
+        self.utterances_spoken = 0
+        self.utterances_interrupted = 0
+        self._thread = threading.Thread(target=self._run, name="tts-worker", daemon=True)
+        self._thread.start()
+        if not self._ready.wait(init_timeout):
+            raise RuntimeError("Text-to-speech engine did not start in time")
+        if self._init_error:
+            raise self._init_error
+
+    def _create_engine(self):
+        engine = pyttsx3.init()
+
         # Get available voices
-        voices = self.engine.getProperty('voices')
+        voices = engine.getProperty('voices')
         # Select female voice (usually index 1)
         for voice in voices:
             # Look for a female Indian English voice
             if "female" in voice.name.lower() and ("indian" in voice.name.lower() or "en_in" in voice.id.lower()):
-                self.engine.setProperty('voice', voice.id)
+                engine.setProperty('voice', voice.id)
                 break
-        
+
         # Configure voice properties
-        self.engine.setProperty('rate', 145)     # Slightly slower for clarity
-        self.engine.setProperty('volume', 0.9)   # Volume level
-        
-    def speak(self, text):
+        engine.setProperty('rate', 145)     # Slightly slower for clarity
+        engine.setProperty('volume', 0.9)   # Volume level
+        return engine
+
+    def _run(self):
+        try:
+            self.engine = self._create_engine()
+            self.engine.connect('finished-utterance', self._on_finished)
+            # External loop: the worker pumps the driver itself so it can react to stop()
+            self.engine.startLoop(False)
+        except Exception as e:
+            self._init_error = e
+            self._ready.set()
+            return
+        self._ready.set()
+
+        deadline = 0.0
+        while True:
+            if self._speaking:
+                if self._stop_requested or time.monotonic() > deadline:
+                    # Either interrupted, or the driver never reported the end
+                    self._stop_requested = False
+                    self.engine.stop()
+                    self.utterances_interrupted += 1
+                    self._finish_utterance(spoken=False)
+                    continue
+                self.engine.iterate()
+                time.sleep(self.POLL_INTERVAL)
+                continue
+
+            if self._render_backlog and self._queue.empty():
+                # Idle: render a frequent phrase into the cache
+                self._render(self._render_backlog.popleft())
+                continue
+            item = self._queue.get()
+            if item is None:
+                break
+            if item[0] == "render":
+                # Deferred until nothing is waiting to be spoken
+                self._render_backlog.append(item[1])
+                continue
+            _, generation, text, turn_id, queued_at = item
+            self._stop_requested = False
+            if generation != self._generation:
+                self._finish_utterance(spoken=False)
+                continue
+            started = time.perf_counter()
+            self.tracer.record("tts_queue_wait", queued_at, started, turn_id)
+
+            cache_key = self._cache_key(text)
+            cached_path = self.cache.get(cache_key) if cache_key else None
+            self._utterance_trace = (turn_id, started, cached_path is not None)
+            if cached_path:
+                completed = self._play_file(cached_path)
+                if not completed:
+                    self.utterances_interrupted += 1
+                self._finish_utterance(spoken=completed)
+                continue
+            self._note_uncached(text, cache_key)
+
+            self._speaking = True
+            # Named so a late end event from an interrupted utterance can't end this one
+            self._utterance_count += 1
+            self._utterance_name = f"utterance-{self._utterance_count}"
+            # Generous upper bound on how long the utterance can take at 145 wpm
+            deadline = time.monotonic() + 5.0 + len(text) / 5.0
+            try:
+                self.engine.say(text, self._utterance_name)
+            except Exception as e:
+                print(f"Speech Error: {str(e)}")
+                # Fallback to default voice if error occurs
+                try:
+                    self.engine.setProperty('voice', self.engine.getProperty('voices')[0].id)
+                    self.engine.say(text, self._utterance_name)
+                except Exception as e:
+                    print(f"Speech Error: {str(e)}")
+                    self._finish_utterance(spoken=False)
         try:
-            self.engine.say(text)
-            self.engine.runAndWait()
+            self.engine.endLoop()
+        except Exception:
+            pass
+        if self._pa:
+            release_pyaudio()
+            self._pa = None
+
+    def _on_finished(self, name, completed):
+        # Called from engine.iterate() on the worker thread
+        if name == self._render_name:
+            self._render_done = True
+        elif self._speaking and name == self._utterance_name:
+            self._finish_utterance()
+
+    def _cache_key(self, text):
+        if not self.cache:
+            return None
+        return self.cache.make_key(
+            text,
+            self.engine.getProperty('voice'),
+            self.engine.getProperty('rate'),
+            self.engine.getProperty('volume')
+        )
+
+    def _note_uncached(self, text, cache_key):
+        """Queue a phrase for rendering once it has been synthesized live often enough"""
+        if not cache_key or not self._render_supported:
+            return
+        count = self._uncached_counts.get(cache_key, 0) + 1
+        if len(self._uncached_counts) > 2000:
+            # One-off sentences from LLM answers shouldn't accumulate forever
+            self._uncached_counts.clear()
+        self._uncached_counts[cache_key] = count
+        if count == TTS_CACHE_MIN_REPEATS:
+            self._render_backlog.append(text)
+
+    def _render(self, text):
+        """Synthesize text to a WAV file and add it to the cache (worker thread only).
+
+        Rendering gives way as soon as something is queued to be spoken: it is
+        abandoned and the phrase goes back to the front of the backlog.
+        """
+        cache_key = self._cache_key(text)
+        if not cache_key or not self._render_supported or self.cache.contains(cache_key):
+            return
+        rendered_path = self.cache.temp_path(cache_key)
+        self._utterance_count += 1
+        self._render_name = f"render-{self._utterance_count}"
+        self._render_done = False
+        deadline = time.monotonic() + 5.0 + len(text) / 10.0
+        preempted = False
+        try:
+            self.engine.save_to_file(text, rendered_path, self._render_name)
+            while not self._render_done and time.monotonic() < deadline:
+                if self._pending > 0:
+                    # A visitor is waiting for speech; the cache can wait
+                    preempted = True
+                    self.engine.stop()
+                    break
+                self.engine.iterate()
+                time.sleep(self.POLL_INTERVAL)
         except Exception as e:
-            print(f"Speech Error: {str(e)}")
-            # Fallback to default voice if error occurs
-            self.engine.setProperty('voice', self.engine.getProperty('voices')[0].id)
-            self.engine.say(text)
-            self.engine.runAndWait()
+            print(f"Error rendering speech for the cache: {e}")
+        finally:
+            self._render_name = None
+        if preempted:
+            self._render_backlog.appendleft(text)
+            if os.path.exists(rendered_path):
+                os.remove(rendered_path)
+            return
+        if os.path.exists(rendered_path):
+            if self.cache.put(cache_key, rendered_path):
+                self.phrases_rendered += 1
+                return
+        # Some drivers can't produce WAV files; stop trying after the first failure
+        print("Speech rendering is unavailable with this voice driver; TTS cache disabled")
+        self._render_supported = False
+        self._render_backlog.clear()
+
+    def _play_file(self, path):
+        """Play a cached WAV in small chunks so stop() takes effect quickly; True if played to the end"""
+        try:
+            if self._pa is None:
+                self._pa = acquire_pyaudio()
+            with wave.open(path, 'rb') as wav:
+                stream = self._pa.open(
+                    format=self._pa.get_format_from_width(wav.getsampwidth()),
+                    channels=wav.getnchannels(),
+                    rate=wav.getframerate(),
+                    output=True
+                )
+                try:
+                    data = wav.readframes(self.PLAYBACK_CHUNK)
+                    while data:
+                        if self._stop_requested:
+                            self._stop_requested = False
+                            return False
+                        stream.write(data)
+                        data = wav.readframes(self.PLAYBACK_CHUNK)
+                finally:
+                    stream.stop_stream()
+                    stream.close()
+            return True
+        except Exception as e:
+            print(f"Error playing cached speech: {e}")
+            return False
+
+    def _finish_utterance(self, spoken=True):
+        self._speaking = False
+        if spoken:
+            self.utterances_spoken += 1
+        if self._utterance_trace:
+            turn_id, started, cached = self._utterance_trace
+            self._utterance_trace = None
+            self.tracer.record("tts_utterance", started, time.perf_counter(), turn_id, spoken=spoken, cached=cached)
+        with self._lock:
+            self._pending -= 1
+            if self._pending == 0:
+                self._idle.set()
+
+    def speak(self, text):
+        """Queue text to be spoken after anything already queued; returns immediately"""
+        if not text or not text.strip():
+            return
+        with self._lock:
+            self._pending += 1
+            self._idle.clear()
+            self._queue.put(("speak", self._generation, text, self.tracer.current_turn(), time.perf_counter()))
+
+    def stop(self):
+        """Interrupt the current utterance and drop everything queued.
+
+        Returns True if anything was playing or waiting to be played.
+        """
+        with self._lock:
+            was_active = self._pending > 0
+            self._generation += 1
+        # Queued utterances of the old generation are skipped by the worker
+        self._stop_requested = True
+        return was_active
+
+    def warm_cache(self, phrases):
+        """Render phrases into the cache in the background, whenever the worker is idle"""
+        if not self.cache:
+            return
+        for phrase in phrases:
+            if phrase and phrase.strip():
+                self._queue.put(("render", phrase))
+
+    def is_speaking(self):
+        return not self._idle.is_set()
+
+    def wait(self, timeout=None):
+        """Block until everything queued has been spoken; returns False on timeout"""
+        return self._idle.wait(timeout)
+
+    def speak_stream(self, text_chunks, on_first_sentence=None):
+        """Queue each sentence as soon as it is complete; returns the full text.
+
+        Stops reading text_chunks early if stop() is called meanwhile.
+        """
+        chunker = SentenceChunker()
+        parts = []
+        first = True
+        generation = self._generation
+        for chunk in text_chunks:
+            if self._generation != generation:
+                # Interrupted: don't keep the response stream open
+                close = getattr(text_chunks, "close", None)
+                if close:
+                    close()
+                return "".join(parts)
+            parts.append(chunk)
+            for sentence in chunker.feed(chunk):
+                if first and on_first_sentence:
+                    on_first_sentence(sentence)
+                first = False
+                self.speak(sentence)
+        for sentence in chunker.flush():
+            if first and on_first_sentence:
+                on_first_sentence(sentence)
+            self.speak(sentence)
+        return "".join(parts)
+
+    def get_stats(self):
+        return {
+            "utterances_spoken": self.utterances_spoken,
+            "utterances_interrupted": self.utterances_interrupted,
+            "queued": self._queue.qsize(),
+            "phrases_rendered": self.phrases_rendered,
+            "cache": self.cache.get_stats() if self.cache else None
+        }
+
+    def close(self, timeout=2.0):
+        """Stop speaking and shut down the worker thread"""
+        self.stop()
+        self._queue.put(None)
+        self._thread.join(timeout)
@@ -0,0 +1,80 @@
+"""Command endpointing on recorded audio with the scripted ASR backend, no microphone or network."""
+import wave
+import numpy as np
+import pytest
+from asr import CommandRecognizer, NoSpeechError, ScriptedBackend
+from audio_capture import FileAudioSource, RingAudioSource
+
+SAMPLE_RATE = 16000
+FRAME_LENGTH = 512
+FRAME_MS = FRAME_LENGTH * 1000 / SAMPLE_RATE
+NOISE_RMS = 60
+ENDPOINTING = {
+    "trailing_silence_ms": 300,
+    "hesitation_silence_ms": 700,
+    "short_utterance_ms": 600,
+    "min_speech_ms": 90,
+    "max_seconds": 10
+}
+
+def background(seconds, rng):
+    return (rng.standard_normal(int(seconds * SAMPLE_RATE)) * NOISE_RMS).astype(np.int16)
+
+def voice(seconds, rng):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    syllables = 0.6 + 0.4 * np.sin(2 * np.pi * 3 * t)
+    return (np.sin(2 * np.pi * 180 * t) * 4000 * syllables + rng.standard_normal(len(t)) * NOISE_RMS).astype(np.int16)
+
+def write_recording(path, parts):
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(np.concatenate(parts).tobytes())
+    return str(path)
+
+def recognize(path, transcript):
+    source = FileAudioSource(path, SAMPLE_RATE, FRAME_LENGTH)
+    source.start()
+    recognizer = CommandRecognizer(ScriptedBackend([transcript]), listen_timeout=2.0, padding_ms=0, **ENDPOINTING)
+    partials = []
+    endpoints = []
+    try:
+        text = recognizer.recognize(RingAudioSource(source, 0), on_partial=partials.append,
+                                    on_endpoint=lambda: endpoints.append(source.ring.read_seq),
+                                    noise_floor=NOISE_RMS)
+    finally:
+        source.stop()
+    return text, partials, endpoints, recognizer.get_stats()
+
+def test_command_ends_after_trailing_silence(tmp_path):
+    rng = np.random.default_rng(1)
+    path = write_recording(tmp_path / "command.wav", [background(0.5, rng), voice(1.5, rng), background(3.0, rng)])
+
+    text, partials, endpoints, stats = recognize(path, "what courses are offered")
+
+    assert text == "what courses are offered"
+    assert partials[0] == "what"
+    assert "what courses are offered".startswith(partials[-1])
+    assert stats["ended_by"]["silence"] == 1
+    # Speech plus the trailing silence, not the seconds of background after it
+    assert stats["avg_utterance_ms"] == pytest.approx(1500 + ENDPOINTING["trailing_silence_ms"], abs=2 * FRAME_MS)
+    assert endpoints[0] * FRAME_MS == pytest.approx(2000 + ENDPOINTING["trailing_silence_ms"], abs=3 * FRAME_MS)
+
+def test_short_command_waits_out_a_hesitation(tmp_path):
+    rng = np.random.default_rng(2)
+    path = write_recording(tmp_path / "short.wav", [background(0.5, rng), voice(0.3, rng), background(3.0, rng)])
+
+    text, _, _, stats = recognize(path, "library")
+
+    assert text == "library"
+    assert stats["ended_by"]["silence"] == 1
+    # Under short_utterance_ms of speech, the longer hesitation allowance applies
+    assert stats["avg_utterance_ms"] == pytest.approx(300 + ENDPOINTING["hesitation_silence_ms"], abs=2 * FRAME_MS)
+
+def test_silence_times_out(tmp_path):
+    rng = np.random.default_rng(3)
+    path = write_recording(tmp_path / "silence.wav", [background(3.0, rng)])
+
+    with pytest.raises(NoSpeechError):
+        recognize(path, "unused")
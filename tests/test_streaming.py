@@ -0,0 +1,112 @@
+"""AIHandler.stream_response against a local server-sent events endpoint.
+
+The server sends Gemini-style "data:" events either chunked or delimited by
+closing the connection, which are the two ways Gemini's streaming endpoint
+may frame the body.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import ai_handler
+from gemini_client import GeminiClient
+
+def event(text):
+    payload = {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+    return f"data: {json.dumps(payload)}\r\n\r\n".encode()
+
+class SSEServer(ThreadingHTTPServer):
+    """Plays a script of writes: bytes to send, or an Event to wait on before going on"""
+
+    daemon_threads = True
+
+    def __init__(self, chunked, script):
+        super().__init__(("127.0.0.1", 0), SSEHandler)
+        self.chunked = chunked
+        self.script = script
+        self.finished = threading.Event()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/stream"
+
+class SSEHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        chunked = self.server.chunked
+        # HTTP/1.0 without a Content-Length: the body ends when the connection closes
+        self.protocol_version = "HTTP/1.1" if chunked else "HTTP/1.0"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        if chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for step in self.server.script:
+            if isinstance(step, threading.Event):
+                step.wait(5.0)
+                continue
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(step), step) if chunked else step)
+            self.wfile.flush()
+            time.sleep(0.05)  # Separate writes arrive as separate reads
+        if chunked:
+            self.wfile.write(b"0\r\n\r\n")
+        self.server.finished.set()
+
+    def log_message(self, format, *args):
+        pass
+
+class StubRAGHandler:
+    data_version = None
+
+    def generate_rag_prompt(self, query):
+        return ""
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def serve(monkeypatch):
+    monkeypatch.setattr(ai_handler, "RAGHandler", StubRAGHandler)
+    monkeypatch.setattr(ai_handler, "RESPONSE_CACHE_ENABLED", False)
+    monkeypatch.setattr(ai_handler, "FAST_ANSWERS_ENABLED", False)
+    servers = []
+    handlers = []
+
+    def start(chunked, script):
+        server = SSEServer(chunked, script)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        handler = ai_handler.AIHandler(client=GeminiClient(pool_size=1))
+        handler.stream_url = server.url
+        handlers.append(handler)
+        return server, handler
+
+    yield start
+    for handler in handlers:
+        handler.close()
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+@pytest.mark.parametrize("chunked", [True, False], ids=["chunked", "close-delimited"])
+def test_first_sentence_arrives_before_stream_ends(serve, chunked):
+    release = threading.Event()
+    server, handler = serve(chunked, [event("Hello there. "), release, event("The office opens at nine.")])
+
+    stream = handler.stream_response("When does the office open?")
+    try:
+        assert next(stream) == "Hello there. "
+        assert not server.finished.is_set()
+    finally:
+        release.set()
+    assert list(stream) == ["The office opens at nine."]
+
+@pytest.mark.parametrize("chunked", [True, False], ids=["chunked", "close-delimited"])
+def test_events_split_across_reads_are_reassembled(serve, chunked):
+    first, second = event("Admissions are open. "), event("Apply online.")
+    # Split mid-JSON and between the CR and LF of a line ending
+    script = [first[:9], first[9:40], first[40:-3], first[-3:], second[:-1], second[-1:]]
+    server, handler = serve(chunked, script)
+
+    assert list(handler.stream_response("How do I apply?")) == ["Admissions are open. ", "Apply online."]
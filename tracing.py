@@ -0,0 +1,288 @@
+"""Per-stage latency tracing for conversation turns.
+
+Code wraps a stage in tracer.span("name") (or records one after the fact
+with tracer.record()); each span carries the turn ID of the thread that
+produced it. Finished spans feed latency histograms (p50/p95/p99) and are
+appended to a rotating JSONL file, and the histograms and counters are
+served in Prometheus text format at http://METRICS_HOST:METRICS_PORT/metrics.
+
+With TRACING_ENABLED=false every call returns immediately and span() hands
+back a shared no-op object, so instrumented code costs next to nothing.
+"""
+import bisect
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import (
+    TRACING_ENABLED, TRACE_PATH, TRACE_MAX_MB, TRACE_BACKUPS, METRICS_HOST, METRICS_PORT, KIOSK_ID
+)
+
+# Histogram bucket upper bounds in milliseconds
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+class LatencyHistogram:
+    """Fixed-bucket histogram of durations in seconds, with interpolated percentiles"""
+
+    def __init__(self, bounds_ms=BUCKETS_MS):
+        self.bounds = [bound / 1000 for bound in bounds_ms]
+        self.counts = [0] * (len(self.bounds) + 1)  # The last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction):
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count and cumulative + bucket_count >= rank:
+                # Observed extremes narrow the first and last buckets
+                lower = max(self.bounds[index - 1] if index > 0 else 0.0, self.min)
+                upper = min(self.bounds[index] if index < len(self.bounds) else self.max, self.max)
+                return lower + (upper - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.max
+
+class Span:
+    """A timed stage; finished and recorded when the with-block exits"""
+
+    __slots__ = ("tracer", "name", "turn_id", "attrs", "start")
+
+    def __init__(self, tracer, name, turn_id, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.turn_id = turn_id
+        self.attrs = attrs
+        self.start = time.perf_counter()
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is GeneratorExit:
+            # A consumer stopped reading a stream early (barge-in, cancelled turn)
+            self.attrs["closed"] = True
+        elif exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.tracer.record(self.name, self.start, time.perf_counter(), self.turn_id, **self.attrs)
+        return False
+
+class _NoopSpan:
+    def set(self, **attrs):
+        pass
+
+    def elapsed(self):
+        return 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+NOOP_SPAN = _NoopSpan()
+
+class Tracer:
+    def __init__(self, enabled=TRACING_ENABLED, path=TRACE_PATH, max_bytes=int(TRACE_MAX_MB * 1024 * 1024),
+                 backups=TRACE_BACKUPS, metrics_host=METRICS_HOST, metrics_port=METRICS_PORT, kiosk_id=KIOSK_ID):
+        self.enabled = enabled
+        self.kiosk_id = kiosk_id
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._logger = None
+        self._listener = None
+        self._server = None
+        if not enabled:
+            return
+        if path:
+            self._open_log(path, max_bytes, backups)
+        if metrics_port:
+            self._start_metrics_server(metrics_host, metrics_port)
+
+    def _open_log(self, path, max_bytes, backups):
+        # Spans are handed to a listener thread, so callers never wait on file I/O
+        try:
+            handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups)
+        except OSError as e:
+            print(f"Trace file unavailable ({e}); keeping metrics only")
+            return
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        span_queue = queue.SimpleQueue()
+        self._listener = logging.handlers.QueueListener(span_queue, handler)
+        self._listener.start()
+        self._logger = logging.getLogger(f"assistant.trace.{id(self)}")
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        self._logger.addHandler(logging.handlers.QueueHandler(span_queue))
+
+    def _start_metrics_server(self, host, port):
+        tracer = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = tracer.render_metrics().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        except OSError as e:
+            print(f"Metrics endpoint unavailable on {host}:{port}: {e}")
+            return
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        print(f"Serving metrics on http://{host}:{self._server.server_address[1]}/metrics")
+
+    def set_turn(self, turn_id):
+        """Attribute spans from this thread to a turn (None to clear)"""
+        self._local.turn_id = turn_id
+
+    def current_turn(self):
+        return getattr(self._local, "turn_id", None)
+
+    def span(self, name, turn_id=None, **attrs):
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, turn_id if turn_id is not None else self.current_turn(), attrs)
+
+    def record(self, name, start, end, turn_id=None, **attrs):
+        """Record a finished span from perf_counter() timestamps"""
+        if not self.enabled:
+            return
+        duration = end - start
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = LatencyHistogram()
+            histogram.observe(duration)
+        if self._logger:
+            entry = {
+                "ts": round(time.time() - (time.perf_counter() - start), 6),
+                "kiosk": self.kiosk_id,
+                "turn": turn_id if turn_id is not None else self.current_turn(),
+                "span": name,
+                "start": round(start, 6),
+                "duration_ms": round(duration * 1000, 3)
+            }
+            entry.update(attrs)
+            self._logger.info(json.dumps(entry, default=str))
+
+    def observe(self, name, seconds):
+        """Add to a histogram without writing a span (for per-frame timings)"""
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = LatencyHistogram()
+            histogram.observe(seconds)
+
+    def count(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                name: {
+                    "count": histogram.count,
+                    "p50_ms": round(histogram.percentile(0.50) * 1000, 1),
+                    "p95_ms": round(histogram.percentile(0.95) * 1000, 1),
+                    "p99_ms": round(histogram.percentile(0.99) * 1000, 1),
+                    "max_ms": round(histogram.max * 1000, 1)
+                }
+                for name, histogram in sorted(self._histograms.items())
+            }
+
+    def render_metrics(self):
+        """Histograms and counters in the Prometheus text exposition format"""
+        lines = [
+            "# HELP assistant_stage_latency_seconds Latency of each conversation stage",
+            "# TYPE assistant_stage_latency_seconds histogram"
+        ]
+        quantiles = [
+            "# HELP assistant_stage_latency_quantile_seconds Estimated latency percentiles per stage",
+            "# TYPE assistant_stage_latency_quantile_seconds gauge"
+        ]
+        with self._lock:
+            for name, histogram in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.bounds + ["+Inf"], histogram.counts):
+                    cumulative += bucket_count
+                    le = bound if bound == "+Inf" else repr(bound)
+                    lines.append(f'assistant_stage_latency_seconds_bucket{{stage="{name}",le="{le}"}} {cumulative}')
+                lines.append(f'assistant_stage_latency_seconds_sum{{stage="{name}"}} {histogram.sum:.6f}')
+                lines.append(f'assistant_stage_latency_seconds_count{{stage="{name}"}} {histogram.count}')
+                for fraction in (0.5, 0.95, 0.99):
+                    quantiles.append(
+                        f'assistant_stage_latency_quantile_seconds{{stage="{name}",quantile="{fraction}"}} '
+                        f'{histogram.percentile(fraction):.6f}'
+                    )
+            counters = sorted(self._counters.items())
+        lines.extend(quantiles)
+        declared = set()
+        for (name, labels), value in counters:
+            metric = f"assistant_{name}_total"
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            label_text = ",".join(f'{key}="{value_}"' for key, value_ in labels)
+            lines.append(f"{metric}{{{label_text}}} {value}" if label_text else f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+    def close(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._listener:
+            # Flushes spans still queued
+            self._listener.stop()
+            self._listener = None
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+def get_tracer():
+    """The process-wide tracer, configured from config.py on first use"""
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                _tracer = Tracer()
+    return _tracer
@@ -0,0 +1,128 @@
+import hashlib
+import os
+import threading
+import wave
+from collections import OrderedDict
+from config import TTS_CACHE_DIR, TTS_CACHE_MAX_MB
+
+class TTSCache:
+    """Size-bounded LRU cache of rendered utterances stored as WAV files.
+
+    Files are named by a hash of (text, voice id, rate, volume), so a change of
+    voice settings never plays stale audio. Recency survives restarts through
+    the files' modification times.
+    """
+
+    def __init__(self, cache_dir=TTS_CACHE_DIR, max_bytes=int(TTS_CACHE_MAX_MB * 1024 * 1024)):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        # key -> file size, least recently used first
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self.load()
+
+    @staticmethod
+    def make_key(text, voice, rate, volume):
+        raw = "\x1f".join([text.strip(), str(voice), str(rate), f"{float(volume):.3f}"])
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, f"{key}.wav")
+
+    def temp_path(self, key):
+        """Where to render a new entry before it is added with put()"""
+        return os.path.join(self.cache_dir, f"{key}.tmp.wav")
+
+    def load(self):
+        """Index the WAV files already on disk, oldest use first"""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            files = []
+            for name in os.listdir(self.cache_dir):
+                path = os.path.join(self.cache_dir, name)
+                if name.endswith(".tmp.wav"):
+                    # Left over from an interrupted render
+                    os.remove(path)
+                elif name.endswith(".wav"):
+                    stat = os.stat(path)
+                    files.append((stat.st_mtime, name[:-4], stat.st_size))
+        except Exception as e:
+            print(f"Error loading TTS cache: {e}")
+            return
+        with self._lock:
+            for _, key, size in sorted(files):
+                self.entries[key] = size
+                self.total_bytes += size
+            self._evict()
+
+    def contains(self, key):
+        with self._lock:
+            return key in self.entries
+
+    def get(self, key):
+        """Path of the cached WAV for key, or None"""
+        with self._lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            path = self.path_for(key)
+            if not os.path.exists(path):
+                self.total_bytes -= self.entries.pop(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def put(self, key, rendered_path):
+        """Move a freshly rendered file into the cache; returns False if it isn't usable WAV"""
+        try:
+            with wave.open(rendered_path, 'rb') as wav:
+                if wav.getnframes() == 0:
+                    raise ValueError("no audio rendered")
+            size = os.path.getsize(rendered_path)
+            os.replace(rendered_path, self.path_for(key))
+        except Exception as e:
+            print(f"Not caching rendered speech: {e}")
+            try:
+                os.remove(rendered_path)
+            except OSError:
+                pass
+            return False
+        with self._lock:
+            if key in self.entries:
+                self.total_bytes -= self.entries.pop(key)
+            self.entries[key] = size
+            self.total_bytes += size
+            self._evict()
+        return True
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self.entries:
+            key, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self.path_for(key))
+            except OSError:
+                pass
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "megabytes": round(self.total_bytes / (1024 * 1024), 2),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import re
+import zlib
+import numpy as np
+from bm25_index import STOP_WORDS
+
+class HashedNgramEmbedder:
+    """TF-IDF over hashed character n-grams; works offline with no model download"""
+    # Bump when the feature extraction changes so persisted indexes are rebuilt
+    VERSION = 1
+
+    def __init__(self, dim=1024, ngram_range=(3, 5)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self.idf = np.ones(dim, dtype=np.float32)
+
+    def _buckets(self, text):
+        """Hash bucket of every character n-gram in the text"""
+        # Pad words with spaces so prefixes and suffixes get their own grams
+        words = [word for word in re.findall(r"[a-z0-9]+", text.lower()) if word not in STOP_WORDS]
+        text = " " + " ".join(words) + " "
+        low, high = self.ngram_range
+        buckets = [
+            zlib.crc32(text[i:i + n].encode()) % self.dim
+            for n in range(low, high + 1)
+            for i in range(len(text) - n + 1)
+        ]
+        return np.asarray(buckets, dtype=np.int64)
+
+    def _term_frequencies(self, text):
+        counts = np.bincount(self._buckets(text), minlength=self.dim).astype(np.float32)
+        # Sublinear tf damps long chunks that repeat the same words
+        np.log1p(counts, out=counts)
+        return counts
+
+    def fit(self, texts):
+        """Compute IDF weights from a corpus and return its embedding matrix"""
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            matrix[row] = self._term_frequencies(text)
+        doc_freq = np.count_nonzero(matrix, axis=0).astype(np.float32)
+        self.idf = (np.log((1 + len(texts)) / (1 + doc_freq)) + 1).astype(np.float32)
+        matrix *= self.idf
+        return self._normalize_rows(matrix)
+
+    def embed(self, text):
+        vector = self._term_frequencies(text) * self.idf
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    @staticmethod
+    def _normalize_rows(matrix):
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        matrix /= norms
+        return matrix
+
+class DenseVectorIndex:
+    """Chunk embeddings in one contiguous float32 matrix, persisted as .npy and memory-mapped"""
+
+    def __init__(self, index_dir, embedder=None):
+        self.index_dir = index_dir
+        self.embedder = embedder or HashedNgramEmbedder()
+        self.matrix = None
+        self.matrix_path = os.path.join(index_dir, "vectors.npy")
+        self.idf_path = os.path.join(index_dir, "idf.npy")
+        self.meta_path = os.path.join(index_dir, "meta.json")
+
+    def fingerprint(self, texts):
+        """Identify a corpus (and embedding settings) so unchanged data is never re-embedded"""
+        digest = hashlib.sha1(
+            f"{self.embedder.VERSION}:{self.embedder.dim}:{self.embedder.ngram_range}".encode()
+        )
+        for text in texts:
+            digest.update(text.encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def ensure(self, texts):
+        """Load the persisted index for these texts, or build and persist a new one"""
+        fingerprint = self.fingerprint(texts)
+        if self.load(fingerprint):
+            return
+        print(f"Embedding {len(texts)} chunks for semantic retrieval...")
+        self.build(texts, fingerprint)
+
+    def load(self, fingerprint):
+        try:
+            with open(self.meta_path, 'r') as f:
+                meta = json.load(f)
+            if meta.get("fingerprint") != fingerprint:
+                return False
+            self.embedder.idf = np.load(self.idf_path)
+            self.matrix = np.load(self.matrix_path, mmap_mode='r')
+            print(f"Loaded semantic index ({self.matrix.shape[0]} vectors)")
+            return True
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            print(f"Error loading semantic index: {e}")
+            return False
+
+    def build(self, texts, fingerprint):
+        matrix = self.embedder.fit(texts)
+        self.matrix = matrix
+        try:
+            os.makedirs(self.index_dir, exist_ok=True)
+            # Write to temp files and swap in, so a crash never leaves a torn index
+            self._atomic_save(self.matrix_path, matrix)
+            self._atomic_save(self.idf_path, self.embedder.idf)
+            tmp_meta = f"{self.meta_path}.tmp"
+            with open(tmp_meta, 'w') as f:
+                json.dump({"fingerprint": fingerprint, "count": len(texts), "dim": self.embedder.dim}, f)
+            os.replace(tmp_meta, self.meta_path)
+            self.matrix = np.load(self.matrix_path, mmap_mode='r')
+        except Exception as e:
+            print(f"Error saving semantic index: {e}")
+
+    @staticmethod
+    def _atomic_save(path, array):
+        tmp_path = f"{path}.tmp.npy"
+        np.save(tmp_path, array)
+        os.replace(tmp_path, path)
+
+    def search(self, query, top_k=5, min_score=0.0):
+        """Return [(row, score), ...] best first using one matrix-vector product"""
+        if self.matrix is None or self.matrix.shape[0] == 0:
+            return []
+        scores = self.matrix @ self.embedder.embed(query)
+        k = min(top_k, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(row), float(scores[row])) for row in top if scores[row] > min_score]
@@ -1,21 +1,30 @@
-import pvporcupine
-import struct
-import pyaudio
 import time
 import os
+import json
 import platform
 import subprocess
+from ctypes import POINTER, byref, c_int, c_short
+from audio_capture import AudioCapture, FileAudioSource, RingAudioSource, acquire_pyaudio, release_pyaudio
+from audio_gate import EnergyGate
+from tracing import get_tracer
 from config import (
     PVPORCUPINE_ACCESS_KEY, WAKE_WORD, CUSTOM_KEYWORD_PATH, 
     FALLBACK_WAKE_WORDS, IS_UBUNTU, IS_ARM64, ARM64_MODEL_PATH,
-    USE_SYSTEM_LIBRARIES, AUDIO_DEVICE_INDEX, USE_API_ONLY_MODE
+    USE_SYSTEM_LIBRARIES, AUDIO_DEVICE_INDEX, USE_API_ONLY_MODE, AUDIO_BUFFER_SECONDS,
+    COMMAND_PRE_ROLL_SECONDS, VAD_GATE_ENABLED, VAD_GATE_LOOKBACK_FRAMES, WAKE_INIT_CACHE_PATH,
+    AUDIO_INPUT_FILE
 )
 
+def _pvporcupine():
+    # Imported on first use, so injected engines and audio sources run without the audio stack
+    import pvporcupine
+    return pvporcupine
+
 class WakeWordDetector:
     @staticmethod
     def list_wake_words():
         try:
-            keywords = pvporcupine.KEYWORDS
+            keywords = _pvporcupine().KEYWORDS
             print("\nAvailable wake words:")
             print("---------------------")
             for i, keyword in enumerate(keywords, 1):
@@ -32,7 +41,7 @@ class WakeWordDetector:
         try:
             # Try with 'porcupine' - available on all platforms
             test_keyword = "porcupine"
-            test_porcupine = pvporcupine.create(
+            test_porcupine = _pvporcupine().create(
                 access_key=PVPORCUPINE_ACCESS_KEY,
                 keywords=[test_keyword]
             )
@@ -58,7 +67,11 @@ class WakeWordDetector:
         """List available audio devices"""
         print("\nChecking audio devices...")
         try:
-            p = pyaudio.PyAudio()
+            p = acquire_pyaudio()
+        except Exception as e:
+            print(f"Error checking audio devices: {e}")
+            return
+        try:
             info = p.get_host_api_info_by_index(0)
             num_devices = info.get('deviceCount')
             
@@ -66,256 +79,361 @@ class WakeWordDetector:
                 if p.get_device_info_by_host_api_device_index(0, i).get('maxInputChannels') > 0:
                     name = p.get_device_info_by_host_api_device_index(0, i).get('name')
                     print(f"Input Device id {i} - {name}")
-            p.terminate()
         except Exception as e:
             print(f"Error checking audio devices: {e}")
+        finally:
+            release_pyaudio()
+
+    def __init__(self, retry_count=3, init_cache_path=WAKE_INIT_CACHE_PATH,
+                 engine=None, keywords=None, audio_source=None):
+        """Create the keyword engine and start reading audio.
 
-    def __init__(self, retry_count=3):
+        engine (with its keywords) and audio_source can be injected to run the
+        detector without Porcupine or a microphone, e.g. to replay recordings
+        through a stub engine. audio_source is an unstarted FrameSource.
+        """
         self.porcupine = None
-        self.pa = None
-        self.audio_stream = None
+        self.capture = None
+        self.gate = None
+        self._last_processed_seq = -1
+        self.detected_seq = None
         self.active_wake_word = None
+        self.keyword_names = []
+        self.last_keyword = None
+        self.init_cache_path = init_cache_path
+        self._keyword_result = c_int()
+        self._pcm_pointer_type = POINTER(c_short)
+        self._native_process = None  # (process function, engine handle, success status) of the engine
+        self._access_key = (PVPORCUPINE_ACCESS_KEY or "").strip()
+        self._audio_source = audio_source
+        self.tracer = get_tracer()
+        
+        if engine is not None:
+            self._bind_engine(engine)
+            self.keyword_names = list(keywords or ["keyword"])
+            self.active_wake_word = self.keyword_names[0]
+            self._setup_audio_stream(audio_source=audio_source)
+            return
+        
+        # Fast path: reuse the configuration that worked on the last boot
+        cached_plan = self._load_cached_plan()
+        if cached_plan:
+            print("\nUsing cached wake word configuration")
+            if self._try_plan(cached_plan):
+                return
+            print("Cached configuration no longer works, probing again...")
         
         # List audio devices for debugging
         self.get_audio_devices()
         
-        # Handle API-only mode first if enabled
         if USE_API_ONLY_MODE:
             print("\n*** Using Porcupine in API-only mode ***")
-            success = self._initialize_with_api_mode()
-            if success:
-                return
-            else:
-                raise ValueError("API-only mode initialization failed. Check your network and access key.")
-        
-        # Special handling for ARM64
-        if IS_ARM64:
+        elif IS_ARM64:
             print("\n*** Running on ARM64 Ubuntu - using specialized configuration ***")
-            if self._initialize_for_arm64():
-                return
-            
-            # If ARM64 special initialization failed, suggest API mode
-            print("\nWake word detection failed on ARM64. Please review UBUNTU_ARM64_SETUP.md")
-            print("This is a known issue on some ARM64 systems.")
-            print("Consider using API-only mode by setting USE_API_ONLY_MODE=true in your .env file.")
-            raise ValueError("ARM64 wake word detection failed")
-        
-        # Test basic Porcupine functionality first
-        self.test_porcupine_installation()
-        
-        # Get available keywords
-        available_keywords = self.list_wake_words()
         
-        # Try with primary wake word
-        if WAKE_WORD in available_keywords:
-            success = self._initialize_with_keyword([WAKE_WORD])
-            if success:
-                self.active_wake_word = WAKE_WORD
+        plans = self._candidate_plans()
+        for plan in plans:
+            if self._try_plan(plan):
                 return
         
-        # Try with custom keyword path if available
-        if CUSTOM_KEYWORD_PATH and os.path.exists(CUSTOM_KEYWORD_PATH):
-            print(f"\nTrying with custom keyword file at: {CUSTOM_KEYWORD_PATH}")
-            success = self._initialize_with_keyword_file(CUSTOM_KEYWORD_PATH)
-            if success:
-                self.active_wake_word = "custom_keyword"
-                return
-        
-        # Try fallback wake words
-        print("\nTrying fallback wake words...")
-        for fallback_word in FALLBACK_WAKE_WORDS:
-            if fallback_word in available_keywords:
-                print(f"Trying fallback wake word: {fallback_word}")
-                success = self._initialize_with_keyword([fallback_word])
-                if success:
-                    self.active_wake_word = fallback_word
-                    print(f"\n*** Using fallback wake word: '{fallback_word}' ***")
-                    print(f"*** Please say '{fallback_word}' instead of '{WAKE_WORD}' ***")
-                    return
-        
-        # If primary wake word is available but failed, retry with delay
-        if WAKE_WORD in available_keywords:
+        # The primary plan may fail transiently (e.g. network in API mode); retry it with delay
+        if plans:
             for attempt in range(retry_count):
-                print(f"\nRetrying initialization with '{WAKE_WORD}' (attempt {attempt+1}/{retry_count})...")
+                print(f"\nRetrying initialization (attempt {attempt+1}/{retry_count})...")
                 time.sleep(1)  # Add delay between attempts
-                success = self._initialize_with_keyword([WAKE_WORD])
-                if success:
-                    self.active_wake_word = WAKE_WORD
+                if self._try_plan(plans[0]):
                     return
         
-        # If everything fails, try one more time with sanitized access key
-        print("\nTrying with sanitized access key...")
-        sanitized_key = PVPORCUPINE_ACCESS_KEY.strip()
-        if self._initialize_with_sanitized_key("porcupine", sanitized_key):
-            self.active_wake_word = "porcupine"
-            print(f"\n*** Using fallback wake word: 'porcupine' ***")
-            print(f"*** Please say 'porcupine' instead of '{WAKE_WORD}' ***")
-            return
-            
         # If we get here, all initialization attempts failed
+        self.test_porcupine_installation()
+        if USE_API_ONLY_MODE:
+            raise ValueError("API-only mode initialization failed. Check your network and access key.")
+        if IS_ARM64:
+            print("\nWake word detection failed on ARM64. Please review UBUNTU_ARM64_SETUP.md")
+            print("This is a known issue on some ARM64 systems.")
+            print("Consider using API-only mode by setting USE_API_ONLY_MODE=true in your .env file.")
+            raise ValueError("ARM64 wake word detection failed")
         print(f"\nFailed to initialize wake word detector after multiple attempts.")
         print("Please ensure your access key is valid and the wake word is supported.")
         raise ValueError(f"Could not initialize wake word detector with any wake word")
     
-    def _initialize_for_arm64(self):
-        """Special initialization for ARM64 architecture"""
+    @staticmethod
+    def _wanted_keywords():
+        """Primary wake word followed by the fallbacks that this Porcupine build ships"""
         try:
-            # First try with system libraries if enabled
-            if USE_SYSTEM_LIBRARIES:
-                print("Trying with system libraries...")
-                # Try each fallback keyword
-                for keyword in FALLBACK_WAKE_WORDS:
-                    try:
-                        print(f"Trying ARM64 system initialization with '{keyword}'")
-                        self.porcupine = pvporcupine.create(
-                            access_key=PVPORCUPINE_ACCESS_KEY,
-                            keywords=[keyword],
-                            library_path="/usr/local/lib/libpv_porcupine.so"
-                        )
-                        self._setup_audio_stream()
-                        self.active_wake_word = keyword
-                        print(f"\n*** ARM64: Using wake word '{keyword}' with system library ***")
-                        return True
-                    except Exception as e:
-                        print(f"ARM64 system library attempt with {keyword} failed: {e}")
-            
-            # Try with custom model path if provided
+            available = set(_pvporcupine().KEYWORDS)
+        except Exception:
+            available = None
+        keywords = []
+        for keyword in [WAKE_WORD] + list(FALLBACK_WAKE_WORDS):
+            if keyword not in keywords and (available is None or keyword in available):
+                keywords.append(keyword)
+        return keywords
+    
+    def _candidate_plans(self):
+        """Engine configurations to try, best first. Each loads every acceptable keyword at once."""
+        keywords = self._wanted_keywords()
+        plans = []
+        if IS_ARM64 and not USE_API_ONLY_MODE:
+            if USE_SYSTEM_LIBRARIES and keywords:
+                plans.append({"keywords": keywords, "library_path": "/usr/local/lib/libpv_porcupine.so"})
             if ARM64_MODEL_PATH and os.path.exists(ARM64_MODEL_PATH):
-                print(f"Trying with ARM64 custom model at: {ARM64_MODEL_PATH}")
-                self.porcupine = pvporcupine.create(
-                    access_key=PVPORCUPINE_ACCESS_KEY,
-                    keyword_paths=[ARM64_MODEL_PATH]
-                )
-                self._setup_audio_stream()
-                self.active_wake_word = "custom_arm64"
-                print("\n*** Using custom ARM64 model ***")
-                return True
-                
-            return False
-        except Exception as e:
-            print(f"ARM64 initialization error: {e}")
-            return False
+                plans.append({"keywords": ["custom_arm64"], "keyword_paths": [ARM64_MODEL_PATH]})
+            return plans
+        
+        if CUSTOM_KEYWORD_PATH and os.path.exists(CUSTOM_KEYWORD_PATH) and not USE_API_ONLY_MODE:
+            # Custom model plus the built-ins, all loaded as keyword files
+            try:
+                builtin_paths = [_pvporcupine().KEYWORD_PATHS[keyword] for keyword in keywords]
+                plans.append({
+                    "keywords": ["custom_keyword"] + keywords,
+                    "keyword_paths": [CUSTOM_KEYWORD_PATH] + builtin_paths
+                })
+            except Exception as e:
+                print(f"Built-in keyword files unavailable: {e}")
+            plans.append({"keywords": ["custom_keyword"], "keyword_paths": [CUSTOM_KEYWORD_PATH]})
+        if keywords:
+            plans.append({"keywords": keywords})
+        return plans
     
-    def _initialize_with_keyword(self, keywords):
-        try:
-            print(f"\nInitializing wake word detector with '{keywords[0]}'")
-            self.porcupine = pvporcupine.create(
-                access_key=PVPORCUPINE_ACCESS_KEY,
-                keywords=keywords
-            )
-            self._setup_audio_stream()
-            return True
-        except Exception as e:
-            print(f"Error initializing with keyword: {e}")
-            return False
+    def _create_engine(self, plan):
+        kwargs = {"access_key": self._access_key}
+        if plan.get("keyword_paths"):
+            kwargs["keyword_paths"] = plan["keyword_paths"]
+        else:
+            kwargs["keywords"] = plan["keywords"]
+        if plan.get("library_path"):
+            kwargs["library_path"] = plan["library_path"]
+        if plan.get("model_path"):
+            kwargs["model_path"] = plan["model_path"]
+        return _pvporcupine().create(**kwargs)
     
-    def _initialize_with_sanitized_key(self, keyword, access_key):
+    def _try_plan(self, plan):
+        """Create one engine for the plan and open audio; returns True on success"""
+        names = ", ".join(f"'{name}'" for name in plan["keywords"])
+        print(f"\nInitializing wake word detector with {names}")
         try:
-            print(f"\nInitializing with sanitized key and '{keyword}'")
-            self.porcupine = pvporcupine.create(
-                access_key=access_key,
-                keywords=[keyword]
-            )
-            self._setup_audio_stream()
-            return True
+            porcupine = self._create_engine(plan)
         except Exception as e:
-            print(f"Error with sanitized key: {e}")
+            print(f"Error initializing wake word engine: {e}")
             return False
-            
-    def _initialize_with_keyword_file(self, keyword_path):
+        
+        if self.porcupine:
+            self.porcupine.delete()
+        self._bind_engine(porcupine)
+        self.keyword_names = list(plan["keywords"])
+        self.active_wake_word = self.keyword_names[0]
         try:
-            print(f"\nInitializing wake word detector with custom keyword file")
-            self.porcupine = pvporcupine.create(
-                access_key=PVPORCUPINE_ACCESS_KEY,
-                keyword_paths=[keyword_path]
-            )
-            self._setup_audio_stream()
-            return True
+            # Audio is opened once, only after an engine exists
+            if not self.capture:
+                self._setup_audio_stream(plan.get("device_index", AUDIO_DEVICE_INDEX), self._audio_source)
         except Exception as e:
-            print(f"Error initializing with keyword file: {e}")
+            print(f"Error opening audio input: {e}")
             return False
+        
+        if self.active_wake_word != WAKE_WORD:
+            print(f"\n*** Using wake word '{self.active_wake_word}' (also listening for: {names}) ***")
+        if isinstance(self.capture, AudioCapture):
+            # Only microphone setups are worth remembering
+            self._save_plan(plan)
+        return True
     
-    def _initialize_with_api_mode(self):
-        """Initialize using cloud-based API processing"""
+    def _plan_signature(self):
+        """Settings the cached plan depends on; a change invalidates the cache"""
+        return {
+            "wake_word": WAKE_WORD,
+            "fallbacks": list(FALLBACK_WAKE_WORDS),
+            "custom_keyword_path": CUSTOM_KEYWORD_PATH,
+            "arm64_model_path": ARM64_MODEL_PATH,
+            "api_only": USE_API_ONLY_MODE,
+            "system_libraries": USE_SYSTEM_LIBRARIES,
+            "device_index": AUDIO_DEVICE_INDEX
+        }
+    
+    def _load_cached_plan(self):
+        if not self.init_cache_path:
+            return None
         try:
-            # Try to initialize with API mode with primary wake word
-            print(f"\nInitializing API mode with '{WAKE_WORD}'")
-            self.porcupine = pvporcupine.create(
-                access_key=PVPORCUPINE_ACCESS_KEY,
-                keywords=[WAKE_WORD]
-            )
-            self._setup_audio_stream()
-            self.active_wake_word = WAKE_WORD
-            print("✓ API-mode initialization successful!")
-            return True
+            with open(self.init_cache_path, 'r') as f:
+                cached = json.load(f)
+            if cached.get("signature") == self._plan_signature():
+                return cached.get("plan")
+        except FileNotFoundError:
+            pass
         except Exception as e:
-            print(f"✗ API-mode initialization failed: {e}")
-            
-            # Try fallback wake words with API mode
-            for fallback_word in FALLBACK_WAKE_WORDS:
-                if fallback_word != WAKE_WORD:  # Skip if it's the one we already tried
-                    try:
-                        print(f"\nTrying API mode with fallback wake word '{fallback_word}'")
-                        self.porcupine = pvporcupine.create(
-                            access_key=PVPORCUPINE_ACCESS_KEY,
-                            keywords=[fallback_word]
-                        )
-                        self._setup_audio_stream()
-                        self.active_wake_word = fallback_word
-                        print(f"✓ API mode initialized with '{fallback_word}'")
-                        return True
-                    except Exception as e2:
-                        print(f"✗ API mode with '{fallback_word}' failed: {e2}")
-            
-            return False
-            
-    def _setup_audio_stream(self):
+            print(f"Ignoring unreadable wake word cache: {e}")
+        return None
+    
+    def _save_plan(self, plan):
+        if not self.init_cache_path:
+            return
+        plan = dict(plan)
+        plan["device_index"] = self.capture.device_index
         try:
-            self.pa = pyaudio.PyAudio()
-            self.audio_stream = self.pa.open(
-                rate=self.porcupine.sample_rate,
-                channels=1,
-                format=pyaudio.paInt16,
-                input=True,
-                input_device_index=AUDIO_DEVICE_INDEX,
-                frames_per_buffer=self.porcupine.frame_length
+            with open(self.init_cache_path, 'w') as f:
+                json.dump({"signature": self._plan_signature(), "plan": plan}, f, indent=2)
+        except Exception as e:
+            print(f"Could not save wake word configuration: {e}")
+    
+    def _setup_audio_stream(self, device_index=AUDIO_DEVICE_INDEX, audio_source=None):
+        # Capture runs on PortAudio's callback thread into a preallocated ring
+        # buffer, so frames keep arriving while the main thread is busy.
+        # Any other FrameSource (e.g. a recording) can stand in for the microphone.
+        if self.capture:
+            self.capture.stop()
+        if audio_source is None and AUDIO_INPUT_FILE:
+            print(f"Reading audio from {AUDIO_INPUT_FILE} instead of the microphone")
+            audio_source = FileAudioSource(
+                AUDIO_INPUT_FILE,
+                self.porcupine.sample_rate,
+                self.porcupine.frame_length,
+                speed=1.0,
+                buffer_seconds=AUDIO_BUFFER_SECONDS
+            )
+        elif audio_source is None:
+            audio_source = AudioCapture(
+                self.porcupine.sample_rate,
+                self.porcupine.frame_length,
+                device_index=device_index,
+                buffer_seconds=AUDIO_BUFFER_SECONDS
+            )
+        elif (audio_source.sample_rate, audio_source.frame_length) != (self.porcupine.sample_rate, self.porcupine.frame_length):
+            raise ValueError(
+                f"Audio source delivers {audio_source.frame_length}-sample frames at {audio_source.sample_rate} Hz, "
+                f"engine needs {self.porcupine.frame_length} at {self.porcupine.sample_rate} Hz"
             )
+        self.capture = audio_source
+        self._last_processed_seq = -1
+        self.detected_seq = None
+        try:
+            self.capture.start()
         except Exception as e:
-            print(f"Error setting up audio stream: {e}")
-            # Try again without specifying device index
-            try:
-                print("Retrying with default audio device...")
-                self.audio_stream = self.pa.open(
-                    rate=self.porcupine.sample_rate,
-                    channels=1,
-                    format=pyaudio.paInt16,
-                    input=True,
-                    frames_per_buffer=self.porcupine.frame_length
-                )
-            except Exception as e2:
-                print(f"Failed to set up audio stream with default device: {e2}")
-                raise
+            print(f"Failed to set up audio stream with default device: {e}")
+            raise
+        self.gate = EnergyGate(self.porcupine.frame_length) if VAD_GATE_ENABLED else None
+    
+    def use_audio_source(self, audio_source):
+        """Switch to another unstarted FrameSource, e.g. the next recording in a replay run"""
+        self._audio_source = audio_source
+        self._setup_audio_stream(audio_source=audio_source)
+    
+    def audio_exhausted(self):
+        """True when a finite source (a recording) has been read to the end"""
+        return self.capture.exhausted()
+
+    def _process_frame(self, frame):
+        """Run Porcupine on an int16 frame without converting it to Python ints.
+
+        pvporcupine's process() copies every sample into a new ctypes array;
+        when its native handle is available the frame's buffer is passed directly.
+        """
+        if self._native_process is None:
+            return self.porcupine.process(frame)
+        process_func, handle, success = self._native_process
+        status = process_func(handle, frame.ctypes.data_as(self._pcm_pointer_type), byref(self._keyword_result))
+        if status != success:
+            raise _pvporcupine().PorcupineError(f"Porcupine failed to process a frame (status {status})")
+        return self._keyword_result.value
+
+    def _bind_engine(self, engine):
+        """Use engine from now on, looking up its native process function once"""
+        self.porcupine = engine
+        # pvporcupine 2.x keeps the C entry point and engine handle as process_func and _handle
+        process_func = getattr(engine, "process_func", None)
+        handle = getattr(engine, "_handle", None)
+        statuses = getattr(engine, "PicovoiceStatuses", None)
+        if process_func is not None and handle is not None and statuses is not None:
+            self._native_process = (process_func, handle, statuses.SUCCESS)
+            print("Wake word engine: passing audio frames to the native library directly")
+        else:
+            self._native_process = None
+            print("Wake word engine: using Porcupine.process() (frames are copied)")
 
     def listen(self):
+        """Wait for the next audio frame; returns the name of the keyword heard, or None"""
         try:
-            pcm = self.audio_stream.read(self.porcupine.frame_length, exception_on_overflow=False)
-            pcm = struct.unpack_from("h" * self.porcupine.frame_length, pcm)
-            keyword_index = self.porcupine.process(pcm)
+            frame, captured_at = self.capture.read_frame_timed(timeout=0.5)
+            if frame is None:
+                return None
+            seq = self.capture.ring.read_seq - 1
+            
+            keyword_index = -1
+            if self.gate:
+                was_open = self.gate.is_open()
+                if not self.gate.process(frame):
+                    # Silence: skip keyword inference entirely
+                    self.capture.record_latency(captured_at)
+                    return None
+                if not was_open:
+                    # Speech onset: let the engine hear the skipped frames leading up to it
+                    keyword_index = self._process_lookback(seq)
             
-            # Only return True if specifically our wake word is detected
-            return keyword_index == 0
+            if keyword_index < 0:
+                keyword_index = self._process_frame(frame)
+                self._last_processed_seq = seq
+            self.capture.record_latency(captured_at)
+            self.tracer.observe("wake_frame", time.perf_counter() - captured_at)
+            
+            # Any of the loaded keywords counts; report which one fired
+            if keyword_index >= 0:
+                # Capture of the frame that completed the keyword to its detection
+                self.tracer.record("wake_detect", captured_at, time.perf_counter(),
+                                   keyword=self.keyword_names[keyword_index])
+                self.detected_seq = self.capture.ring.read_seq
+                self.last_keyword = self.keyword_names[keyword_index]
+                return self.last_keyword
+            return None
         except Exception as e:
             print(f"Error in wake word detection: {e}")
-            return False
+            return None
+    
+    def _process_lookback(self, seq):
+        """Run the engine over up to VAD_GATE_LOOKBACK_FRAMES gated frames before seq"""
+        ring = self.capture.ring
+        start = max(seq - VAD_GATE_LOOKBACK_FRAMES, self._last_processed_seq + 1, ring.write_seq - ring.capacity + 1)
+        for lookback_seq in range(start, seq):
+            frame, _ = ring.read_at(lookback_seq, 0)
+            if frame is None:
+                break
+            self._last_processed_seq = lookback_seq
+            keyword_index = self._process_frame(frame)
+            if keyword_index >= 0:
+                return keyword_index
+        return -1
+    
+    def get_gate_stats(self):
+        return self.gate.get_stats() if self.gate else None
+
+    def get_noise_floor(self):
+        """Background RMS level tracked by the gate, or None without a gate"""
+        return self.gate.noise_floor if self.gate else None
+    
+    def command_source(self, pre_roll_seconds=COMMAND_PRE_ROLL_SECONDS, consume=True, cancelled=None):
+        """Audio source for the command that follows the last wake word.
+
+        Starts pre_roll_seconds before the wake word was detected and continues
+        with live audio from the same open stream. Pass consume=False to keep
+        calling listen() on another thread while the command is recognized.
+        """
+        ring = self.capture.ring
+        pre_roll_frames = int(pre_roll_seconds * self.capture.sample_rate / self.capture.frame_length)
+        live_seq = self.detected_seq if self.detected_seq is not None else ring.read_seq
+        start_seq = max(live_seq - pre_roll_frames, ring.write_seq - ring.capacity, 0)
+        return RingAudioSource(self.capture, start_seq, consume=consume, cancelled=cancelled, live_seq=live_seq)
     
     def get_active_wake_word(self):
         """Returns the wake word that was successfully initialized"""
         return self.active_wake_word
+    
+    def get_keywords(self):
+        """All keywords the engine listens for"""
+        return list(self.keyword_names)
 
     def cleanup(self):
-        if self.audio_stream:
-            self.audio_stream.close()
-        if self.pa:
-            self.pa.terminate()
+        if self.gate:
+            print(f"Wake word gate stats: {self.gate.get_stats()}")
+        if self.capture:
+            print(f"Audio capture stats: {self.capture.get_stats()}")
+            self.capture.stop()
         if self.porcupine:
             self.porcupine.delete()